@@ -0,0 +1,318 @@
+"""
+离线命令行工具，不需要启动 NoneBot
+
+    python -m nonebot_plugin_aniguessr --data-dir ./data download
+    python -m nonebot_plugin_aniguessr --data-dir ./data build
+    python -m nonebot_plugin_aniguessr --data-dir ./data verify
+    python -m nonebot_plugin_aniguessr --data-dir ./data stats
+    python -m nonebot_plugin_aniguessr --data-dir ./data bench
+    python -m nonebot_plugin_aniguessr --data-dir ./data simulate --hints 1,3,5
+    python -m nonebot_plugin_aniguessr --data-dir ./data replay 123456789 --tier easy
+    python -m nonebot_plugin_aniguessr --data-dir ./data analytics
+
+可以在构建镜像时预先下载数据并编译索引，运行时将 aniguessr_data_dir 配置为同一目录即可直接加载。
+其他配置项（如 aniguessr_data_source）与插件相同，通过环境变量设置。
+"""
+
+import argparse
+import asyncio
+from collections import Counter
+import os
+import sys
+import time
+
+
+def _configure(args: argparse.Namespace) -> None:
+    """命令行参数写入环境变量，需要在导入 data_source 之前调用"""
+    if args.data_dir:
+        os.environ["ANIGUESSR_DATA_DIR"] = args.data_dir
+    if not os.environ.get("ANIGUESSR_DATA_DIR"):
+        raise SystemExit("请通过 --data-dir 或环境变量 ANIGUESSR_DATA_DIR 指定数据目录")
+    if getattr(args, "source", None):
+        os.environ["ANIGUESSR_DATA_SOURCE"] = args.source
+
+
+def _resolve_version(version: str | None) -> str:
+    from .data_source import versions
+
+    if version:
+        return versions.resolve(version)
+    current = versions.current()
+    if current is None:
+        raise SystemExit("没有可用的数据版本，请先运行 download")
+    return current
+
+
+async def _load_database(version: str, rebuild: bool = False):
+    """加载版本的编译索引，没有索引或要求重新编译时从数据文件构建并保存"""
+    from .data_source import load_character_data_from_file, versions
+
+    if not rebuild and (character_db := await asyncio.to_thread(versions.load_index, version)) is not None:
+        if character_db.has_distinguish_scores:
+            return character_db
+    else:
+        collection = await load_character_data_from_file(version)
+        if collection.is_empty():
+            raise SystemExit(f"数据版本 {version} 的数据文件加载失败")
+        character_db = await asyncio.to_thread(collection.create_database)
+    await asyncio.to_thread(character_db.compute_distinguish_scores)
+    await asyncio.to_thread(versions.save_index, version, character_db)
+    return character_db
+
+
+def cmd_download(args: argparse.Namespace) -> int:
+    from .data_source import download_character_data, versions
+
+    if not asyncio.run(download_character_data(force_update=args.force)):
+        print("下载失败", file=sys.stderr)
+        return 1
+    print(f"当前数据版本: {versions.current()}")
+    return 0
+
+
+def cmd_build(args: argparse.Namespace) -> int:
+    from .data_source import ensure_data_version
+
+    version = args.version or asyncio.run(ensure_data_version())
+    if version is None:
+        print("没有可用的数据版本", file=sys.stderr)
+        return 1
+    version = _resolve_version(version)
+    start = time.perf_counter()
+    character_db = asyncio.run(_load_database(version, rebuild=True))
+    print(f"已编译数据版本 {version}：{len(character_db.characters)} 个角色，用时 {time.perf_counter() - start:.2f} 秒")
+    ambiguous = sum(1 for name in character_db.characters if character_db.distinguish_score(name) == 0)
+    print(f"无法只靠属性唯一确定的角色: {ambiguous} 个")
+    return 0
+
+
+def cmd_verify(args: argparse.Namespace) -> int:
+    from .data_source import versions
+
+    targets = [manifest.version for manifest in versions.versions()] if args.all else [_resolve_version(args.version)]
+    failed = False
+    for version in targets:
+        problems = versions.verify(version)
+        if problems:
+            failed = True
+            print(f"✗ {version}")
+            for problem in problems:
+                print(f"  - {problem}")
+        else:
+            print(f"✓ {version}")
+    return 1 if failed else 0
+
+
+def cmd_versions(args: argparse.Namespace) -> int:
+    from .data_source import versions
+
+    current = versions.current()
+    for manifest in versions.versions():
+        mark = "*" if manifest.version == current else " "
+        created_at = time.strftime("%Y-%m-%d %H:%M", time.localtime(manifest.created_at))
+        index = "已编译" if manifest.index is not None else "未编译"
+        print(f"{mark} {manifest.version}  {created_at}  {manifest.characters or '?'} 个角色  {index}")
+    return 0
+
+
+def cmd_stats(args: argparse.Namespace) -> int:
+    from .config import plugin_config
+    from .tiers import TIER_NAMES, build_tier_pools
+
+    version = _resolve_version(args.version)
+    character_db = asyncio.run(_load_database(version))
+    counts = sorted(len(attrs) for attrs in character_db.characters.values())
+    attr_counts = Counter(attr for attrs in character_db.characters.values() for attr in attrs)
+
+    print(f"数据版本: {version}")
+    print(f"角色数: {len(counts)}")
+    print(f"属性种类: {len(attr_counts)}")
+    if counts:
+        print(
+            f"每个角色的属性数: 最少 {counts[0]}，中位数 {counts[len(counts) // 2]}，"
+            f"平均 {sum(counts) / len(counts):.1f}，最多 {counts[-1]}"
+        )
+    pools = build_tier_pools(character_db, plugin_config.aniguessr_min_attrs, plugin_config.aniguessr_easy_min_attrs)
+    print("难度划分: " + "，".join(f"{TIER_NAMES[name]} {len(pool)}" for name, pool in pools.items()))
+    print(f"最常见的 {args.top} 个属性:")
+    for attr, count in attr_counts.most_common(args.top):
+        print(f"  {attr}: {count}")
+    return 0
+
+
+def cmd_bench(args: argparse.Namespace) -> int:
+    from . import benchmark, render_image
+    from .data_source import versions
+    from .memory import current_rss, deep_size, format_bytes
+
+    version = _resolve_version(args.version)
+    start = time.perf_counter()
+    character_db = asyncio.run(_load_database(version))
+    print(f"加载编译索引: {time.perf_counter() - start:.3f} 秒")
+    # 在实际数据集上测量角色数据库的内存占用
+    seen: set[int] = set()
+    parts = {name: deep_size(part, seen) for name, part in character_db.memory_parts().items()}
+    print(
+        f"角色数据库内存: {format_bytes(sum(parts.values()))}（"
+        + "，".join(f"{name} {format_bytes(size)}" for name, size in parts.items())
+        + "）"
+    )
+    if (rss := current_rss()) is not None:
+        print(f"进程常驻内存: {format_bytes(rss)}")
+
+    count = args.count
+    print(f"属性查询: {benchmark.bench_lookup(character_db, count=count * 50):.0f} 次/秒")
+    print(f"候选筛选: {benchmark.bench_candidates(character_db, count=count):.1f} 次/秒")
+    print(f"模糊匹配: {benchmark.bench_fuzzy_match(character_db, count=max(count // 10, 1)):.1f} 次/秒")
+    if render_image.is_available():
+        print(f"图片渲染: {benchmark.bench_render(count=count):.1f} 次/秒")
+    else:
+        print("图片渲染: 未安装 Pillow，跳过")
+
+    start = time.perf_counter()
+    asyncio.run(_load_database(version, rebuild=True))
+    print(f"重新编译索引: {time.perf_counter() - start:.3f} 秒")
+    print(f"索引大小: {versions.manifest(version).index.size / 1024 / 1024:.1f} MiB")
+    return 0
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(item) for item in value.split(",")]
+
+
+def cmd_simulate(args: argparse.Namespace) -> int:
+    from .config import plugin_config
+    from .sampling import set_target_weighting
+    from .simulator import config_grid, simulate
+
+    set_target_weighting(plugin_config.aniguessr_target_weighting)
+    version = _resolve_version(args.version)
+    character_db = asyncio.run(_load_database(version))
+    configs = config_grid(args.strategy.split(","), args.max_attempts, args.hints, args.min_attrs)
+    reports = simulate(character_db, configs, games=args.games, workers=args.workers, seed=args.seed)
+    for report in reports:
+        print(report.summary())
+        hardest = report.hardest(args.top)
+        if hardest:
+            print("最难猜中的角色: " + "，".join(f"{name} {rate:.0%}/{games}" for name, rate, games in hardest))
+        print()
+    total_games = sum(report.games for report in reports)
+    total_seconds = sum(report.seconds for report in reports)
+    print(f"共 {total_games} 局，用时 {total_seconds:.1f} 秒，{total_games / (total_seconds or 1):.0f} 局/秒")
+    return 0
+
+
+def cmd_replay(args: argparse.Namespace) -> int:
+    from .config import plugin_config
+    from .game_logic import AniGuessrGame
+    from .model import GameSettings
+    from .sampling import set_target_weighting
+    from .tiers import build_tier_pools
+
+    set_target_weighting(plugin_config.aniguessr_target_weighting)
+    version = _resolve_version(args.version)
+    character_db = asyncio.run(_load_database(version))
+    pools = build_tier_pools(character_db, plugin_config.aniguessr_min_attrs, plugin_config.aniguessr_easy_min_attrs)
+    settings = GameSettings() if args.hints is None else GameSettings(hint_count=args.hints)
+    game = AniGuessrGame(pools[args.tier], settings=settings, seed=args.seed)
+    target = game.get_target_name()
+    print(f"目标角色: {target}")
+    print(f"提示: {'，'.join(game.get_random_attrs())}")
+    print(
+        f"区分度: {character_db.distinguish_score(target)}，近邻: {'，'.join(character_db.nearest_neighbors(target))}"
+    )
+    return 0
+
+
+def cmd_analytics(args: argparse.Namespace) -> int:
+    from .analytics import build_tables, update_analytics
+    from .data_source import DATA_DIR
+
+    start = time.perf_counter()
+    aggregates = update_analytics(DATA_DIR / "events", DATA_DIR / "analytics", rebuild=args.rebuild)
+    summary = build_tables(aggregates, min_games=args.min_games)["summary"]
+    print(f"已处理 {summary['events']} 个事件，用时 {time.perf_counter() - start:.2f} 秒")
+    print(f"统计表保存在 {DATA_DIR / 'analytics'}")
+    print(f"对局 {summary['games']}，胜率 {summary['win_rate']:.1%}")
+    reasons = "，".join(f"{reason} {count}" for reason, count in summary["reasons"].items())
+    giveups = "，".join(f"{n} 次: {count}" for n, count in summary["giveup_attempts"].items())
+    print(f"结束原因: {reasons or '无'}")
+    print(f"放弃时的尝试次数: {giveups or '无'}")
+    for tier, stats in summary["tiers"].items():
+        print(f"难度 {tier}: {stats['games']} 局，胜率 {stats['win_rate']:.1%}")
+    print(f"从未被猜中的角色（至少 {args.min_games} 局）: {'，'.join(summary['never_won'][: args.top]) or '无'}")
+    print(f"帮助最小的提示: {'，'.join(summary['weakest_hints'][: args.top]) or '无'}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m nonebot_plugin_aniguessr", description="猜角色数据离线工具")
+    parser.add_argument("--data-dir", help="数据目录，默认读取环境变量 ANIGUESSR_DATA_DIR")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    download = commands.add_parser("download", help="下载角色数据并保存为新的数据版本")
+    download.add_argument("--force", action="store_true", help="已有数据版本时仍然下载")
+    download.add_argument("--source", help="数据来源，URL 前缀或本地目录")
+    download.set_defaults(func=cmd_download)
+
+    build = commands.add_parser("build", help="编译数据版本的角色数据库索引，没有数据时先下载")
+    build.add_argument("--version", help="版本号或其前缀，默认当前版本")
+    build.add_argument("--source", help="没有数据时使用的数据来源")
+    build.set_defaults(func=cmd_build)
+
+    verify = commands.add_parser("verify", help="按版本清单校验文件哈希")
+    verify.add_argument("--version", help="版本号或其前缀，默认当前版本")
+    verify.add_argument("--all", action="store_true", help="校验全部版本")
+    verify.set_defaults(func=cmd_verify)
+
+    commands.add_parser("versions", help="列出数据版本").set_defaults(func=cmd_versions)
+
+    stats = commands.add_parser("stats", help="输出数据集统计信息")
+    stats.add_argument("--version", help="版本号或其前缀，默认当前版本")
+    stats.add_argument("--top", type=int, default=10, help="显示最常见的属性数量")
+    stats.set_defaults(func=cmd_stats)
+
+    bench = commands.add_parser("bench", help="运行性能基准")
+    bench.add_argument("--version", help="版本号或其前缀，默认当前版本")
+    bench.add_argument("--count", type=int, default=200, help="基准的执行次数")
+    bench.set_defaults(func=cmd_bench)
+
+    simulate = commands.add_parser("simulate", help="自我对弈模拟，统计各组参数的胜率和猜测次数")
+    simulate.add_argument("--version", help="版本号或其前缀，默认当前版本")
+    simulate.add_argument("--strategy", default="random,greedy", help="猜测策略，逗号分隔：random, greedy, optimal")
+    simulate.add_argument("--max-attempts", type=_int_list, default=[10], help="最大尝试次数，逗号分隔多个取值")
+    simulate.add_argument("--hints", type=_int_list, default=[3], help="提示数量，逗号分隔多个取值")
+    simulate.add_argument("--min-attrs", type=_int_list, default=[5], help="最少属性数量，逗号分隔多个取值")
+    simulate.add_argument("--games", type=int, default=1000, help="每组参数的对局数")
+    simulate.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="工作进程数，0 表示不使用进程池")
+    simulate.add_argument("--seed", type=int, default=0, help="随机种子")
+    simulate.add_argument("--top", type=int, default=5, help="显示最难猜中的角色数量")
+    simulate.set_defaults(func=cmd_simulate)
+
+    analytics = commands.add_parser("analytics", help="增量处理对局事件日志，输出统计表")
+    analytics.add_argument("--rebuild", action="store_true", help="丢弃已有的汇总数据，从头处理全部事件")
+    analytics.add_argument("--min-games", type=int, default=3, help="排行中的角色和提示至少需要的对局数")
+    analytics.add_argument("--top", type=int, default=10, help="显示的角色和提示数量")
+    analytics.set_defaults(func=cmd_analytics)
+
+    replay = commands.add_parser("replay", help="按对局种子复现目标角色和提示（不包含角色包）")
+    replay.add_argument("seed", type=int, help="日志、事件日志或战绩表中记录的对局种子")
+    replay.add_argument("--tier", choices=["easy", "normal", "hard"], default="normal", help="难度")
+    replay.add_argument("--hints", type=int, help="提示数量，默认与游戏中相同")
+    replay.add_argument("--version", help="版本号或其前缀，默认当前版本")
+    replay.set_defaults(func=cmd_replay)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    _configure(args)
+    try:
+        return args.func(args)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
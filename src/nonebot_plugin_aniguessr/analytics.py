@@ -0,0 +1,255 @@
+"""
+对局事件统计
+
+流式读取事件日志（见 events.py），增量维护汇总数据并输出预计算的统计表：
+
+    analytics/state.json        汇总数据和读取进度，下次只处理新增的事件
+    analytics/characters.json   各目标角色的对局数、胜率、放弃数、猜中平均次数
+    analytics/hints.json        各提示属性所在对局的胜率和猜中平均次数
+    analytics/summary.json      总体数据、结束原因、放弃时的尝试次数分布、各难度胜率、从未被猜中的角色等
+
+内存占用只与角色和属性的数量有关，与历史事件的数量无关。
+难度划分和提示选择等逻辑可以直接读取统计表（load_table），不需要重新扫描历史日志。
+"""
+
+from collections import Counter
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+from .events import CURRENT_FILE, parse_events, read_event_file, rotated_files
+
+STATE_FILE = "state.json"
+# 开始后超过这个时间（秒）仍没有结束事件的对局不再等待（如机器人重启）
+OPEN_GAME_TTL = 2 * 24 * 3600
+# 统计表中的排行至少需要的对局数
+MIN_GAMES = 3
+
+
+@dataclass
+class Aggregates:
+    """可增量更新的汇总数据"""
+
+    events: int = 0
+    games: int = 0
+    wins: int = 0
+    # 结束原因、放弃时的尝试次数、猜测的匹配方式
+    reasons: Counter = field(default_factory=Counter)
+    giveup_attempts: Counter = field(default_factory=Counter)
+    methods: Counter = field(default_factory=Counter)
+    # 被猜测的角色（匹配后的角色名）
+    guesses: Counter = field(default_factory=Counter)
+    # 目标角色: [对局数, 猜中数, 放弃数, 猜中时的尝试次数之和]
+    targets: dict[str, list[int]] = field(default_factory=dict)
+    # 提示属性: [对局数, 猜中数, 猜中时的尝试次数之和]
+    hints: dict[str, list[int]] = field(default_factory=dict)
+    # 难度: [对局数, 猜中数]
+    tiers: dict[str, list[int]] = field(default_factory=dict)
+    # 已开始但还没有结束的对局: "用户:种子" -> [开始时间, 难度, 提示]
+    open_games: dict[str, list] = field(default_factory=dict)
+    # 读取进度：已完整处理的轮转文件，最后处理的事件序号
+    processed_files: list[str] = field(default_factory=list)
+    last_seq: int = 0
+    # 已处理的事件中最晚的时间，只用于丢弃长时间没有结束的对局
+    last_ts: float = 0.0
+
+    @classmethod
+    def load(cls, path: Path) -> "Aggregates":
+        """读取汇总数据，文件不存在时返回空的汇总"""
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return cls()
+        for name in ("reasons", "giveup_attempts", "methods", "guesses"):
+            data[name] = Counter(data.get(name, {}))
+        return cls(**data)
+
+    def add(self, event: dict[str, Any]) -> None:
+        """处理一个事件"""
+        self.events += 1
+        event_type = event.get("type")
+        key = f"{event.get('user')}:{event.get('seed')}"
+        if event_type == "start":
+            self.open_games[key] = [event.get("ts", 0.0), event.get("tier", ""), event.get("hints", [])]
+        elif event_type == "guess":
+            self.methods[event.get("method", "")] += 1
+            if event.get("name"):
+                self.guesses[event["name"]] += 1
+        elif event_type == "end":
+            self._end(key, event)
+
+    def _end(self, key: str, event: dict[str, Any]) -> None:
+        won = bool(event.get("won"))
+        attempts = int(event.get("attempts", 0))
+        reason = event.get("reason", "")
+        self.games += 1
+        self.wins += won
+        self.reasons[reason] += 1
+        if reason == "giveup":
+            self.giveup_attempts[str(attempts)] += 1
+
+        target = self.targets.setdefault(event.get("target", ""), [0, 0, 0, 0])
+        target[0] += 1
+        target[1] += won
+        target[2] += reason == "giveup"
+        target[3] += attempts if won else 0
+
+        _, tier, hints = self.open_games.pop(key, (0.0, "", []))
+        if tier:
+            tier_stats = self.tiers.setdefault(tier, [0, 0])
+            tier_stats[0] += 1
+            tier_stats[1] += won
+        for hint in hints:
+            hint_stats = self.hints.setdefault(hint, [0, 0, 0])
+            hint_stats[0] += 1
+            hint_stats[1] += won
+            hint_stats[2] += attempts if won else 0
+
+    def prune_open_games(self, now: float) -> None:
+        """丢弃长时间没有结束的对局"""
+        self.open_games = {key: game for key, game in self.open_games.items() if now - game[0] <= OPEN_GAME_TTL}
+
+
+def _rate(wins: int, games: int) -> float:
+    return round(wins / games, 4) if games else 0.0
+
+
+def _average(total: int, count: int) -> float:
+    return round(total / count, 2) if count else 0.0
+
+
+def build_tables(aggregates: Aggregates, min_games: int = MIN_GAMES) -> dict[str, Any]:
+    """
+    由汇总数据生成统计表
+    Args:
+        aggregates: 汇总数据
+        min_games: 排行中的角色和属性至少需要的对局数
+    Returns:
+        dict[str, Any]: 表名到内容的映射
+    """
+    characters = {
+        name: {
+            "games": games,
+            "wins": wins,
+            "win_rate": _rate(wins, games),
+            "giveups": giveups,
+            "avg_attempts": _average(win_attempts, wins),
+            "guessed": aggregates.guesses.get(name, 0),
+        }
+        for name, (games, wins, giveups, win_attempts) in aggregates.targets.items()
+    }
+    hints = {
+        attr: {"games": games, "wins": wins, "win_rate": _rate(wins, games), "avg_attempts": _average(attempts, wins)}
+        for attr, (games, wins, attempts) in aggregates.hints.items()
+    }
+    ranked_hints = sorted(
+        (attr for attr, stats in hints.items() if stats["games"] >= min_games),
+        key=lambda attr: (hints[attr]["win_rate"], -hints[attr]["avg_attempts"], attr),
+    )
+    summary = {
+        "events": aggregates.events,
+        "games": aggregates.games,
+        "wins": aggregates.wins,
+        "win_rate": _rate(aggregates.wins, aggregates.games),
+        "reasons": dict(aggregates.reasons.most_common()),
+        "giveup_attempts": dict(sorted(aggregates.giveup_attempts.items(), key=lambda item: int(item[0]))),
+        "match_methods": dict(aggregates.methods.most_common()),
+        "tiers": {
+            tier: {"games": games, "win_rate": _rate(wins, games)} for tier, (games, wins) in aggregates.tiers.items()
+        },
+        # 作为目标出现过多次但从未被猜中的角色
+        "never_won": sorted(
+            name for name, stats in characters.items() if stats["games"] >= min_games and not stats["wins"]
+        ),
+        # 所在对局胜率最低的提示属性，作为提示帮助最小
+        "weakest_hints": ranked_hints[:50],
+        "most_guessed": dict(aggregates.guesses.most_common(50)),
+    }
+    return {"characters": characters, "hints": hints, "summary": summary}
+
+
+def _write_json(path: Path, data: Any) -> None:
+    """先写临时文件再替换，读取方不会读到半个文件"""
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, separators=(",", ":")), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _add_events(aggregates: Aggregates, events: Iterable[dict[str, Any]]) -> None:
+    """处理还没有处理过的事件"""
+    for event in events:
+        # 以事件序号判断是否处理过（当前文件轮转后以新文件名再次出现），不使用可能回拨的时间
+        seq = event.get("seq")
+        if not isinstance(seq, int) or seq <= aggregates.last_seq:
+            continue
+        aggregates.add(event)
+        aggregates.last_seq = seq
+        aggregates.last_ts = max(aggregates.last_ts, event.get("ts", 0.0))
+
+
+def update_analytics(events_dir: Path, output_dir: Path, rebuild: bool = False) -> Aggregates:
+    """
+    处理新增的事件并重新输出统计表，同步执行，异步代码中应通过 asyncio.to_thread 调用
+    Args:
+        events_dir: 事件日志目录
+        output_dir: 统计表目录
+        rebuild: 丢弃已有的汇总数据，从头处理全部事件
+    Returns:
+        Aggregates: 更新后的汇总数据
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    aggregates = Aggregates() if rebuild else Aggregates.load(output_dir / STATE_FILE)
+    processed = set(aggregates.processed_files)
+
+    current = events_dir / CURRENT_FILE
+    # 读取期间写入方可能轮转当前文件，或把轮转文件压缩为新的文件名
+    while True:
+        try:
+            for path in rotated_files(events_dir):
+                if path.name not in processed:
+                    _add_events(aggregates, read_event_file(path))
+                    processed.add(path.name)
+        except FileNotFoundError:
+            # 列出之后被压缩或删除，重新列出
+            continue
+        try:
+            f = current.open(encoding="utf-8")
+        except FileNotFoundError:
+            f = None
+        # 打开当前文件之前又发生了轮转时先处理新的轮转文件，否则序号会越过其中还没有读取的事件
+        if any(path.name not in processed for path in rotated_files(events_dir)):
+            if f is not None:
+                f.close()
+            continue
+        if f is not None:
+            with f:
+                _add_events(aggregates, parse_events(f))
+        break
+
+    # 只记录仍存在的轮转文件，被删除的文件不需要再跳过
+    existing = {path.name for path in rotated_files(events_dir)}
+    aggregates.processed_files = sorted(processed & existing)
+    aggregates.prune_open_games(aggregates.last_ts)
+
+    for name, table in build_tables(aggregates).items():
+        _write_json(output_dir / f"{name}.json", table)
+    _write_json(output_dir / STATE_FILE, vars(aggregates))
+    return aggregates
+
+
+def load_table(output_dir: Path, name: str) -> dict[str, Any]:
+    """
+    读取统计表
+    Args:
+        output_dir: 统计表目录
+        name: 表名（characters、hints、summary）
+    Returns:
+        dict[str, Any]: 表的内容，还没有生成时返回空字典
+    """
+    try:
+        return json.loads((output_dir / f"{name}.json").read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
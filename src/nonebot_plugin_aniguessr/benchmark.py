@@ -0,0 +1,118 @@
+"""
+性能基准
+
+每个基准返回每秒执行次数，供调优与回归对比使用。
+"""
+
+import difflib
+import random
+import time
+
+from . import render_image
+from .model import CharacterDatabase
+
+
+def _sample_board(rng: random.Random, attr_pool: list[str], size: int) -> list[render_image.BoardItem]:
+    statuses = ("exact", "present", "different", "different")
+    details = {"exact": "", "present": "目标角色具有此特征", "different": "目标角色不具有此特征"}
+    items = []
+    for attr in rng.sample(attr_pool, size):
+        status = rng.choice(statuses)
+        items.append((attr, status, details[status] or attr))
+    return items
+
+
+def bench_render(count: int = 200, board_size: int = 30, seed: int = 0) -> float:
+    """
+    图片渲染基准
+    Args:
+        count: 渲染次数
+        board_size: 每张图的属性格子数
+        seed: 随机种子
+    Returns:
+        float: 每秒渲染次数
+    """
+    if not render_image.is_available():
+        raise RuntimeError("未安装 Pillow，无法运行图片渲染基准")
+
+    rng = random.Random(seed)
+    # 属性池远小于渲染次数，模拟多局游戏间重复出现的常见属性
+    attr_pool = [f"属性{i}" for i in range(max(board_size * 4, 120))]
+    boards = [_sample_board(rng, attr_pool, board_size) for _ in range(count)]
+    footer = ["剩余尝试次数: 5, 剩余时间: 120秒"]
+
+    start = time.perf_counter()
+    for index, items in enumerate(boards):
+        render_image.render_guess_board(f"第 {index} 次猜测", items, footer)
+    return count / (time.perf_counter() - start)
+
+
+def bench_lookup(character_db: CharacterDatabase, count: int = 10000, seed: int = 0) -> float:
+    """
+    属性查询基准：查询角色的属性，再查询具有其中一个属性的角色
+    Args:
+        character_db: 角色数据库
+        count: 查询次数
+        seed: 随机种子
+    Returns:
+        float: 每秒查询次数
+    """
+    rng = random.Random(seed)
+    names = rng.choices(list(character_db.characters), k=count)
+
+    start = time.perf_counter()
+    for name in names:
+        attrs = character_db.get_attributes(name)
+        if attrs:
+            len(character_db.get_characters_with_attribute(attrs[0]))
+    return count / (time.perf_counter() - start)
+
+
+def bench_fuzzy_match(character_db: CharacterDatabase, count: int = 20, seed: int = 0) -> float:
+    """
+    角色名模糊匹配基准，每次匹配一个去掉最后一个字的角色名
+    Args:
+        character_db: 角色数据库
+        count: 匹配次数
+        seed: 随机种子
+    Returns:
+        float: 每秒匹配次数
+    """
+    rng = random.Random(seed)
+    names = list(character_db.characters)
+    queries = [name[:-1] or name for name in rng.choices(names, k=count)]
+
+    start = time.perf_counter()
+    for query in queries:
+        difflib.get_close_matches(query, names, n=1, cutoff=0.6)
+    return count / (time.perf_counter() - start)
+
+
+def bench_candidates(character_db: CharacterDatabase, count: int = 200, seed: int = 0) -> float:
+    """
+    候选角色筛选基准：随机确认目标角色的 3 个属性、排除 3 个属性后计算候选排名
+    Args:
+        character_db: 角色数据库
+        count: 筛选次数
+        seed: 随机种子
+    Returns:
+        float: 每秒筛选次数
+    """
+    from .game_logic import AniGuessrGame
+
+    rng = random.Random(seed)
+    all_attrs = sorted(character_db.get_all_attributes())
+    games = []
+    for _ in range(count):
+        game = AniGuessrGame(character_db)
+        target_attrs = list(game.target_attrs)
+        game.attr_status.add_confirmed_many(rng.sample(target_attrs, min(3, len(target_attrs))))
+        game.attr_status.add_excluded_many(
+            [attr for attr in rng.sample(all_attrs, min(3, len(all_attrs))) if attr not in game.target_attr_set]
+        )
+        games.append(game)
+
+    start = time.perf_counter()
+    for game in games:
+        game.get_candidate_cursor().page(1, 10)
+    return count / (time.perf_counter() - start)
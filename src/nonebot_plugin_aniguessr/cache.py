@@ -0,0 +1,95 @@
+"""
+有界 LRU 缓存
+
+按条目数量和总权重（如集合中的元素数）两个上限淘汰最久未使用的条目，并统计命中率。
+缓存在所有对局之间共享，可能同时被事件循环和工作线程访问，读写都在锁内完成。
+"""
+
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+import threading
+from typing import Generic, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """有界 LRU 缓存"""
+
+    def __init__(self, maxsize: int, max_weight: int = 0, weigh: Callable[[V], int] | None = None):
+        """
+        Args:
+            maxsize: 最多保存的条目数，0 表示不缓存
+            max_weight: 所有条目的总权重上限，0 表示不限制
+            weigh: 计算条目权重的函数，默认每个条目权重为 1
+        """
+        self.maxsize = maxsize
+        self.max_weight = max_weight
+        self.weigh = weigh or (lambda value: 1)
+        self._data: OrderedDict[K, tuple[V, int]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: K) -> V | None:
+        """读取条目并标记为最近使用，不存在时返回 None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: K, value: V) -> None:
+        """写入条目，超出上限时淘汰最久未使用的条目；单个条目超过总权重上限时不缓存"""
+        weight = self.weigh(value)
+        if self.maxsize <= 0 or (self.max_weight and weight > self.max_weight):
+            return
+        with self._lock:
+            old = self._data.pop(key, None)
+            if old is not None:
+                self.weight -= old[1]
+            self._data[key] = (value, weight)
+            self.weight += weight
+            while len(self._data) > self.maxsize or (self.max_weight and self.weight > self.max_weight):
+                _, (_, evicted) = self._data.popitem(last=False)
+                self.weight -= evicted
+                self.evictions += 1
+
+    def get_or_compute(self, key: K, compute: Callable[[], V]) -> V:
+        """读取条目，不存在时计算并写入；计算在锁外进行，并发时可能重复计算"""
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self) -> None:
+        """清空缓存，统计数据保留"""
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict[str, float]:
+        """缓存统计，用于运行指标"""
+        return {
+            "entries": len(self._data),
+            "weight": self.weight,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+        }
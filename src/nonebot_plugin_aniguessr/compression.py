@@ -0,0 +1,95 @@
+"""
+压缩数据文件读写
+
+数据文件可以以 .json、.json.gz 或 .json.zst 的形式保存，读取时边读边解压，不写出解压后的临时文件。
+zstd 需要安装可选依赖 zstandard，gzip 使用标准库。
+"""
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+import gzip
+from importlib.util import find_spec
+from pathlib import Path
+import shutil
+from typing import BinaryIO, Literal
+
+Compression = Literal["none", "gzip", "zstd"]
+
+SUFFIXES: dict[str, Compression] = {".gz": "gzip", ".zst": "zstd"}
+
+
+def zstd_available() -> bool:
+    """是否可以读写 zstd 压缩文件（已安装 zstandard）"""
+    return find_spec("zstandard") is not None
+
+
+def compression_of(path: Path) -> Compression:
+    """根据后缀判断压缩格式"""
+    return SUFFIXES.get(path.suffix, "none")
+
+
+def candidate_names(name: str) -> list[str]:
+    """
+    数据文件可能的文件名，按优先级排序
+    Args:
+        name: 未压缩的文件名
+    Returns:
+        list[str]: 压缩格式在前，未安装 zstandard 时不包含 .zst
+    """
+    names = [f"{name}.zst"] if zstd_available() else []
+    return [*names, f"{name}.gz", name]
+
+
+def find_file(directory: Path, name: str) -> Path | None:
+    """在目录中查找数据文件，压缩和未压缩的形式均可"""
+    for candidate in candidate_names(name):
+        if (path := directory / candidate).is_file():
+            return path
+    return None
+
+
+@contextmanager
+def open_decompressed(path: Path) -> Iterator[BinaryIO]:
+    """打开数据文件，按后缀边读边解压"""
+    compression = compression_of(path)
+    if compression == "gzip":
+        with gzip.open(path, "rb") as f:
+            yield f
+    elif compression == "zstd":
+        import zstandard
+
+        with path.open("rb") as raw, zstandard.ZstdDecompressor().stream_reader(raw) as f:
+            yield f
+    else:
+        with path.open("rb") as f:
+            yield f
+
+
+def compress_file(path: Path, compression: Compression) -> Path:
+    """
+    压缩文件并删除原文件
+    Args:
+        path: 未压缩的文件
+        compression: 压缩格式，zstd 不可用时改用 gzip
+    Returns:
+        Path: 压缩后的文件，不压缩时返回原文件
+    """
+    if compression == "none" or compression_of(path) != "none":
+        return path
+    if compression == "zstd" and not zstd_available():
+        compression = "gzip"
+
+    if compression == "zstd":
+        import zstandard
+
+        target = path.with_name(f"{path.name}.zst")
+        with path.open("rb") as src, target.open("wb") as raw:
+            with zstandard.ZstdCompressor(level=10).stream_writer(raw) as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+    else:
+        target = path.with_name(f"{path.name}.gz")
+        # 固定 mtime，内容相同的文件压缩结果相同，数据版本的哈希不受压缩时间影响
+        with path.open("rb") as src, gzip.GzipFile(target, "wb", compresslevel=6, mtime=0) as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+    path.unlink()
+    return target
@@ -1,18 +1,78 @@
+import json
+import os
+from typing import Any, Literal
+
 from nonebot import get_driver, get_plugin_config
 from pydantic import BaseModel
 
 
 class Config(BaseModel):
-    aniguessr_data_dir: str = ""  # 角色数据目录路径，默认使用插件内置的数据
+    aniguessr_data_dir: str = ""  # 数据目录路径，默认使用 localstore 的插件数据目录
+    # 数据来源，可以是 URL 前缀或本地目录（支持 file://），留空使用 GitHub 上的上游数据
+    aniguessr_data_source: str = ""
+    aniguessr_data_mirrors: list[str] = []  # 备用数据来源，数据来源无法获取时按顺序尝试
+    # 数据文件在本地保存的压缩格式，zstd 需要安装 zstandard，加载时边读边解压
+    aniguessr_data_compression: Literal["none", "gzip", "zstd"] = "gzip"
     aniguessr_max_hints: int = 3  # 游戏开始时提供的提示数量
     aniguessr_max_attempts: int = 10  # 最大猜测次数，超过后游戏自动结束
     aniguessr_timeout: int = 999999  # 游戏超时时间（秒），超过后自动结束
     aniguessr_min_attrs: int = 5  # 角色最少需要有多少个属性才会被纳入游戏
+    aniguessr_easy_min_attrs: int = 20  # 简单难度的角色最少属性数量，困难难度为其余角色
+    aniguessr_reply_limit: int = 30  # 猜测结果最多显示多少条属性比较，0 表示不限制
+    # 猜测结果的输出顺序：default 原顺序，confirmed_first 匹配的属性在前，diff_only 只显示本次新获得的信息
+    aniguessr_reply_order: Literal["default", "confirmed_first", "diff_only"] = "confirmed_first"
+    aniguessr_reply_mode: Literal["text", "image"] = "text"  # 回复方式，image 需要安装 Pillow
+    aniguessr_render_workers: int = 1  # 图片渲染进程数
+    aniguessr_image_font: str = ""  # 图片渲染使用的字体文件路径，留空自动查找系统中文字体
+    aniguessr_keep_versions: int = 3  # 保留的数据版本数量，更早的版本会被自动删除
+    aniguessr_candidates_page_size: int = 10  # /candidates 每页显示的候选角色数量
+    aniguessr_candidate_cache_size: int = 1024  # 候选角色缓存的条目数，0 表示不缓存
+    aniguessr_candidate_cache_names: int = 1000000  # 候选角色缓存中角色名的总数上限
+    aniguessr_event_log: bool = True  # 是否将对局事件记录到数据目录的 events 目录中
+    aniguessr_event_log_max_mb: int = 16  # 事件日志文件的大小上限（MiB），超过后轮转
+    aniguessr_event_log_keep: int = 10  # 保留的轮转事件日志文件数量
+    aniguessr_tag_mode: bool = False  # 启用标签模式（/aniguessr tag），启用后才加载 Bangumi 标签数据
+    aniguessr_tag_source: Literal["filtered", "full"] = "filtered"  # 标签模式使用过滤后的常用标签或全部标签
+    aniguessr_tag_min_tags: int = 3  # 标签模式中作为目标的角色最少需要的标签数量
+    # 目标角色的抽样权重：uniform 等概率，attrs 与属性数量成正比，sqrt_attrs 与属性数量的平方根成正比
+    aniguessr_target_weighting: Literal["uniform", "attrs", "sqrt_attrs"] = "uniform"
+    # 限流：每秒补充的令牌数和最多积累的令牌数，超出限制的命令直接忽略，速率为 0 表示不限制
+    aniguessr_user_rate: float = 1.0  # 每个用户每秒可以发送的命令数
+    aniguessr_user_burst: int = 3  # 每个用户短时间内最多连续发送的命令数
+    aniguessr_group_rate: float = 5.0  # 每个群组每秒可以发送的命令数
+    aniguessr_group_burst: int = 10  # 每个群组短时间内最多连续发送的命令数
+    # 同一用户在上一次猜测处理完之前发送的多次猜测：merge 只处理最后一次，queue 依次处理
+    aniguessr_pending_guess: Literal["merge", "queue"] = "merge"
+    aniguessr_cpu_concurrency: int = 2  # 模糊匹配、图片渲染等耗时操作的最大并发数
+    # 猜测计算进程数，模糊匹配和候选角色筛选在进程中执行，0 表示不启用，在线程中执行
+    aniguessr_guess_workers: int = 0
+    aniguessr_guess_timeout: float = 2.0  # 单次猜测计算的超时时间（秒）
+    aniguessr_guess_batch: int = 32  # 合并为一批提交到进程的最大请求数
+    aniguessr_guess_max_pending: int = 256  # 等待计算结果的最大请求数，超过后新请求直接提示繁忙
+    aniguessr_max_loop_lag_ms: int = 100  # 事件循环延迟上限（毫秒），超过时新的猜测计算请求提示繁忙，0 表示不限制
+    aniguessr_memory_log_minutes: int = 60  # 定时在日志中输出内存占用的间隔（分钟），0 表示不输出
 
 
-# 配置加载
-plugin_config: Config = get_plugin_config(Config)
-global_config = get_driver().config
+def config_from_env() -> Config:
+    """从环境变量读取配置，用于 NoneBot 未初始化时（命令行工具），列表等值使用 JSON 格式"""
+    values: dict[str, Any] = {}
+    for key, value in os.environ.items():
+        key = key.lower()
+        if key in Config.model_fields:
+            try:
+                values[key] = json.loads(value) if value[:1] in "[{" and value else value
+            except json.JSONDecodeError:
+                values[key] = value
+    return Config.model_validate(values)
 
-# 全局名称
-NICKNAME: str = next(iter(global_config.nickname), "")
+
+# 配置加载
+try:
+    global_config = get_driver().config
+except ValueError:
+    plugin_config: Config = config_from_env()
+    NICKNAME: str = ""
+else:
+    plugin_config: Config = get_plugin_config(Config)
+    # 全局名称
+    NICKNAME: str = next(iter(global_config.nickname), "")
@@ -0,0 +1,189 @@
+from dataclasses import dataclass, field
+from datetime import date
+import hashlib
+import random
+
+from nonebot import logger
+
+from .model import CharacterDatabase, CharacterPool
+
+
+@dataclass(frozen=True)
+class DailyChallenge:
+    """
+    每日挑战
+
+    目标角色、提示和提示对应的候选集合在每日切换时计算一次，所有会话只读共享，
+    每个玩家的对局只需要保存自己的猜测记录。
+    """
+
+    day: date
+    seed: int
+    target_name: str
+    target_attrs: tuple[str, ...]
+    target_attr_set: frozenset[str]
+    hints: tuple[str, ...]
+    hint_set: frozenset[str]
+    # 拥有全部提示属性的角色，对局计算候选角色时以此为起点
+    base_candidates: frozenset[str]
+
+
+@dataclass(order=True)
+class DailyRecord:
+    """每日挑战成绩，按 (是否失败, 尝试次数, 用时) 排序"""
+
+    failed: bool
+    attempts: int
+    seconds: float
+    user_id: str = field(compare=False)
+    user_name: str = field(compare=False)
+
+
+@dataclass
+class DailyLeaderboard:
+    """每日挑战排行榜"""
+
+    day: date
+    records: dict[str, DailyRecord] = field(default_factory=dict)
+
+    def has_played(self, user_id: str) -> bool:
+        """今天是否已经参加过挑战"""
+        return user_id in self.records
+
+    def record(self, user_id: str, user_name: str, won: bool, attempts: int, seconds: float) -> DailyRecord:
+        """记录成绩，每人每天只记录第一次"""
+        if user_id not in self.records:
+            self.records[user_id] = DailyRecord(
+                failed=not won, attempts=attempts, seconds=seconds, user_id=user_id, user_name=user_name
+            )
+        return self.records[user_id]
+
+    def top(self, limit: int = 10) -> list[DailyRecord]:
+        """排名靠前的成绩，只包含猜对的玩家"""
+        return sorted(record for record in self.records.values() if not record.failed)[:limit]
+
+    def rank_of(self, user_id: str) -> int | None:
+        """玩家的名次，未猜对时返回 None"""
+        record = self.records.get(user_id)
+        if record is None or record.failed:
+            return None
+        return sum(1 for other in self.records.values() if not other.failed and other < record) + 1
+
+
+_challenge: DailyChallenge | None = None
+_leaderboard: DailyLeaderboard | None = None
+# 前一天的排行榜，零点前开始、零点后结束的对局记录到这里
+_previous_leaderboard: DailyLeaderboard | None = None
+
+
+def daily_seed(day: date) -> int:
+    """由日期得到确定的随机种子，同一天所有实例得到相同的挑战"""
+    digest = hashlib.sha256(f"aniguessr-daily-{day.isoformat()}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def build_daily_challenge(
+    character_db: CharacterDatabase | CharacterPool, day: date, hint_count: int
+) -> DailyChallenge:
+    """
+    计算某一天的每日挑战
+    Args:
+        character_db: 角色数据库
+        day: 日期
+        hint_count: 提示数量
+    Returns:
+        DailyChallenge: 每日挑战
+    """
+    seed = daily_seed(day)
+    rng = random.Random(seed)
+
+    # 排序保证与字典的插入顺序无关
+    names = sorted(character_db.candidate_names())
+    target_name = names[seed % len(names)]
+    target_attrs = tuple(character_db.characters[target_name])
+
+    if len(target_attrs) <= hint_count:
+        hints = target_attrs
+    else:
+        hints = tuple(rng.sample(target_attrs, hint_count))
+
+    base_candidates: set[str] | None = None
+    # 从角色数最少的属性开始求交集
+    for attr in sorted(hints, key=lambda attr: len(character_db.get_characters_with_attribute(attr))):
+        chars_with_attr = character_db.get_characters_with_attribute(attr)
+        base_candidates = set(chars_with_attr) if base_candidates is None else base_candidates & set(chars_with_attr)
+    # 候选角色限定在角色池内
+    base_candidates = (base_candidates or set()).intersection(names)
+
+    return DailyChallenge(
+        day=day,
+        seed=seed,
+        target_name=target_name,
+        target_attrs=target_attrs,
+        target_attr_set=frozenset(target_attrs),
+        hints=hints,
+        hint_set=frozenset(hints),
+        base_candidates=frozenset(base_candidates),
+    )
+
+
+def rollover(
+    character_db: CharacterDatabase | CharacterPool, hint_count: int, day: date | None = None
+) -> DailyChallenge:
+    """
+    切换到新一天的挑战，同时重置排行榜
+    Args:
+        character_db: 角色数据库
+        hint_count: 提示数量
+        day: 日期，默认今天
+    Returns:
+        DailyChallenge: 新的每日挑战
+    """
+    global _challenge, _leaderboard
+    day = day or date.today()
+    _challenge = build_daily_challenge(character_db, day, hint_count)
+    _switch_leaderboard(day)
+    logger.info(f"每日挑战已更新: {day.isoformat()}，候选角色 {len(_challenge.base_candidates)} 个")
+    return _challenge
+
+
+def get_daily_challenge(character_db: CharacterDatabase | CharacterPool, hint_count: int) -> DailyChallenge:
+    """获取今天的每日挑战，定时任务未执行（如当天启动）时现场计算"""
+    if _challenge is None or _challenge.day != date.today():
+        return rollover(character_db, hint_count)
+    return _challenge
+
+
+def current_daily_challenge() -> DailyChallenge | None:
+    """已计算的每日挑战，不触发计算，可能不是今天的"""
+    return _challenge
+
+
+def _switch_leaderboard(day: date) -> None:
+    """切换到新一天的排行榜，保留前一天的排行榜直到再次切换"""
+    global _leaderboard, _previous_leaderboard
+    if _leaderboard is None or _leaderboard.day != day:
+        _previous_leaderboard = _leaderboard
+        _leaderboard = DailyLeaderboard(day=day)
+
+
+def get_leaderboard() -> DailyLeaderboard:
+    """获取今天的排行榜"""
+    _switch_leaderboard(date.today())
+    return _leaderboard
+
+
+def leaderboard_of(day: date) -> DailyLeaderboard | None:
+    """
+    获取某一天的排行榜，用于记录对局所属那一天的成绩
+    Args:
+        day: 每日挑战的日期
+    Returns:
+        DailyLeaderboard | None: 今天或前一天的排行榜，更早的排行榜已经丢弃，返回 None
+    """
+    today = get_leaderboard()
+    if day == today.day:
+        return today
+    if _previous_leaderboard is not None and _previous_leaderboard.day == day:
+        return _previous_leaderboard
+    return None
@@ -1,126 +1,234 @@
+import asyncio
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
 import json
+import os
+from pathlib import Path
+import shutil
+from typing import Any
+from urllib.parse import unquote, urlparse
 
-import aiofiles
-import httpx
 from nonebot import logger
-import nonebot_plugin_localstore as store
 
+from .compression import candidate_names, compress_file, find_file, open_decompressed
 from .config import plugin_config
+from .delta import CharacterDelta, diff_char2attr
+from .distinguish import compute_scores
 from .model import (
-    Bgm2Moegirl,
     Char2Attr,
     CharacterDatabase,
     CharacterDataCollection,
-    Id2Tags,
 )
+from .tags import TAG_FILES, TagSource, build_tag_database
+from .versions import DATA_FILES, VersionStore, dataset_files
 
-# 数据存储路径
-DATA_DIR = store.get_plugin_data_dir()
+
+def _data_dir() -> Path:
+    """数据存储路径，未配置时使用 localstore 的插件数据目录（需要 NoneBot 已初始化）"""
+    if plugin_config.aniguessr_data_dir:
+        return Path(plugin_config.aniguessr_data_dir).expanduser()
+    import nonebot_plugin_localstore as store
+
+    return store.get_plugin_data_dir()
+
+
+DATA_DIR = _data_dir()
 # 确保数据目录存在
 DATA_DIR.mkdir(parents=True, exist_ok=True)
+# 数据集版本
+versions = VersionStore(DATA_DIR / "versions")
+
+# 同一时间只进行一次增量更新
+_update_lock = asyncio.Lock()
+# 修改正在使用的角色数据库（增量更新、导入和删除角色包）时持有，
+# 增量更新在线程中比较数据期间数据库不会被修改
+character_db_lock = asyncio.Lock()
+
+# 默认的数据来源
+DATA_SOURCE_URL = "https://raw.githubusercontent.com/kennylimz/anime-character-guessr/main/data_server/data"
+# 插件内置的数据文件，作为最后的数据来源。只包含 bgm2moegirl 和 filtered_id_tags_mapping，
+# 不包含 char2attr 和 id_tags_mapping，无法访问网络时需要配置包含这两个文件的本地数据来源
+BUNDLED_DATA_DIR = Path(__file__).parent / "data"
+
+
+def _read_json(path: Path) -> Any:
+    """读取并解析 JSON 文件，压缩文件边读边解压，在线程中调用以免阻塞事件循环"""
+    with open_decompressed(path) as f:
+        return json.load(f)
+
+
+def data_sources() -> list[str]:
+    """数据来源，按顺序尝试：配置的来源、镜像、插件内置的数据（只有部分文件）"""
+    primary = plugin_config.aniguessr_data_source or DATA_SOURCE_URL
+    return [primary, *plugin_config.aniguessr_data_mirrors, str(BUNDLED_DATA_DIR)]
+
+
+def _local_dir(source: str) -> Path | None:
+    """本地来源的目录，URL 来源返回 None"""
+    if source.startswith(("http://", "https://")):
+        return None
+    if source.startswith("file://"):
+        return Path(unquote(urlparse(source).path))
+    return Path(source).expanduser()
+
+
+async def _fetch_file(client, source: str, name: str, staging: Path) -> Path | None:
+    """
+    从一个来源获取数据文件，优先获取压缩的形式
+    Args:
+        client: httpx 客户端
+        source: URL 前缀或本地目录
+        name: 未压缩的文件名
+        staging: 保存到的暂存目录
+    Returns:
+        Path | None: 保存的文件，来源中没有这个文件时返回 None
+    """
+    import aiofiles
+
+    if (directory := _local_dir(source)) is not None:
+        path = find_file(directory, name)
+        if path is None:
+            return None
+        with _writing(staging / path.name) as partial:
+            await asyncio.to_thread(shutil.copyfile, path, partial)
+        return staging / path.name
+
+    for candidate in candidate_names(name):
+        url = f"{source.rstrip('/')}/{candidate}"
+        async with client.stream("GET", url) as response:
+            if response.status_code != 200:
+                logger.debug(f"{url} 状态码: {response.status_code}")
+                continue
+            # 边下载边写入，不在内存中保存整个文件
+            target = staging / candidate
+            with _writing(target) as partial:
+                async with aiofiles.open(partial, "wb") as f:
+                    async for chunk in response.aiter_bytes(1 << 16):
+                        await f.write(chunk)
+            return target
+    return None
+
+
+@contextmanager
+def _writing(target: Path) -> Iterator[Path]:
+    """
+    先写入临时文件，完成后重命名为目标文件，出错时删除临时文件，
+    下载中断不会在暂存目录中留下被 find_file 当作数据文件的不完整文件
+    """
+    partial = target.with_name(f".{target.name}.part")
+    try:
+        yield partial
+        os.replace(partial, target)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
 
 
 async def download_character_data(force_update: bool = False) -> bool:
     """
-    从远程下载角色数据
+    从数据来源获取角色数据，保存为一个新的数据版本并切换到该版本
     Args:
-        force_update: 是否强制更新，即使本地文件已存在
+        force_update: 是否强制更新，即使本地已有数据版本
     Returns:
-        bool: 下载是否成功
+        bool: 获取是否成功
     """
-    # 定义需要下载的文件列表
-    files_to_download = [
-        (
-            "char2attr.json",
-            "https://raw.githubusercontent.com/kennylimz/anime-character-guessr/main/data_server/data/char2attr.json",
-        ),
-        (
-            "bgm2moegirl.json",
-            "https://raw.githubusercontent.com/kennylimz/anime-character-guessr/main/data_server/data/bgm2moegirl.json",
-        ),
-        (
-            "id_tags_mapping.json",
-            "https://raw.githubusercontent.com/kennylimz/anime-character-guessr/main/data_server/data/id_tags_mapping.json",
-        ),
-        (
-            "filtered_id_tags_mapping.json",
-            "https://raw.githubusercontent.com/kennylimz/anime-character-guessr/main/data_server/data/filtered_id_tags_mapping.json",
-        ),
-    ]
+    # 如果已有数据版本且不强制更新，则跳过
+    if not force_update and versions.current() is not None:
+        logger.info("数据版本已存在，跳过下载")
+        return True
+
+    # 只有下载时才需要，插件加载时不导入
+    import httpx
 
+    # 下载到暂存目录，全部下载成功后才会成为一个版本，失败不影响当前版本
+    staging = await asyncio.to_thread(versions.staging_dir)
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            for file_name, url in files_to_download:
-                file_path = DATA_DIR / file_name
-
-                # 如果文件已存在且不强制更新，则跳过
-                if not force_update and file_path.exists():
-                    logger.info(f"文件 {file_name} 已存在，跳过下载")
-                    continue
-
-                logger.info(f"正在下载 {file_name} 从 {url}")
-                response = await client.get(url)
-
-                if response.status_code == 200:
-                    # 保存文件
-                    async with aiofiles.open(file_path, "wb") as f:
-                        await f.write(response.content)
-                    logger.info(f"文件 {file_name} 下载成功")
-                else:
-                    logger.error(f"下载 {file_name} 失败，状态码: {response.status_code}")
+        async with httpx.AsyncClient(timeout=30.0, follow_redirects=True) as client:
+            for file_name in DATA_FILES:
+                path = None
+                for source in data_sources():
+                    logger.info(f"正在获取 {file_name} 从 {source}")
+                    try:
+                        path = await _fetch_file(client, source, file_name, staging)
+                    except Exception as e:
+                        logger.warning(f"从 {source} 获取 {file_name} 失败: {e}")
+                        continue
+                    if path is not None:
+                        break
+                if path is None:
+                    logger.error(
+                        f"所有数据来源都无法获取 {file_name}，"
+                        "无法访问网络时请将 aniguessr_data_source 设为包含该文件的本地目录"
+                    )
+                    await asyncio.to_thread(shutil.rmtree, staging, True)
                     return False
 
+                path = await asyncio.to_thread(compress_file, path, plugin_config.aniguessr_data_compression)
+                logger.info(f"文件 {path.name} 获取成功")
+
+        manifest = await asyncio.to_thread(versions.commit, staging)
+        await asyncio.to_thread(versions.activate, manifest.version)
+        await asyncio.to_thread(versions.prune, plugin_config.aniguessr_keep_versions)
         return True
 
     except Exception as e:
+        await asyncio.to_thread(shutil.rmtree, staging, True)
         logger.error(f"下载角色数据失败: {e}")
         return False
 
 
-async def load_character_data_from_file() -> CharacterDataCollection:
+async def ensure_data_version() -> str | None:
+    """
+    确保存在当前数据版本，旧版插件直接保存在数据目录中的文件会被导入为一个版本，都没有时下载
+    Returns:
+        str | None: 当前版本号，没有可用数据时返回 None
     """
-    从本地文件加载角色数据
+    if (version := versions.current()) is not None:
+        return version
+
+    manifest = await asyncio.to_thread(versions.import_files, DATA_DIR)
+    if manifest is not None:
+        logger.info(f"已将数据目录中的文件导入为数据版本 {manifest.version}")
+        await asyncio.to_thread(versions.activate, manifest.version)
+        return manifest.version
+
+    logger.info("没有可用的数据版本，尝试下载")
+    if not await download_character_data():
+        logger.error("下载数据文件失败")
+        return None
+    return versions.current()
+
+
+async def load_character_data_from_file(
+    version: str | None = None, include_tags: bool = False
+) -> CharacterDataCollection:
+    """
+    从数据版本加载角色数据
+    Args:
+        version: 版本号，默认使用当前版本
+        include_tags: 是否同时读取标签数据和 Bangumi 映射，角色模式不需要，默认不读取
     Returns:
         CharacterDataCollection: 角色数据集合
     """
-    # 检查数据文件是否存在，如果不存在则尝试下载
-    required_files = ["char2attr.json", "bgm2moegirl.json", "id_tags_mapping.json", "filtered_id_tags_mapping.json"]
-    all_files_exist = all((DATA_DIR / f).exists() for f in required_files)
-
-    if not all_files_exist:
-        logger.info("数据文件不完整，尝试下载")
-        if not await download_character_data():
-            logger.error("下载数据文件失败")
-            return CharacterDataCollection.create_empty()
+    version = version or await ensure_data_version()
+    if version is None:
+        return CharacterDataCollection.create_empty()
 
     try:
-        # 加载char2attr.json
-        char2attr_path = DATA_DIR / "char2attr.json"
-        async with aiofiles.open(char2attr_path, encoding="utf-8") as f:
-            char2attr_content = await f.read()
-            char2attr = json.loads(char2attr_content)
-
-        # 加载bgm2moegirl.json
-        bgm2moegirl_path = DATA_DIR / "bgm2moegirl.json"
-        async with aiofiles.open(bgm2moegirl_path, encoding="utf-8") as f:
-            bgm2moegirl_content = await f.read()
-            bgm2moegirl = json.loads(bgm2moegirl_content)
-
-        # 加载id_tags_mapping.json
-        id_tags_path = DATA_DIR / "id_tags_mapping.json"
-        async with aiofiles.open(id_tags_path, encoding="utf-8") as f:
-            id_tags_content = await f.read()
-            id_tags = json.loads(id_tags_content)
-
-        # 加载filtered_id_tags_mapping.json
-        filtered_id_tags_path = DATA_DIR / "filtered_id_tags_mapping.json"
-        async with aiofiles.open(filtered_id_tags_path, encoding="utf-8") as f:
-            filtered_id_tags_content = await f.read()
-            filtered_id_tags = json.loads(filtered_id_tags_content)
-
-        # 创建并返回角色数据集合
-        return CharacterDataCollection(
-            char2attr=char2attr, bgm2moegirl=bgm2moegirl, id_tags=id_tags, filtered_id_tags=filtered_id_tags
+        # 解析 JSON 耗时较长，放到线程中执行
+        paths = dataset_files(versions.path(version))
+        if paths is None:
+            raise FileNotFoundError(f"数据版本 {version} 的文件不完整")
+        names = DATA_FILES if include_tags else ("char2attr.json",)
+        data = dict(zip(names, await asyncio.gather(*(asyncio.to_thread(_read_json, paths[f]) for f in names))))
+
+        # 创建并返回角色数据集合，数据校验同样放到线程中
+        return await asyncio.to_thread(
+            CharacterDataCollection,
+            char2attr=data["char2attr.json"],
+            bgm2moegirl=data.get("bgm2moegirl.json", {}),
+            id_tags=data.get("id_tags_mapping.json", {}),
+            filtered_id_tags=data.get("filtered_id_tags_mapping.json", {}),
         )
 
     except Exception as e:
@@ -148,54 +256,133 @@ async def filter_character_data(min_attrs: int = 5) -> Char2Attr:
 
 async def create_character_database() -> CharacterDatabase | None:
     """
-    创建并返回角色数据库对象
+    创建并返回当前数据版本的角色数据库对象，优先加载编译好的索引
     Returns:
         Optional[CharacterDatabase]: 角色数据库对象，如果创建失败则返回None
     """
-    data_collection = await load_character_data_from_file()
+    version = await ensure_data_version()
+    if version is None:
+        logger.error("没有可用的数据版本，无法创建角色数据库")
+        return None
+
+    try:
+        character_db = await asyncio.to_thread(versions.load_index, version)
+    except Exception as e:
+        logger.warning(f"加载数据版本 {version} 的编译索引失败: {e}")
+        character_db = None
+    if character_db is not None:
+        logger.info(f"已加载数据版本 {version} 的编译索引，包含 {len(character_db.characters)} 个角色")
+        # 增量更新后保存的索引没有区分度，补充计算后重新保存
+        if not character_db.has_distinguish_scores:
+            await _compute_and_save_index(version, character_db)
+        return character_db
+
+    data_collection = await load_character_data_from_file(version)
 
     if data_collection.is_empty():
         logger.error("加载角色数据失败，无法创建角色数据库")
         return None
 
-    # 创建角色数据库（使用配置中的最小属性数量进行过滤）
+    # 创建包含全部角色的核心数据库，各难度的角色池是它的子集视图，最小属性数量在划分难度时过滤
     try:
-        character_db = data_collection.create_database(plugin_config.aniguessr_min_attrs)
+        character_db = await asyncio.to_thread(data_collection.create_database)
         logger.info(f"成功创建角色数据库，包含 {len(character_db.characters)} 个角色")
-        return character_db
     except Exception as e:
         logger.error(f"创建角色数据库失败: {e}")
         return None
 
+    await _compute_and_save_index(version, character_db)
+    return character_db
 
-async def preprocess_character_data() -> bool:
+
+async def _compute_and_save_index(version: str, character_db: CharacterDatabase) -> None:
+    """计算角色区分度并保存编译索引，之后启动或切换到这个版本时不需要重新解析和计算"""
+    try:
+        await asyncio.to_thread(character_db.compute_distinguish_scores)
+    except Exception as e:
+        logger.warning(f"计算角色区分度失败: {e}")
+        return
+    try:
+        await asyncio.to_thread(versions.save_index, version, character_db)
+    except Exception as e:
+        logger.warning(f"保存数据版本 {version} 的编译索引失败: {e}")
+
+
+async def refresh_distinguish_scores(character_db: CharacterDatabase) -> None:
     """
-    预处理角色数据，生成额外的索引或优化结构
-    Returns:
-        bool: 预处理是否成功
+    增量更新（数据更新、导入或删除角色包）后在后台重新计算区分度，计算期间又有增量更新时基于新数据重新计算
+    Args:
+        character_db: 正在使用的角色数据库，计算完成后以合并的 CSR 替换覆盖层
     """
     try:
-        data_collection = await load_character_data_from_file()
+        while not character_db.has_distinguish_scores:
+            # 合并时遍历数据库，期间不能有增量更新；计算只读取合并后的 CSR，不需要持有锁
+            async with character_db_lock:
+                generation = character_db.generation
+                index = await asyncio.to_thread(character_db.compiled_index)
+            scores = await asyncio.to_thread(compute_scores, index)
+            if character_db.install_distinguish_scores(index, scores, generation):
+                logger.info(f"已重新计算 {len(index.names)} 个角色的区分度")
+    except Exception as e:
+        logger.warning(f"重新计算角色区分度失败: {e}")
 
-        if data_collection.is_empty():
-            logger.error("角色数据为空，无法预处理")
-            return False
 
-        # 创建属性到角色的反向索引
-        attr2chars = {}
-        for char_name, attrs in data_collection.char2attr.items():
-            for attr in attrs:
-                if attr not in attr2chars:
-                    attr2chars[attr] = []
-                attr2chars[attr].append(char_name)
+async def create_tag_database(source: TagSource = "filtered") -> CharacterDatabase | None:
+    """
+    创建当前数据版本的标签模式角色数据库，只读取标签数据和 Bangumi 映射
+    Args:
+        source: 标签来源，filtered 为过滤后的常用标签，full 为全部标签
+    Returns:
+        CharacterDatabase | None: 标签模式的角色数据库，失败时返回 None
+    """
+    version = await ensure_data_version()
+    if version is None:
+        return None
+    try:
+        paths = dataset_files(versions.path(version))
+        if paths is None:
+            raise FileNotFoundError(f"数据版本 {version} 的文件不完整")
+        id_tags, bgm2moegirl = await asyncio.gather(
+            asyncio.to_thread(_read_json, paths[TAG_FILES[source]]),
+            asyncio.to_thread(_read_json, paths["bgm2moegirl.json"]),
+        )
+        tag_db = await asyncio.to_thread(build_tag_database, id_tags, bgm2moegirl)
+    except Exception as e:
+        logger.error(f"创建标签模式角色数据库失败: {e}")
+        return None
+    logger.info(f"已加载数据版本 {version} 的标签数据，包含 {len(tag_db.characters)} 个角色")
+    return tag_db
+
 
-        # 保存预处理后的数据
-        attr2chars_path = DATA_DIR / "attr2chars.json"
+async def switch_data_version(version: str | None = None) -> str:
+    """
+    切换数据版本
+    Args:
+        version: 版本号或其前缀，为空时回滚到上一个版本
+    Returns:
+        str: 切换后的版本号
+    Raises:
+        ValueError: 版本不存在或没有可回滚的版本
+    """
+    if version is None:
+        target = await asyncio.to_thread(versions.previous)
+        if target is None:
+            raise ValueError("没有更早的数据版本")
+    else:
+        target = await asyncio.to_thread(versions.resolve, version)
+    await asyncio.to_thread(versions.activate, target)
+    return target
 
-        async with aiofiles.open(attr2chars_path, "w", encoding="utf-8") as f:
-            await f.write(json.dumps(attr2chars, ensure_ascii=False, indent=2))
 
-        return True
+async def preprocess_character_data() -> bool:
+    """
+    预处理角色数据，为当前数据版本编译角色数据库索引
+    Returns:
+        bool: 预处理是否成功
+    """
+    try:
+        # 编译后的索引保存在版本目录中，之后加载或切换到这个版本时直接使用
+        return await create_character_database() is not None
 
     except Exception as e:
         logger.error(f"预处理角色数据失败: {e}")
@@ -224,6 +411,60 @@ async def update_character_data() -> bool:
         return False
 
 
+async def update_character_data_incremental(
+    character_db: CharacterDatabase, extra: Callable[[], dict[str, list[str]]] | None = None
+) -> CharacterDelta | None:
+    """
+    更新角色数据，并将正在使用的角色数据库增量更新到新数据，不重新构建整个数据库
+    Args:
+        character_db: 正在使用的角色数据库，会被原地修改
+        extra: 返回不属于上游数据、需要保留的角色（角色包），与上游角色重名时以上游数据为准。
+            下载完成后持有 character_db_lock 时调用，包含下载期间导入的角色包
+    Returns:
+        CharacterDelta | None: 新旧数据的差异，更新失败时返回 None
+    """
+    async with _update_lock:
+        try:
+            if not await download_character_data(force_update=True):
+                return None
+
+            version = versions.current()
+            paths = dataset_files(versions.path(version))
+            if paths is None:
+                logger.error(f"数据版本 {version} 的文件不完整")
+                return None
+            # 解析和比较只读取数据，放到线程中执行
+            char2attr = await asyncio.to_thread(_read_json, paths["char2attr.json"])
+            # 比较到应用期间不导入或删除角色包，线程中遍历的数据库不会被修改
+            async with character_db_lock:
+                packs = extra() if extra is not None else {}
+                if packs:
+                    char2attr = {**packs, **char2attr}
+                delta = await asyncio.to_thread(diff_char2attr, character_db.characters, char2attr)
+                if delta.is_empty():
+                    logger.info(f"数据版本 {version} 的角色数据没有变化")
+                    return delta
+
+                # 在事件循环中修改索引，耗时与变化量成正比，对局不会读到更新了一半的数据
+                vocab_added, vocab_removed = character_db.apply_delta(delta)
+            logger.info(
+                f"已增量更新到数据版本 {version}：{delta.summary()}，"
+                f"新出现 {len(vocab_added)} 个属性，移除 {len(vocab_removed)} 个属性"
+            )
+
+            # 编译索引只保存上游数据，包含角色包时不保存，下次启动重新构建
+            if not packs:
+                try:
+                    await asyncio.to_thread(versions.save_index, version, character_db)
+                except Exception as e:
+                    logger.warning(f"保存数据版本 {version} 的编译索引失败: {e}")
+            return delta
+
+        except Exception as e:
+            logger.error(f"增量更新角色数据失败: {e}")
+            return None
+
+
 async def load_character_data() -> CharacterDataCollection:
     """
     加载并处理角色数据，用于游戏
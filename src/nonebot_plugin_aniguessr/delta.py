@@ -0,0 +1,57 @@
+"""
+角色数据增量更新
+
+每周的上游数据通常只改动少量角色，更新时比较新旧 char2attr 得到差异，
+只修改受影响的角色和属性的索引，不重新构建整个数据库。
+"""
+
+from dataclasses import dataclass, field
+
+
+@dataclass(frozen=True)
+class CharacterDelta:
+    """新旧角色数据的差异"""
+
+    # 新增的角色及其属性
+    added: dict[str, list[str]] = field(default_factory=dict)
+    # 删除的角色及其原有属性
+    removed: dict[str, list[str]] = field(default_factory=dict)
+    # 属性有变化的角色：(原有属性, 新属性)
+    changed: dict[str, tuple[list[str], list[str]]] = field(default_factory=dict)
+
+    def is_empty(self) -> bool:
+        """没有任何变化"""
+        return not (self.added or self.removed or self.changed)
+
+    def touched(self) -> set[str]:
+        """受影响的角色名"""
+        return {*self.added, *self.removed, *self.changed}
+
+    def summary(self) -> str:
+        """变化摘要"""
+        attrs_added = sum(len(set(new) - set(old)) for old, new in self.changed.values())
+        attrs_removed = sum(len(set(old) - set(new)) for old, new in self.changed.values())
+        return (
+            f"新增 {len(self.added)} 个角色，删除 {len(self.removed)} 个角色，"
+            f"修改 {len(self.changed)} 个角色（增加 {attrs_added} 项属性，移除 {attrs_removed} 项属性）"
+        )
+
+
+def diff_char2attr(old: dict[str, list[str]], new: dict[str, list[str]]) -> CharacterDelta:
+    """
+    比较新旧角色数据
+    Args:
+        old: 原有的角色属性
+        new: 新的角色属性
+    Returns:
+        CharacterDelta: 差异
+    """
+    added = {name: attrs for name, attrs in new.items() if name not in old}
+    removed = {name: attrs for name, attrs in old.items() if name not in new}
+    changed = {}
+    for name, new_attrs in new.items():
+        old_attrs = old.get(name)
+        # 绝大多数角色没有变化，列表比较即可跳过
+        if old_attrs is not None and old_attrs != new_attrs:
+            changed[name] = (old_attrs, new_attrs)
+    return CharacterDelta(added=added, removed=removed, changed=changed)
@@ -0,0 +1,181 @@
+"""
+角色区分度
+
+有些角色的属性与其他角色几乎相同，无论怎么猜都无法单独确定。编译索引时离线计算每个角色：
+
+- 区分度：最少需要多少个属性才能唯一确定这个角色（集合覆盖问题，用贪心近似：每一步选择剩余候选最少的属性），
+  0 表示其他角色具有它的全部属性，无法唯一确定
+- 近邻：与它最难区分的角色，即贪心的最后一步之前仍未排除的角色中属性最相似（Jaccard）的几个
+
+结果以角色编号为下标保存在数组中，随编译索引一起保存，对局开始时查询是 O(1) 的。
+候选角色较多时用整数位集（每个属性一个 Python int）按位与并计数，较少时逐个统计候选角色的属性。
+"""
+
+from array import array
+from collections import Counter
+from collections.abc import Iterable
+import heapq
+
+from .csr import CSRIndex
+
+NO_NEIGHBOR = 0xFFFFFFFF
+# 每个角色保存的近邻数量
+NEIGHBORS = 3
+# 候选角色超过这个数量时使用位集计数
+BITSET_THRESHOLD = 256
+# 计算近邻时最多比较的角色数量
+NEIGHBOR_POOL = 256
+
+
+class DistinguishScores:
+    """以角色编号为下标的区分度和近邻，属于编译时的 CSR，角色编号变化后失效"""
+
+    __slots__ = ("min_attrs", "neighbor_count", "neighbors")
+
+    def __init__(self, min_attrs: array, neighbors: array, neighbor_count: int = NEIGHBORS):
+        self.min_attrs = min_attrs
+        self.neighbors = neighbors
+        self.neighbor_count = neighbor_count
+
+    def __len__(self) -> int:
+        return len(self.min_attrs)
+
+    def score(self, char_id: int) -> int:
+        """唯一确定角色最少需要的属性数量，0 表示无法唯一确定"""
+        return self.min_attrs[char_id]
+
+    def neighbor_ids(self, char_id: int) -> list[int]:
+        """与角色最难区分的角色编号，按相似度从高到低"""
+        start = char_id * self.neighbor_count
+        return [i for i in self.neighbors[start : start + self.neighbor_count] if i != NO_NEIGHBOR]
+
+    def __getstate__(self):
+        return self.min_attrs, self.neighbors, self.neighbor_count
+
+    def __setstate__(self, state) -> None:
+        self.min_attrs, self.neighbors, self.neighbor_count = state
+
+
+class _Bitsets:
+    """常见属性到角色位集，按需构建并缓存"""
+
+    def __init__(self, index: CSRIndex):
+        self.index = index
+        self.size = (len(index.names) + 7) // 8
+        # 只为具有至少 1/64 角色的属性构建位集，缓存最多占用 64 × 每个角色的平均属性数 个位集
+        self.min_posting = max(len(index.names) // 64, BITSET_THRESHOLD)
+        self._cache: dict[int, int] = {}
+
+    def of_ids(self, ids: Iterable[int]) -> int:
+        buffer = bytearray(self.size)
+        for i in ids:
+            buffer[i >> 3] |= 1 << (i & 7)
+        return int.from_bytes(buffer, "little")
+
+    def attribute(self, attr_id: int) -> int:
+        bits = self._cache.get(attr_id)
+        if bits is None:
+            bits = self._cache[attr_id] = self.of_ids(_posting(self.index, attr_id))
+        return bits
+
+
+def _posting(index: CSRIndex, attr_id: int) -> array:
+    return index.char_ids[index.attr_offsets[attr_id] : index.attr_offsets[attr_id + 1]]
+
+
+def _attributes(index: CSRIndex, char_id: int) -> array:
+    return index.attr_ids[index.offsets[char_id] : index.offsets[char_id + 1]]
+
+
+def _count(
+    index: CSRIndex, bitsets: _Bitsets, posting_len: list[int], candidates: set[int], attrs: list[int]
+) -> dict[int, int]:
+    """每个属性在候选角色中出现的次数"""
+    if len(candidates) > BITSET_THRESHOLD:
+        # 常见属性用位集按位与后计数，少见属性直接检查倒排列表中的角色
+        mask = bitsets.of_ids(candidates)
+        return {
+            attr: (mask & bitsets.attribute(attr)).bit_count()
+            if posting_len[attr] >= bitsets.min_posting
+            else sum(1 for other in _posting(index, attr) if other in candidates)
+            for attr in attrs
+        }
+    wanted = set(attrs)
+    counts = Counter(attr for char_id in candidates for attr in _attributes(index, char_id) if attr in wanted)
+    return {attr: counts[attr] for attr in attrs}
+
+
+def _greedy(
+    index: CSRIndex, bitsets: _Bitsets, posting_len: list[int], char_id: int
+) -> tuple[int, set[int], list[int]]:
+    """
+    贪心选择属性直到只剩下目标角色
+    Returns:
+        tuple: (使用的属性数量，无法唯一确定时为 0, 最后一步之前的候选角色, 按稀有程度排序的属性)
+    """
+    attrs = sorted(set(_attributes(index, char_id)), key=posting_len.__getitem__)
+    if not attrs:
+        return 0, set(), attrs
+    candidates = set(_posting(index, attrs[0]))
+    previous = candidates
+    rest = attrs[1:]
+    steps = 1
+    while len(candidates) > 1 and rest:
+        counts = _count(index, bitsets, posting_len, candidates, rest)
+        best = min(rest, key=lambda attr: (counts[attr], posting_len[attr]))
+        if counts[best] == len(candidates):
+            # 剩余的属性都不能再排除任何角色
+            break
+        previous = candidates
+        if len(candidates) <= BITSET_THRESHOLD:
+            # 候选较少时检查候选角色的属性，不遍历可能很长的倒排列表
+            candidates = {other for other in candidates if best in _attributes(index, other)}
+        else:
+            candidates = candidates.intersection(_posting(index, best))
+        rest.remove(best)
+        steps += 1
+    if len(candidates) > 1:
+        return 0, candidates, attrs
+    return steps, previous, attrs
+
+
+def _neighbors(index: CSRIndex, char_id: int, pool: set[int], attrs: list[int], count: int) -> list[int]:
+    """候选中与角色属性最相似的几个角色"""
+    pool.discard(char_id)
+    if len(pool) > NEIGHBOR_POOL:
+        pool = set(sorted(pool)[:NEIGHBOR_POOL])
+    own = set(attrs)
+
+    def distance(other: int) -> tuple[float, int]:
+        other_attrs = _attributes(index, other)
+        shared = len(own.intersection(other_attrs))
+        return -shared / (len(own) + len(other_attrs) - shared), other
+
+    return heapq.nsmallest(count, pool, key=distance)
+
+
+def compute_scores(index: CSRIndex, neighbor_count: int = NEIGHBORS) -> DistinguishScores:
+    """
+    计算全部角色的区分度和近邻，耗时与角色数量成正比，在编译索引时执行
+    Args:
+        index: 角色数据的 CSR
+        neighbor_count: 每个角色保存的近邻数量
+    Returns:
+        DistinguishScores: 以角色编号为下标的结果
+    """
+    total = len(index.names)
+    posting_len = [index.attr_offsets[i + 1] - index.attr_offsets[i] for i in range(len(index.vocab))]
+    bitsets = _Bitsets(index)
+    min_attrs = array("B", bytes(total))
+    neighbors = array("I", [NO_NEIGHBOR]) * (total * neighbor_count)
+
+    for char_id in range(total):
+        steps, pool, attrs = _greedy(index, bitsets, posting_len, char_id)
+        min_attrs[char_id] = min(steps, 255)
+        if steps == 1 and len(attrs) > 1:
+            # 一个属性就能确定时，最后一步之前是全部角色，改为与具有第二稀有属性的角色比较
+            pool = set(_posting(index, attrs[1]))
+        start = char_id * neighbor_count
+        for offset, other in enumerate(_neighbors(index, char_id, pool, attrs, neighbor_count)):
+            neighbors[start + offset] = other
+    return DistinguishScores(min_attrs, neighbors, neighbor_count)
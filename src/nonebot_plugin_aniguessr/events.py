@@ -0,0 +1,220 @@
+"""
+对局事件日志
+
+每个对局事件（开始、猜测、查看候选、结束）以一行紧凑的 JSON 追加到 events.jsonl：
+
+    {"seq":1024,"ts":1700000000.123,"type":"guess","user":"123","game":"1a2b3c4d","seed":42,"input":"御坂","name":"御坂美琴","method":"fuzzy",...}
+
+与战绩相同采用 write-behind：消息处理中只把事件放入内存缓冲区，由后台任务按批大小或时间间隔
+在线程中序列化并写入。当前文件超过大小上限时轮转为 events-<时间>.jsonl（可压缩），只保留最近的若干个。
+
+seq 是单调递增的事件序号，重启后从日志中记录的最大序号继续，增量统计以它作为读取进度，
+不受系统时间回拨影响。
+"""
+
+import asyncio
+from collections import deque
+from collections.abc import Iterable, Iterator, Sequence
+import json
+import os
+from pathlib import Path
+import time
+from typing import Any
+
+from nonebot import logger
+
+from .compression import Compression, compress_file, open_decompressed
+
+CURRENT_FILE = "events.jsonl"
+ROTATED_PREFIX = "events-"
+# 最近一次轮转时的最大事件序号，当前文件为空时由此恢复序号
+SEQ_FILE = "events.seq"
+# 恢复序号时读取当前文件末尾的字节数
+TAIL_BYTES = 1 << 16
+
+
+class EventLog:
+    """对局事件日志，写入经由后台批量写入任务"""
+
+    def __init__(
+        self,
+        directory: Path,
+        batch_size: int = 256,
+        flush_interval: float = 5.0,
+        max_bytes: int = 16 << 20,
+        keep_files: int = 10,
+        compression: Compression = "gzip",
+        max_buffer: int = 100000,
+    ):
+        """
+        Args:
+            directory: 事件日志目录
+            batch_size: 缓冲区达到这个数量时立即写入
+            flush_interval: 最长写入间隔（秒）
+            max_bytes: 当前文件的大小上限，超过后轮转
+            keep_files: 保留的轮转文件数量，0 表示不保留
+            compression: 轮转文件的压缩格式
+            max_buffer: 缓冲区上限，写入跟不上时丢弃最早的事件，不无限占用内存
+        """
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.keep_files = keep_files
+        self.compression = compression
+        self.max_buffer = max_buffer
+        # 达到上限时 append 自动丢弃最早的事件
+        self._buffer: deque[dict[str, Any]] = deque(maxlen=max_buffer)
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._writer: asyncio.Task | None = None
+        self._closing = False
+        # 最后分配的事件序号
+        self.seq = 0
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+
+    @property
+    def path(self) -> Path:
+        """当前写入的文件"""
+        return self.directory / CURRENT_FILE
+
+    def open(self) -> None:
+        """创建目录，恢复事件序号并启动后台写入任务"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.seq = last_seq(self.directory)
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def close(self) -> None:
+        """通知后台写入任务写完剩余事件后退出"""
+        if self._writer is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._writer
+            self._writer = None
+        # 后台任务异常退出时也写入剩余事件
+        await self.flush()
+
+    def emit(self, event_type: str, **fields: Any) -> None:
+        """记录一个事件，只放入缓冲区，不等待写入"""
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self.seq += 1
+        self._buffer.append({"seq": self.seq, "ts": round(time.time(), 3), "type": event_type, **fields})
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        """立即写入缓冲区中的全部事件，写入失败时放回缓冲区，下次写入时重试"""
+        async with self._lock:
+            batch, self._buffer = self._buffer, deque(maxlen=self.max_buffer)
+            if not batch:
+                return
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except Exception:
+                # 放在写入期间记录的事件之前，超过上限时丢弃最早的事件；
+                # 部分写入的事件重试时会重复，统计按序号跳过
+                pending = len(batch) + len(self._buffer)
+                batch.extend(self._buffer)
+                self._buffer = batch
+                self.dropped += max(pending - self.max_buffer, 0)
+                raise
+
+    async def _write_loop(self) -> None:
+        """缓冲区达到批大小或距上次写入超过间隔时批量写入，关闭时写完当前批次后退出"""
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"写入对局事件失败: {e}")
+
+    def _write_batch(self, batch: Sequence[dict[str, Any]]) -> None:
+        """序列化并追加一批事件，超过大小上限时轮转"""
+        data = "".join(json.dumps(event, ensure_ascii=False, separators=(",", ":")) + "\n" for event in batch)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(data)
+            size = f.tell()
+        self.written += len(batch)
+        if size >= self.max_bytes:
+            # 事件已经写入，轮转失败不重试写入，下次写入后再次轮转
+            try:
+                self._rotate(batch[-1]["seq"])
+            except OSError as e:
+                logger.error(f"轮转对局事件日志失败: {e}")
+
+    def _rotate(self, seq: int) -> None:
+        """当前文件改名为带时间的轮转文件并压缩，删除超出保留数量的旧文件，seq 为当前文件中最大的事件序号"""
+        (self.directory / SEQ_FILE).write_text(str(seq), encoding="utf-8")
+        rotated = self.directory / f"{ROTATED_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}-{self.rotations:04d}.jsonl"
+        os.replace(self.path, rotated)
+        self.rotations += 1
+        compress_file(rotated, self.compression)
+        files = rotated_files(self.directory)
+        for old in files[: max(len(files) - self.keep_files, 0)]:
+            old.unlink(missing_ok=True)
+
+    def stats(self) -> dict[str, float]:
+        """写入统计，用于运行指标"""
+        return {
+            "written": self.written,
+            "buffered": len(self._buffer),
+            "dropped": self.dropped,
+            "rotations": self.rotations,
+        }
+
+
+def rotated_files(directory: Path) -> list[Path]:
+    """目录中的轮转文件，文件名以轮转时间开头，按文件名排序即从旧到新"""
+    return sorted(directory.glob(f"{ROTATED_PREFIX}*"), key=lambda path: path.name)
+
+
+def last_seq(directory: Path) -> int:
+    """日志中最大的事件序号：当前文件最后一个完整的事件和最近一次轮转时记录的序号中较大的一个"""
+    try:
+        seq = int((directory / SEQ_FILE).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        seq = 0
+    try:
+        with (directory / CURRENT_FILE).open("rb") as f:
+            f.seek(max(f.seek(0, os.SEEK_END) - TAIL_BYTES, 0))
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return seq
+    # 最后一行可能是写入中断留下的半行
+    for line in reversed(lines):
+        try:
+            return max(seq, int(json.loads(line)["seq"]))
+        except (ValueError, KeyError, TypeError):
+            continue
+    return seq
+
+
+def parse_events(lines: Iterable[str]) -> Iterator[dict[str, Any]]:
+    """逐行解析事件，损坏的行（如写入中断留下的半行）被跳过"""
+    for line in lines:
+        try:
+            yield json.loads(line)
+        except ValueError:
+            continue
+
+
+def read_event_file(path: Path) -> Iterator[dict[str, Any]]:
+    """逐行读取一个事件日志文件，损坏的行被跳过"""
+    with open_decompressed(path) as f:
+        yield from parse_events(f)
+
+
+def read_events(directory: Path) -> Iterator[dict[str, Any]]:
+    """按时间顺序读取目录中的全部事件（轮转文件和当前文件）"""
+    files = rotated_files(directory)
+    if (directory / CURRENT_FILE).exists():
+        files.append(directory / CURRENT_FILE)
+    for path in files:
+        yield from read_event_file(path)
@@ -1,17 +1,33 @@
-import asyncio
+from collections.abc import Collection, Sequence
 import difflib
 import random
+import secrets
+import time
 
 from nonebot import logger
 
+from .cache import LRUCache
 from .config import plugin_config
+from .daily import DailyChallenge
 from .model import (
+    MISSING_IN_TARGET,
+    PRESENT_IN_TARGET,
     AttributeComparison,
     AttributeStatus,
     CharacterDatabase,
     CharacterGuessResult,
+    CharacterPool,
     ComparisonStatus,
     GameSettings,
+    exact_comparison,
+)
+from .ranking import CandidateCursor, attribute_count_key
+from .ratelimit import run_cpu_bound
+from .workers import guess_workers
+
+# 所有对局共享的候选角色缓存，键为 (角色池或每日挑战, 数据库更新次数, 已确认属性, 已排除属性)
+candidate_cache: LRUCache[tuple, frozenset[str]] = LRUCache(
+    plugin_config.aniguessr_candidate_cache_size, plugin_config.aniguessr_candidate_cache_names, len
 )
 
 
@@ -20,11 +36,39 @@ class AniGuessrGame:
 
     def __init__(
         self,
-        character_db: CharacterDatabase,
+        character_db: CharacterDatabase | CharacterPool,
         settings: GameSettings | None = None,
+        daily: DailyChallenge | None = None,
+        target: str | None = None,
+        rng: random.Random | None = None,
+        seed: int | None = None,
+        mode: str = "normal",
+        hidden_names: Collection[str] = frozenset(),
     ):
+        """
+        Args:
+            character_db: 角色数据库或角色池
+            settings: 游戏设置，默认使用插件配置
+            daily: 每日挑战，目标和提示使用预计算的结果
+            target: 指定目标角色，默认随机选择
+            rng: 随机数生成器，用于选择目标和提示
+            seed: 对局种子，未指定 rng 时使用；相同的角色池、设置和种子得到相同的目标和提示
+            mode: 游戏模式（normal、tag），每日挑战固定为 daily
+            hidden_names: 数据库中不能猜测的角色，即本群没有启用的角色包中的角色
+        """
         self.character_db = character_db
+        self.mode = "daily" if daily is not None else mode
+        # 每局记录种子，反馈问题时可以复现对局
+        if daily is not None:
+            seed = daily.seed
+        elif seed is None and rng is None:
+            seed = random.getrandbits(32)
+        self.seed = seed
+        # 显示给玩家的对局编号，与种子无关，种子可以复现目标，只记录在日志中
+        self.game_id = secrets.token_hex(4)
+        self.rng = rng or random.Random(seed)
         self.char2attr = character_db.characters
+        self.hidden_names = hidden_names
 
         # 使用设置或默认值
         self.settings = settings or GameSettings(
@@ -34,10 +78,22 @@ class AniGuessrGame:
             min_attrs=plugin_config.aniguessr_min_attrs,
         )
 
-        # 从字典中随机选择一个角色作为目标
-        self.target_character = self.character_db.get_random_character()
-        self.target_name = self.target_character.name
-        self.target_attrs = self.target_character.attributes
+        # 每日挑战使用共享的预计算目标，否则从字典中随机选择一个角色作为目标
+        self.daily = daily
+        if daily is not None:
+            self.target_name = daily.target_name
+            self.target_attrs = daily.target_attrs
+            self.target_attr_set = daily.target_attr_set
+        else:
+            if target is not None:
+                target_character = self.character_db.get_character(target)
+                if target_character is None:
+                    raise ValueError(f"角色 '{target}' 不存在")
+            else:
+                target_character = self.character_db.get_random_character(self.rng)
+            self.target_name = target_character.name
+            self.target_attrs = target_character.attributes
+            self.target_attr_set = frozenset(self.target_attrs)
 
         # 保存猜测历史
         self.attempts = 0
@@ -45,17 +101,22 @@ class AniGuessrGame:
 
         # 维护已知的目标角色属性状态
         self.attr_status = AttributeStatus()
+        # 候选角色分页游标，属性状态或角色数据变化后重建
+        self._candidate_cursor: CandidateCursor | None = None
+        self._candidate_cursor_key: tuple[int, int, int] | None = None
 
         # 属性分类（用于比较）
         self.numeric_attrs = {"身高", "体重", "年龄", "胸围"}
 
-        # 用于预加载和筛选有效属性
-        self.valid_attrs = self.character_db.get_all_attributes()
+        # 创建时间戳，用于超时检查，使用单调时钟，不依赖事件循环
+        self.start_time = time.monotonic()
 
-        # 创建时间戳，用于超时检查
-        self.start_time = asyncio.get_event_loop().time()
+        logger.info(f"游戏创建成功，对局编号: {self.game_id}，目标角色: {self.target_name}，种子: {self.seed}")
 
-        logger.info(f"游戏创建成功，目标角色: {self.target_name}")
+    @property
+    def valid_attrs(self) -> set[str]:
+        """所有有效属性，按需计算，创建对局时不再复制整个属性集合"""
+        return self.character_db.get_all_attributes()
 
     def get_target_name(self) -> str:
         """获取目标角色名称"""
@@ -63,6 +124,11 @@ class AniGuessrGame:
 
     def get_random_attrs(self, count: int | None = None) -> list[str]:
         """获取随机属性作为提示"""
+        # 每日挑战的提示是固定的
+        if self.daily is not None:
+            self.attr_status.add_confirmed_many(self.daily.hints)
+            return list(self.daily.hints)
+
         # 如果未指定数量，使用设置中的值
         if count is None:
             count = self.settings.hint_count
@@ -74,14 +140,21 @@ class AniGuessrGame:
             return self.target_attrs
 
         # 随机选择属性，并将其添加到已确认属性中
-        selected_attrs = random.sample(self.target_attrs, count)
+        selected_attrs = self.rng.sample(self.target_attrs, count)
         self.attr_status.add_confirmed_many(selected_attrs)
         return selected_attrs
 
     def is_timed_out(self) -> bool:
         """检查游戏是否超时"""
-        current_time = asyncio.get_event_loop().time()
-        return (current_time - self.start_time) > self.settings.timeout_seconds
+        return self.elapsed_seconds() > self.settings.timeout_seconds
+
+    def elapsed_seconds(self) -> float:
+        """游戏已进行的时间（秒）"""
+        return time.monotonic() - self.start_time
+
+    def remaining_seconds(self) -> int:
+        """游戏剩余时间（秒）"""
+        return int(self.settings.timeout_seconds - self.elapsed_seconds())
 
     def is_max_attempts_reached(self) -> bool:
         """检查是否达到最大尝试次数"""
@@ -118,89 +191,114 @@ class AniGuessrGame:
         else:
             return ComparisonStatus.LOWER
 
-    def _find_closest_character(self, character_name: str) -> str:
-        """查找最接近的角色名（模糊匹配）"""
-        if character_name not in self.char2attr:
-            closest_matches = difflib.get_close_matches(character_name, self.char2attr.keys(), n=1, cutoff=0.6)
+    def _is_known_name(self, character_name: str) -> bool:
+        """角色名是否可以直接使用，目标角色可能在对局进行中被数据更新删除，仍然可以猜中"""
+        if character_name == self.target_name:
+            return True
+        return character_name in self.char2attr and character_name not in self.hidden_names
 
-            if not closest_matches:
+    def _find_closest_character(self, character_name: str, names: Sequence[str] | None = None) -> str:
+        """
+        查找最接近的角色名（模糊匹配）
+        Args:
+            character_name: 输入的角色名
+            names: 候选的角色名，在线程中调用时必须传入事件循环中取得的快照，默认使用当前的全部角色名
+        """
+        if not self._is_known_name(character_name):
+            names = self.character_db.name_snapshot() if names is None else names
+            # 多取不能猜测的角色数量个结果，过滤后仍能得到最接近的可猜测角色
+            closest_matches = difflib.get_close_matches(character_name, names, n=len(self.hidden_names) + 1, cutoff=0.6)
+            closest = next((name for name in closest_matches if name not in self.hidden_names), None)
+
+            if closest is None:
                 raise ValueError(f"没有找到角色 '{character_name}'，请尝试其他角色名")
 
-            character_name = closest_matches[0]
+            character_name = closest
             logger.info(f"模糊匹配: '{character_name}'")
 
         return character_name
 
-    def _compare_attributes(self, guessed_character_name: str) -> dict[str, AttributeComparison]:
-        """比较目标角色和猜测角色的属性"""
+    def _compare_attributes(self, guessed_character_name: str) -> tuple[dict[str, AttributeComparison], frozenset[str]]:
+        """
+        比较目标角色和猜测角色的属性
+        Returns:
+            tuple: (属性比较结果, 本次猜测新获得信息的属性)
+        """
         comparisons: dict[str, AttributeComparison] = {}
 
         guessed_character = self.character_db.get_character(guessed_character_name)
         if not guessed_character:
-            return comparisons
+            return comparisons, frozenset()
 
         guessed_attrs = set(guessed_character.attributes)
-        target_attrs = set(self.target_attrs)
-
-        # 比较所有猜测角色的属性
-        for attr in guessed_attrs:
-            if attr in target_attrs:
-                # 属性匹配，添加到已确认属性
-                self.attr_status.add_confirmed(attr)
-
-                # 两个角色都有这个属性
-                if attr in self.numeric_attrs:
-                    # 数值型属性特殊处理
-                    status = self._compare_numeric_attribute(attr, attr, attr)
-
-                    description = "数值相近"
-                    if status == ComparisonStatus.HIGHER:
-                        description = "目标角色的值更高"
-                    elif status == ComparisonStatus.LOWER:
-                        description = "目标角色的值更低"
-
-                    comparisons[attr] = AttributeComparison(status=status, value=attr, description=description)
-                else:
-                    # 非数值型属性
-                    comparisons[attr] = AttributeComparison(status=ComparisonStatus.EXACT, value=attr)
+        target_attrs = self.target_attr_set
+        new_attrs = frozenset(guessed_attrs - self.attr_status.confirmed - self.attr_status.excluded)
+
+        # 比较所有猜测角色的属性，按角色数据中的顺序输出
+        for attr in guessed_character.attributes:
+            if attr not in target_attrs:
+                # 目标角色没有此属性
+                comparisons[attr] = MISSING_IN_TARGET
+            elif attr in self.numeric_attrs:
+                # 数值型属性特殊处理
+                status = self._compare_numeric_attribute(attr, attr, attr)
+
+                description = "数值相近"
+                if status == ComparisonStatus.HIGHER:
+                    description = "目标角色的值更高"
+                elif status == ComparisonStatus.LOWER:
+                    description = "目标角色的值更低"
+
+                comparisons[attr] = AttributeComparison(status=status, value=attr, description=description)
             else:
-                # 目标角色没有此属性，添加到排除属性
-                self.attr_status.add_excluded(attr)
-                comparisons[attr] = AttributeComparison(
-                    status=ComparisonStatus.DIFFERENT,
-                    value="目标角色不具有此特征",
-                    description="该特征不存在于目标角色中",
-                )
+                # 两个角色都有这个属性
+                comparisons[attr] = exact_comparison(attr)
 
-        # 检查目标角色特有的属性（已确认但猜测角色没有的）
-        confirmed_but_not_guessed = self.attr_status.confirmed - guessed_attrs
-        for attr in confirmed_but_not_guessed:
-            comparisons[attr] = AttributeComparison(
-                status=ComparisonStatus.DIFFERENT,
-                value="目标角色具有此特征",
-                description="该特征存在于目标角色中",
-            )
+        # 匹配的属性添加到已确认属性，其余添加到排除属性
+        self.attr_status.add_confirmed_many(guessed_attrs & target_attrs)
+        self.attr_status.add_excluded_many(guessed_attrs - target_attrs)
 
-        return comparisons
+        # 检查目标角色特有的属性（已确认但猜测角色没有的）
+        for attr in self.attr_status.confirmed - guessed_attrs:
+            comparisons[attr] = PRESENT_IN_TARGET
+
+        return comparisons, new_attrs
+
+    def _candidate_key(self) -> tuple:
+        """候选角色缓存的键，属性状态相同的对局（同一角色池的相同提示、每日挑战）共享同一份结果"""
+        base = self.daily if self.daily is not None else self.character_db
+        return (
+            base,
+            self.character_db.generation,
+            frozenset(self.attr_status.confirmed),
+            frozenset(self.attr_status.excluded),
+        )
 
-    def get_candidate_characters(self) -> list[str]:
-        """
-        根据已知的属性状态，获取可能的候选角色列表
-        Returns:
-            list[str]: 候选角色名称列表
-        """
+    def _candidate_set(self) -> frozenset[str]:
+        """根据已知的属性状态计算候选角色集合"""
         if self.attr_status.is_empty():
-            # 没有任何线索时，返回空列表
-            return []
-
-        candidates = set(self.char2attr.keys())
-
-        # 剔除已经猜过的角色
-        candidates -= self.guessed_characters
+            # 没有任何线索时，返回空集合
+            return frozenset()
+
+        # 猜过的角色在缓存之外剔除
+        candidates = candidate_cache.get_or_compute(self._candidate_key(), self._filter_candidates)
+        if self.guessed_characters and not candidates.isdisjoint(self.guessed_characters):
+            candidates = candidates - self.guessed_characters
+        return candidates
+
+    def _filter_candidates(self) -> frozenset[str]:
+        """按已确认和已排除的属性筛选角色，不考虑猜测记录"""
+        # 每日挑战从预计算的提示候选集合开始，提示属性无需再求交集
+        confirmed = self.attr_status.confirmed
+        if self.daily is not None:
+            candidates = set(self.daily.base_candidates)
+            confirmed = confirmed - self.daily.hint_set
+        else:
+            candidates = set(self.character_db.candidate_names())
 
         # 筛选拥有所有已确认属性的角色
-        if self.attr_status.confirmed:
-            for attr in self.attr_status.confirmed:
+        if confirmed:
+            for attr in confirmed:
                 chars_with_attr = set(self.character_db.get_characters_with_attribute(attr))
                 candidates &= chars_with_attr
 
@@ -210,7 +308,50 @@ class AniGuessrGame:
                 chars_with_attr = set(self.character_db.get_characters_with_attribute(attr))
                 candidates -= chars_with_attr
 
-        return sorted(candidates)
+        return frozenset(candidates)
+
+    async def prepare_candidates(self) -> None:
+        """
+        候选角色集合不在缓存中时，由猜测计算进程筛选后放入缓存，之后的 get_candidate_cursor 直接命中缓存；
+        未启用进程池或进程池不可用时不做任何事，由 get_candidate_cursor 在当前线程中计算
+        """
+        workers = guess_workers()
+        if workers is None or self.attr_status.is_empty() or not workers.serves(self.character_db):
+            return
+        key = self._candidate_key()
+        if candidate_cache.get(key) is not None:
+            return
+        matched = await workers.filter_candidates(key[2], key[3])
+        # 等待期间数据可能已经更新，此时结果作废
+        if self.character_db.generation != key[1]:
+            return
+        if self.daily is not None:
+            base = self.daily.base_candidates
+        elif isinstance(self.character_db, CharacterPool):
+            base = self.character_db.name_set()
+        else:
+            base = self.character_db.candidate_names()
+        candidate_cache.put(key, frozenset(name for name in matched if name in base))
+
+    def get_candidate_characters(self) -> list[str]:
+        """
+        根据已知的属性状态，获取可能的候选角色列表
+        Returns:
+            list[str]: 候选角色名称列表
+        """
+        return sorted(self._candidate_set())
+
+    def get_candidate_cursor(self) -> CandidateCursor:
+        """
+        获取按排名分页的候选角色游标，属性状态、猜测记录和角色数据不变时复用同一个游标
+        Returns:
+            CandidateCursor: 候选角色游标
+        """
+        cursor_key = (self.attr_status.version, len(self.guessed_characters), self.character_db.generation)
+        if self._candidate_cursor is None or self._candidate_cursor_key != cursor_key:
+            self._candidate_cursor = CandidateCursor(self._candidate_set(), attribute_count_key(self.char2attr))
+            self._candidate_cursor_key = cursor_key
+        return self._candidate_cursor
 
     def get_attribute_status(self) -> AttributeStatus:
         """
@@ -222,7 +363,7 @@ class AniGuessrGame:
 
     async def make_guess(self, character_name: str) -> CharacterGuessResult:
         """
-        进行一次猜测
+        进行一次猜测，角色名不存在时进行模糊匹配
 
         参数:
             character_name: 猜测的角色名
@@ -230,9 +371,44 @@ class AniGuessrGame:
         返回:
             CharacterGuessResult: 猜测结果
         """
-        self.attempts += 1
+        # 模糊匹配需要遍历所有角色名，在猜测计算进程中执行，未启用进程池时在线程中执行
+        if not self._is_known_name(character_name):
+            try:
+                character_name = await self._find_closest_character_async(character_name)
+            except ValueError:
+                # 没有匹配的角色同样计入尝试次数
+                self.attempts += 1
+                raise
+        return self.guess(character_name)
+
+    async def _find_closest_character_async(self, character_name: str) -> str:
+        """
+        不阻塞事件循环的模糊匹配
+        Raises:
+            ValueError: 没有匹配的角色
+            WorkerBusyError: 进程池拒绝请求或超时，不计入尝试次数
+        """
+        workers = guess_workers()
+        if workers is None or not workers.serves(self.character_db):
+            # 线程中只遍历快照，数据在事件循环中增量更新时不会在遍历期间修改
+            return await run_cpu_bound(self._find_closest_character, character_name, self.character_db.name_snapshot())
+        closest = await workers.match(character_name, self.hidden_names)
+        if closest is None:
+            raise ValueError(f"没有找到角色 '{character_name}'，请尝试其他角色名")
+        logger.info(f"模糊匹配: '{character_name}' -> '{closest}'")
+        return closest
+
+    def guess(self, character_name: str) -> CharacterGuessResult:
+        """
+        进行一次猜测，同步执行，供模拟器等不在事件循环中的调用方使用
+
+        参数:
+            character_name: 猜测的角色名，不存在时在当前线程中模糊匹配
 
-        # 查找最接近的角色名（模糊匹配）
+        返回:
+            CharacterGuessResult: 猜测结果
+        """
+        self.attempts += 1
         character_name = self._find_closest_character(character_name)
 
         # 记录已猜测的角色
@@ -243,11 +419,17 @@ class AniGuessrGame:
 
         # 如果猜对了，不需要进行属性比较
         comparisons = {}
+        new_attrs = frozenset()
         if not is_correct and character_name in self.char2attr:
-            comparisons = self._compare_attributes(character_name)
+            comparisons, new_attrs = self._compare_attributes(character_name)
 
         logger.info(f"猜测结果: 角色={character_name}, 正确={is_correct}, 尝试次数={self.attempts}")
 
         return CharacterGuessResult(
-            is_correct=is_correct, comparisons=comparisons, target_name=self.target_name, attempts=self.attempts
+            is_correct=is_correct,
+            comparisons=comparisons,
+            target_name=self.target_name,
+            attempts=self.attempts,
+            guessed_name=character_name,
+            new_attrs=new_attrs,
         )
@@ -0,0 +1,226 @@
+"""
+内存占用报告
+
+按组件估算对象图的深度大小（sys.getsizeof 递归累加），与上一次采样比较得到增长量，用于判断
+常驻内存的增长来自数据集、索引还是未释放的对局。
+
+多个组件共享的对象（如角色池引用的核心数据库、驻留的角色名字符串）只计入最先统计的组件，
+因此组件的顺序应为先数据后引用方。模块、类、函数和事件循环不计入。
+"""
+
+from array import array
+import asyncio
+from collections import deque
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+import os
+import sys
+import time
+import types
+
+# 不展开也不计入的对象：共享的全局对象，展开后会统计到整个解释器
+_SKIP_TYPES = (
+    type,
+    types.ModuleType,
+    types.FunctionType,
+    types.BuiltinFunctionType,
+    types.MethodType,
+    types.CodeType,
+    types.FrameType,
+)
+_CONTAINERS = (list, tuple, set, frozenset, deque)
+# 统计期间对象被事件循环修改时重试的次数
+_RETRIES = 3
+
+
+def _is_skipped(obj: object) -> bool:
+    # 事件循环和任务引用整个运行时
+    return isinstance(obj, (*_SKIP_TYPES, asyncio.AbstractEventLoop, asyncio.Future))
+
+
+def _children(obj: object) -> list[object]:
+    """对象直接引用的对象，容器先复制一份，避免遍历期间被修改"""
+    if isinstance(obj, dict):
+        return [item for pair in list(obj.items()) for item in pair]
+    if isinstance(obj, _CONTAINERS):
+        return list(obj)
+    if isinstance(obj, (str, bytes, int, float, bool, array, memoryview)) or obj is None:
+        # array 的 getsizeof 已包含缓冲区
+        return []
+    children = []
+    if hasattr(obj, "__dict__"):
+        children.append(vars(obj))
+    for cls in type(obj).__mro__:
+        for slot in getattr(cls, "__slots__", ()):
+            if slot not in ("__dict__", "__weakref__") and hasattr(obj, slot):
+                children.append(getattr(obj, slot))
+    return children
+
+
+def deep_size(obj: object, seen: set[int] | None = None) -> int:
+    """
+    估算对象及其引用的全部对象的大小
+    Args:
+        obj: 要统计的对象
+        seen: 已统计过的对象 id，这些对象不再计入，统计后加入本次遍历的对象
+    Returns:
+        int: 字节数
+    """
+    seen = set() if seen is None else seen
+    size = 0
+    stack = [obj]
+    while stack:
+        current = stack.pop()
+        if id(current) in seen or _is_skipped(current):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        stack.extend(_children(current))
+    return size
+
+
+def current_rss() -> int | None:
+    """当前进程的常驻内存（字节），无法获取时返回 None"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+
+        # 非 Linux 系统只能得到峰值，macOS 的单位为字节，其余为 KiB
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, OSError):
+        return None
+
+
+@dataclass
+class MemoryEntry:
+    """一个组件的内存占用"""
+
+    name: str
+    size: int
+    # 与上一次采样相比的增长，第一次采样时为 None
+    delta: int | None = None
+    # 组件中的条目数（如对局数），None 表示不统计
+    count: int | None = None
+
+    @property
+    def average(self) -> float | None:
+        """每个条目的平均大小"""
+        return self.size / self.count if self.count else None
+
+
+@dataclass
+class MemoryReport:
+    """一次采样的结果"""
+
+    entries: list[MemoryEntry] = field(default_factory=list)
+    rss: int | None = None
+    rss_delta: int | None = None
+    # 距上一次采样的秒数，第一次采样时为 None
+    interval: float | None = None
+    elapsed: float = 0.0
+
+    @property
+    def total(self) -> int:
+        return sum(entry.size for entry in self.entries)
+
+
+class MemoryTracker:
+    """保存上一次采样，计算各组件的增长"""
+
+    def __init__(self):
+        self._last: dict[str, int] = {}
+        self._last_rss: int | None = None
+        self._last_time: float | None = None
+
+    def sample(self, components: Mapping[str, object], counts: Mapping[str, int] | None = None) -> MemoryReport:
+        """
+        统计各组件的大小，耗时与对象数量成正比，异步代码中应通过 asyncio.to_thread 调用
+        Args:
+            components: 组件名到对象，按顺序统计，共享的对象计入先出现的组件
+            counts: 组件名到条目数，用于计算平均大小
+        Returns:
+            MemoryReport: 采样结果
+        """
+        start = time.monotonic()
+        counts = counts or {}
+        seen: set[int] = set()
+        entries = []
+        for name, obj in components.items():
+            size = self._measure(obj, seen)
+            entries.append(MemoryEntry(name, size, self._delta(self._last.get(name), size), counts.get(name)))
+
+        rss = current_rss()
+        now = time.monotonic()
+        report = MemoryReport(
+            entries=entries,
+            rss=rss,
+            rss_delta=self._delta(self._last_rss, rss),
+            interval=None if self._last_time is None else start - self._last_time,
+            elapsed=now - start,
+        )
+        self._last = {entry.name: entry.size for entry in entries}
+        self._last_rss = rss
+        self._last_time = start
+        return report
+
+    @staticmethod
+    def _measure(obj: object, seen: set[int]) -> int:
+        for _ in range(_RETRIES):
+            attempt = set(seen)
+            try:
+                size = deep_size(obj, attempt)
+            except RuntimeError:
+                # 遍历期间对象被修改，重新统计
+                continue
+            seen |= attempt
+            return size
+        return 0
+
+    @staticmethod
+    def _delta(last: int | None, size: int | None) -> int | None:
+        return None if last is None or size is None else size - last
+
+
+def format_bytes(size: float) -> str:
+    """以合适的单位显示字节数"""
+    for unit in ("B", "KiB", "MiB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.2f} GiB"
+
+
+def _format_delta(delta: int | None) -> str:
+    if delta is None:
+        return ""
+    return f"（{'+' if delta >= 0 else '-'}{format_bytes(abs(delta))}）"
+
+
+def format_memory_report(report: MemoryReport) -> str:
+    """格式化内存报告，每个组件一行，括号中为与上一次采样相比的增长"""
+    lines = []
+    if report.rss is not None:
+        lines.append(f"常驻内存: {format_bytes(report.rss)}{_format_delta(report.rss_delta)}")
+    lines.append(f"统计到的对象: {format_bytes(report.total)}")
+    for entry in report.entries:
+        line = f"  {entry.name}: {format_bytes(entry.size)}{_format_delta(entry.delta)}"
+        if entry.count is not None:
+            average = format_bytes(entry.average) if entry.count else "-"
+            line += f"，{entry.count} 个，平均 {average}"
+        lines.append(line)
+    if report.interval is not None:
+        lines.append(f"距上次采样 {report.interval / 60:.1f} 分钟，本次统计耗时 {report.elapsed:.2f} 秒")
+    return "\n".join(lines)
+
+
+def format_memory_line(report: MemoryReport) -> str:
+    """单行的内存报告，用于定时日志"""
+    parts = [f"{entry.name} {format_bytes(entry.size)}{_format_delta(entry.delta)}" for entry in report.entries]
+    if report.rss is not None:
+        parts.insert(0, f"常驻内存 {format_bytes(report.rss)}{_format_delta(report.rss_delta)}")
+    return "内存占用: " + "，".join(parts)
@@ -0,0 +1,48 @@
+"""
+运行指标
+
+各模块注册一个返回当前指标的函数，查看时统一收集，平时不产生额外开销。
+"""
+
+from collections.abc import Callable
+
+from nonebot import logger
+
+Metrics = dict[str, float]
+MetricSource = Callable[[], Metrics]
+
+_sources: dict[str, MetricSource] = {}
+
+
+def register(name: str, source: MetricSource) -> None:
+    """注册指标来源，同名的来源会被替换"""
+    _sources[name] = source
+
+
+def unregister(name: str) -> None:
+    """移除指标来源"""
+    _sources.pop(name, None)
+
+
+def collect() -> dict[str, Metrics]:
+    """收集所有来源的指标，单个来源出错不影响其他来源"""
+    result = {}
+    for name, source in _sources.items():
+        try:
+            result[name] = source()
+        except Exception as e:
+            logger.warning(f"收集运行指标 {name} 失败: {e}")
+    return result
+
+
+def format_metrics(metrics: dict[str, Metrics]) -> str:
+    """格式化运行指标，每个来源一段"""
+    if not metrics:
+        return "暂无运行指标"
+    sections = []
+    for name, values in metrics.items():
+        lines = [f"[{name}]"]
+        for key, value in values.items():
+            lines.append(f"  {key}: {value:.3f}" if isinstance(value, float) else f"  {key}: {value}")
+        sections.append("\n".join(lines))
+    return "\n".join(sections)
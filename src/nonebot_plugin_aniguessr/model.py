@@ -1,8 +1,17 @@
+from collections.abc import Collection, Iterable, Iterator, Mapping, Sequence
 from dataclasses import dataclass
 from enum import Enum
+from functools import cache
+import random
+from sys import intern
 
 from pydantic import BaseModel, ConfigDict, Field
 
+from .csr import CSRIndex
+from .delta import CharacterDelta
+from .distinguish import DistinguishScores, compute_scores
+from .sampling import AliasSampler, build_target_sampler, target_weighting
+
 """
 # data/id_tags_mapping.json
 # id2tags
@@ -52,23 +61,39 @@ class ComparisonStatus(str, Enum):
     DIFFERENT = "different"  # 完全不同
 
 
-class AttributeComparison(BaseModel):
-    """属性比较结果"""
+@dataclass(frozen=True, slots=True)
+class AttributeComparison:
+    """属性比较结果（热路径上每次猜测会创建几十个，使用轻量的 slots 记录）"""
 
     status: ComparisonStatus
     value: str
     description: str | None = None
 
-    model_config = ConfigDict(
-        frozen=True,
-    )
+
+# 预分配的通用比较结果，所有对局共享，避免每个属性重复构造相同的对象
+MISSING_IN_TARGET = AttributeComparison(
+    status=ComparisonStatus.DIFFERENT,
+    value="目标角色不具有此特征",
+    description="该特征不存在于目标角色中",
+)
+PRESENT_IN_TARGET = AttributeComparison(
+    status=ComparisonStatus.DIFFERENT,
+    value="目标角色具有此特征",
+    description="该特征存在于目标角色中",
+)
+
+
+@cache
+def exact_comparison(attr: str) -> AttributeComparison:
+    """获取完全匹配的比较结果，同一属性的结果在所有对局间复用"""
+    return AttributeComparison(status=ComparisonStatus.EXACT, value=attr)
 
 
 class CharacterAttribute(BaseModel):
     """角色属性"""
 
     name: str
-    attributes: list[str]
+    attributes: Sequence[str]
 
     model_config = ConfigDict(
         frozen=True,
@@ -79,50 +104,387 @@ class CharacterAttribute(BaseModel):
         return attr in self.attributes
 
 
-class CharacterDatabase(BaseModel):
-    """角色数据库"""
+class CharacterMapping(Mapping[str, Sequence[str]]):
+    """角色名到属性的只读映射，属性是数据库存储的视图，不复制数据"""
 
-    characters: dict[str, list[str]]
-    attribute_to_characters: dict[str, list[str]] = Field(default_factory=dict)
+    __slots__ = ("_db",)
 
-    model_config = ConfigDict(
-        arbitrary_types_allowed=True,
-    )
+    def __init__(self, db: "CharacterDatabase"):
+        self._db = db
+
+    def __getitem__(self, name: str) -> Sequence[str]:
+        attrs = self._db.get_attributes(name)
+        if attrs is None:
+            raise KeyError(name)
+        return attrs
+
+    def __contains__(self, name: object) -> bool:
+        return self._db.has_character(name)
+
+    def __iter__(self) -> Iterator[str]:
+        db = self._db
+        removed = db._removed
+        if removed:
+            yield from (name for name in db._index.names if name not in removed)
+        else:
+            yield from db._index.names
+        yield from db._overlay
 
-    def __init__(self, char_data: dict[str, list[str]], **kwargs):
-        # 初始化角色数据
-        super().__init__(characters=char_data, **kwargs)
+    def __len__(self) -> int:
+        db = self._db
+        return len(db._index.names) - len(db._removed) + len(db._overlay)
 
-        # 构建属性到角色的映射
-        attr_to_chars = {}
-        for char_name, attrs in char_data.items():
+
+class CharacterDatabase:
+    """
+    角色数据库
+
+    角色属性以 CSR 形式紧凑存储（见 csr.py），查询返回存储的视图。
+    增量更新不修改 CSR：变化的角色写入覆盖层，原有数据加上删除标记，覆盖层较大时重新压缩。
+    """
+
+    __slots__ = (
+        "_index",
+        "_mapping",
+        "_names",
+        "_overlay",
+        "_overlay_postings",
+        "_removed",
+        "_sampler",
+        "_scores",
+        "generation",
+    )
+
+    # 覆盖层中的角色超过总数的这个比例时重新压缩
+    COMPACT_RATIO = 0.2
+
+    def __init__(self, char_data: Mapping[str, Iterable[str]]):
+        self._index = CSRIndex(char_data.items())
+        # 增量更新的覆盖层：新增或修改的角色、这些角色的倒排列表、被删除或修改的原有角色
+        self._overlay: dict[str, list[str]] = {}
+        self._overlay_postings: dict[str, list[str]] = {}
+        self._removed: set[str] = set()
+        self._mapping = CharacterMapping(self)
+        self._sampler: tuple[tuple[int, str], AliasSampler[str]] | None = None
+        self._names: tuple[int, Sequence[str]] | None = None
+        # 区分度以 CSR 中的角色编号为下标，任何增量更新都可能改变其他角色的区分度，更新后需要重新计算
+        self._scores: DistinguishScores | None = None
+        # 每次增量更新后递增，依赖数据库内容的缓存以此判断是否失效
+        self.generation = 0
+
+    def __getstate__(self):
+        # 编译索引中只保存 CSR 和区分度，有覆盖层时合并后保存，不修改正在使用的数据
+        # 增量更新后没有区分度，在下次加载时重新计算
+        return self.compiled_index(), self.generation, self._scores
+
+    def __setstate__(self, state) -> None:
+        self._index, self.generation, self._scores = state
+        self._overlay = {}
+        self._overlay_postings = {}
+        self._removed = set()
+        self._mapping = CharacterMapping(self)
+        self._sampler = None
+        self._names = None
+
+    @property
+    def characters(self) -> Mapping[str, Sequence[str]]:
+        """角色名到属性的映射"""
+        return self._mapping
+
+    def has_character(self, name: object) -> bool:
+        """角色是否存在"""
+        if name in self._overlay:
+            return True
+        return name in self._index.name_ids and name not in self._removed
+
+    def get_attributes(self, name: str) -> Sequence[str] | None:
+        """获取角色的属性，角色不存在时返回 None"""
+        attrs = self._overlay.get(name)
+        if attrs is not None:
+            return attrs
+        char_id = self._index.name_ids.get(name)
+        if char_id is None or name in self._removed:
+            return None
+        return self._index.attributes(char_id)
+
+    def compact(self) -> None:
+        """将覆盖层合并进 CSR，已有的视图仍然指向原来的数据"""
+        self._index = CSRIndex(list(self.characters.items()))
+        self._overlay = {}
+        self._overlay_postings = {}
+        self._removed = set()
+        self._scores = None
+
+    def apply_delta(self, delta: CharacterDelta) -> tuple[set[str], set[str]]:
+        """
+        增量更新角色数据和倒排索引，只处理受影响的角色和属性
+        Args:
+            delta: 新旧角色数据的差异
+        Returns:
+            tuple[set[str], set[str]]: (新出现的属性, 不再有角色具有的属性)
+        """
+        index = self._index
+        postings = self._overlay_postings
+        # 按属性汇总需要从覆盖层倒排列表中移除的角色，每个列表只重建一次
+        drop: dict[str, set[str]] = {}
+        touched_attrs: set[str] = set()
+
+        def retire(name: str) -> None:
+            """移除角色当前的数据：覆盖层中的直接删除，CSR 中的加删除标记"""
+            attrs = self._overlay.pop(name, None)
+            if attrs is not None:
+                for attr in attrs:
+                    drop.setdefault(attr, set()).add(name)
+                touched_attrs.update(attrs)
+            if name in index.name_ids and name not in self._removed:
+                self._removed.add(name)
+                touched_attrs.update(index.attributes(index.name_ids[name]))
+
+        for name in delta.removed:
+            retire(name)
+        for name in delta.changed:
+            retire(name)
+
+        for attr, names in drop.items():
+            remaining = [name for name in postings.get(attr, ()) if name not in names]
+            if remaining:
+                postings[attr] = remaining
+            else:
+                postings.pop(attr, None)
+
+        new_vocab = set()
+        updates = {**{name: new for name, (_, new) in delta.changed.items()}, **delta.added}
+        for name, attrs in updates.items():
+            name = intern(name)
+            attrs = [intern(attr) for attr in attrs]
             for attr in attrs:
-                if attr not in attr_to_chars:
-                    attr_to_chars[attr] = []
-                attr_to_chars[attr].append(char_name)
+                if attr not in index.vocab_ids and attr not in postings:
+                    new_vocab.add(attr)
+                postings.setdefault(attr, []).append(name)
+            self._overlay[name] = attrs
+
+        dropped_vocab = {attr for attr in touched_attrs if not self.has_attribute(attr)}
+        self.generation += 1
+        # 角色的增删和变化会改变与它相似的其他角色的区分度和近邻，全部作废
+        self._scores = None
+        if len(self._overlay) + len(self._removed) > self.COMPACT_RATIO * len(index.names):
+            self.compact()
+        return new_vocab, dropped_vocab
 
-        self.attribute_to_characters = attr_to_chars
+    def has_attribute(self, attr: str) -> bool:
+        """是否有角色具有这个属性"""
+        if attr in self._overlay_postings:
+            return True
+        attr_id = self._index.vocab_ids.get(attr)
+        if attr_id is None:
+            return False
+        names = self._index.characters(attr_id)
+        removed = self._removed
+        return any(name not in removed for name in names) if removed else len(names) > 0
 
     def get_character(self, name: str) -> CharacterAttribute | None:
         """获取角色属性"""
-        if name not in self.characters:
+        attrs = self.get_attributes(name)
+        if attrs is None:
             return None
-        return CharacterAttribute(name=name, attributes=self.characters[name])
+        # 属性是存储的视图，跳过校验以免复制为列表
+        return CharacterAttribute.model_construct(name=name, attributes=attrs)
 
-    def get_characters_with_attribute(self, attr: str) -> list[str]:
+    def get_characters_with_attribute(self, attr: str) -> Sequence[str]:
         """获取具有特定属性的角色列表"""
-        return self.attribute_to_characters.get(attr, [])
+        attr_id = self._index.vocab_ids.get(attr)
+        names = self._index.characters(attr_id) if attr_id is not None else ()
+        extra = self._overlay_postings.get(attr)
+        if not self._removed and not extra:
+            return names
+        removed = self._removed
+        return [name for name in names if name not in removed] + (extra or [])
 
     def get_all_attributes(self) -> set[str]:
         """获取所有属性集合"""
-        return set(self.attribute_to_characters.keys())
+        if not self._removed:
+            return {*self._index.vocab, *self._overlay_postings}
+        return {attr for attr in self._index.vocab if self.has_attribute(attr)} | self._overlay_postings.keys()
+
+    def get_random_character(self, rng: random.Random | None = None) -> CharacterAttribute:
+        """
+        按抽样权重随机获取一个角色
+        Args:
+            rng: 随机数生成器，默认使用全局随机数
+        """
+        # 抽样表在数据更新或权重方式变化后重建
+        key = (self.generation, target_weighting())
+        if self._sampler is None or self._sampler[0] != key:
+            names = self._index.names if not self._overlay and not self._removed else tuple(self.characters)
+            self._sampler = (key, build_target_sampler(self.characters, names))
+        return self.get_character(self._sampler[1].sample(rng))
+
+    def candidate_names(self) -> Collection[str]:
+        """可作为目标和候选的角色名"""
+        return self.characters.keys()
+
+    def name_snapshot(self) -> Sequence[str]:
+        """
+        全部角色名的不可变快照，每次更新后重新创建，同一次更新之间共享
+        增量更新会修改覆盖层，在线程中遍历角色名（如模糊匹配）时应使用快照，快照需要在事件循环中取得
+        """
+        if self._names is None or self._names[0] != self.generation:
+            # 没有覆盖层时 CSR 中的角色名不会被修改，直接使用
+            names = self._index.names if not self._overlay and not self._removed else tuple(self.characters)
+            self._names = (self.generation, names)
+        return self._names[1]
+
+    @property
+    def has_distinguish_scores(self) -> bool:
+        """是否已计算区分度"""
+        return self._scores is not None
+
+    def compiled_index(self) -> CSRIndex:
+        """
+        合并覆盖层后的 CSR，没有覆盖层时返回正在使用的 CSR，不修改数据库
+        在线程中调用时需要保证期间没有增量更新（持有 data_source.character_db_lock）
+        """
+        if self._overlay or self._removed:
+            return CSRIndex(list(self.characters.items()))
+        return self._index
+
+    def compute_distinguish_scores(self) -> None:
+        """计算全部角色的区分度和近邻（见 distinguish.py），耗时较长，在编译索引时执行"""
+        index = self.compiled_index()
+        self.install_distinguish_scores(index, compute_scores(index), self.generation)
+
+    def install_distinguish_scores(self, index: CSRIndex, scores: DistinguishScores, generation: int) -> bool:
+        """
+        使用在后台计算的区分度，同时以计算所用的 CSR 替换覆盖层
+        Args:
+            index: compiled_index 返回的 CSR
+            scores: 由 index 计算的区分度
+            generation: 取得 index 时的 generation
+        Returns:
+            bool: 是否使用，期间有增量更新时数据已经变化，不使用
+        """
+        if generation != self.generation:
+            return False
+        self._index = index
+        self._overlay = {}
+        self._overlay_postings = {}
+        self._removed = set()
+        self._scores = scores
+        return True
+
+    def _score_id(self, name: str) -> int | None:
+        """角色在区分度数组中的编号，没有计算时返回 None，计算时 CSR 已合并，不需要检查覆盖层"""
+        if self._scores is None:
+            return None
+        return self._index.name_ids.get(name)
+
+    def distinguish_score(self, name: str) -> int | None:
+        """
+        唯一确定角色最少需要的属性数量
+        Args:
+            name: 角色名
+        Returns:
+            int | None: 0 表示其他角色具有它的全部属性，无法唯一确定；未计算或计算之后有增量更新时返回 None
+        """
+        char_id = self._score_id(name)
+        return None if char_id is None else self._scores.score(char_id)
+
+    def nearest_neighbors(self, name: str) -> list[str]:
+        """与角色最难区分的角色，按相似度从高到低，未计算时返回空列表"""
+        char_id = self._score_id(name)
+        if char_id is None:
+            return []
+        names = self._index.names
+        return [names[i] for i in self._scores.neighbor_ids(char_id)]
+
+    def memory_parts(self) -> dict[str, object]:
+        """按用途划分的内部数据，用于内存报告"""
+        index = self._index
+        return {
+            "角色属性": (index.names, index.vocab, index.offsets, index.attr_ids),
+            "倒排索引": (index.attr_offsets, index.char_ids),
+            "名称索引": (index.name_ids, index.vocab_ids),
+            "增量覆盖层": (self._overlay, self._overlay_postings, self._removed),
+            "抽样表": self._sampler,
+            "角色名快照": self._names,
+            "区分度": self._scores,
+        }
+
+
+class CharacterPool:
+    """
+    角色池：核心数据库的角色子集视图
+
+    只保存子集中角色名的引用，属性数据和倒排索引都使用核心数据库，
+    因此不同难度的角色池不会复制任何角色数据。猜测时仍可以使用核心数据库中的所有角色。
+    """
+
+    __slots__ = ("_name_set", "_sampler", "core", "name", "names")
+
+    def __init__(self, core: CharacterDatabase, names: Iterable[str], name: str = ""):
+        self.core = core
+        self.name = name
+        self.names = tuple(names)
+        self._sampler: tuple[tuple[int, str], AliasSampler[str]] | None = None
+        self._name_set: frozenset[str] | None = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def characters(self) -> Mapping[str, Sequence[str]]:
+        """可猜测的角色（核心数据库中的全部角色）"""
+        return self.core.characters
+
+    @property
+    def generation(self) -> int:
+        """核心数据库的更新次数"""
+        return self.core.generation
+
+    def get_character(self, name: str) -> CharacterAttribute | None:
+        """获取角色属性"""
+        return self.core.get_character(name)
 
-    def get_random_character(self) -> CharacterAttribute:
-        """随机获取一个角色"""
-        import random
+    def get_characters_with_attribute(self, attr: str) -> Sequence[str]:
+        """获取具有特定属性的角色列表（不限于角色池）"""
+        return self.core.get_characters_with_attribute(attr)
 
-        name = random.choice(list(self.characters.keys()))
-        return self.get_character(name)
+    def get_all_attributes(self) -> set[str]:
+        """获取所有属性集合"""
+        return self.core.get_all_attributes()
+
+    def distinguish_score(self, name: str) -> int | None:
+        """唯一确定角色最少需要的属性数量，见 CharacterDatabase.distinguish_score"""
+        return self.core.distinguish_score(name)
+
+    def nearest_neighbors(self, name: str) -> list[str]:
+        """与角色最难区分的角色，见 CharacterDatabase.nearest_neighbors"""
+        return self.core.nearest_neighbors(name)
+
+    def get_random_character(self, rng: random.Random | None = None) -> CharacterAttribute:
+        """
+        按抽样权重从角色池中随机获取一个角色
+        Args:
+            rng: 随机数生成器，默认使用全局随机数
+        """
+        key = (self.core.generation, target_weighting())
+        if self._sampler is None or self._sampler[0] != key:
+            self._sampler = (key, build_target_sampler(self.core.characters, self.names))
+        return self.core.get_character(self._sampler[1].sample(rng))
+
+    def candidate_names(self) -> Collection[str]:
+        """可作为目标和候选的角色名"""
+        return self.names
+
+    def name_snapshot(self) -> Sequence[str]:
+        """可猜测的角色名的不可变快照，见 CharacterDatabase.name_snapshot"""
+        return self.core.name_snapshot()
+
+    def name_set(self) -> frozenset[str]:
+        """角色池中的角色名集合，第一次使用时创建，用于快速判断角色是否在角色池中"""
+        if self._name_set is None:
+            self._name_set = frozenset(self.names)
+        return self._name_set
 
 
 class CharacterDataCollection(BaseModel):
@@ -168,6 +530,8 @@ class CharacterGuessResult:
     comparisons: dict[str, AttributeComparison]
     target_name: str
     attempts: int
+    guessed_name: str = ""
+    new_attrs: frozenset[str] = frozenset()  # 本次猜测新获得的属性信息
 
 
 class GameSettings(BaseModel):
@@ -184,6 +548,7 @@ class AttributeStatus(BaseModel):
 
     confirmed: set[str] = Field(default_factory=set, description="已确认目标角色拥有的属性")
     excluded: set[str] = Field(default_factory=set, description="已确认目标角色没有的属性")
+    version: int = Field(default=0, description="状态版本号，每次更新后递增，用于失效缓存")
 
     model_config = ConfigDict(
         arbitrary_types_allowed=True,
@@ -196,15 +561,19 @@ class AttributeStatus(BaseModel):
     def add_confirmed(self, attr: str) -> None:
         """添加已确认属性"""
         self.confirmed.add(attr)
+        self.version += 1
 
     def add_excluded(self, attr: str) -> None:
         """添加已排除属性"""
         self.excluded.add(attr)
+        self.version += 1
 
     def add_confirmed_many(self, attrs: list[str] | set[str]) -> None:
         """添加多个已确认属性"""
         self.confirmed.update(attrs)
+        self.version += 1
 
     def add_excluded_many(self, attrs: list[str] | set[str]) -> None:
         """添加多个已排除属性"""
         self.excluded.update(attrs)
+        self.version += 1
@@ -0,0 +1,344 @@
+"""
+自定义角色包
+
+社区可以导入上游数据之外的角色（原创角色、虚拟主播等），角色包保存在数据目录的 packs 目录中，
+不修改上游数据文件。导入时逐条读取并校验，以增量更新的方式加入正在使用的角色数据库；
+角色包按群组启用，只有启用了角色包的群组才会抽到其中的角色作为目标。
+
+支持的格式（均可以是 .gz / .zst 压缩文件）：
+- JSONL：每行一个 {"name": "角色名", "attributes": ["属性", ...]}
+- CSV：表头包含 name 和 attributes 两列，属性之间用 | 分隔
+- JSON：与 char2attr.json 相同的 {"角色名": ["属性", ...]}，或由 JSONL 中的对象组成的列表，需要整体读入
+"""
+
+from collections.abc import Callable, Iterable, Iterator
+import csv
+import io
+import json
+import os
+from pathlib import Path
+import re
+
+from .compression import compression_of, open_decompressed
+from .delta import CharacterDelta, diff_char2attr
+from .model import CharacterDatabase, CharacterPool
+from .tiers import extend_tier_pools
+
+PACK_SUFFIX = ".jsonl"
+GROUPS_FILE = "groups.json"
+# 角色包名称只允许字母、数字、下划线和连字符
+PACK_NAME_PATTERN = re.compile(r"^[\w-]{1,32}$")
+MAX_NAME_LENGTH = 64
+# 导入时最多报告的错误数量
+MAX_ERRORS = 20
+
+PackRecords = Iterator[tuple[int, object, object]]
+
+
+def _iter_jsonl(f: io.TextIOBase) -> PackRecords:
+    for line_no, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, None, f"不是有效的 JSON: {e.msg}"
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, "应为包含 name 和 attributes 的对象"
+            continue
+        yield line_no, record.get("name"), record.get("attributes")
+
+
+def _iter_csv(f: io.TextIOBase) -> PackRecords:
+    reader = csv.DictReader(f)
+    if reader.fieldnames is None or not {"name", "attributes"} <= set(reader.fieldnames):
+        raise ValueError("CSV 文件的表头需要包含 name 和 attributes 两列")
+    for row in reader:
+        attrs = row["attributes"]
+        yield reader.line_num, row["name"], attrs.split("|") if isinstance(attrs, str) else attrs
+
+
+def _iter_json(f: io.TextIOBase) -> PackRecords:
+    try:
+        data = json.load(f)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"不是有效的 JSON: {e.msg}") from e
+    if isinstance(data, dict):
+        for index, (name, attrs) in enumerate(data.items(), start=1):
+            yield index, name, attrs
+    elif isinstance(data, list):
+        for index, record in enumerate(data, start=1):
+            if isinstance(record, dict):
+                yield index, record.get("name"), record.get("attributes")
+            else:
+                yield index, None, "应为包含 name 和 attributes 的对象"
+    else:
+        raise ValueError("JSON 文件应为角色名到属性列表的对象，或角色对象的列表")
+
+
+READERS: dict[str, Callable[[io.TextIOBase], PackRecords]] = {
+    ".jsonl": _iter_jsonl,
+    ".csv": _iter_csv,
+    ".json": _iter_json,
+}
+
+
+def pack_format(path: Path) -> str:
+    """根据后缀判断角色包格式，压缩文件取压缩后缀之前的后缀"""
+    name = path.name[: -len(path.suffix)] if compression_of(path) != "none" else path.name
+    suffix = Path(name).suffix.lower()
+    if suffix not in READERS:
+        raise ValueError(f"不支持的文件格式 {suffix or path.name}，支持 {', '.join(READERS)}")
+    return suffix
+
+
+def _clean_attributes(attrs: object) -> list[str] | str:
+    """整理属性列表：去掉空白和重复项，保持顺序；格式错误时返回错误信息"""
+    if not isinstance(attrs, list):
+        return "attributes 应为字符串列表"
+    if not all(isinstance(attr, str) for attr in attrs):
+        return "attributes 中只能包含字符串"
+    cleaned = list(dict.fromkeys(attr.strip() for attr in attrs if attr.strip()))
+    return cleaned or "至少需要一个属性"
+
+
+def read_pack(path: Path, exists: Callable[[str], bool] = lambda name: False) -> tuple[dict[str, list[str]], list[str]]:
+    """
+    逐条读取并校验角色包，格式错误的记录跳过并记录原因
+    Args:
+        path: 角色包文件
+        exists: 判断角色名是否已被其他数据使用，重名的角色不会导入
+    Returns:
+        tuple[dict[str, list[str]], list[str]]: (校验通过的角色, 错误信息)
+    """
+    reader = READERS[pack_format(path)]
+    characters: dict[str, list[str]] = {}
+    errors: list[str] = []
+
+    failed = 0
+
+    def fail(line_no: int, message: str) -> None:
+        nonlocal failed
+        failed += 1
+        if failed <= MAX_ERRORS:
+            errors.append(f"第 {line_no} 条: {message}")
+
+    with open_decompressed(path) as raw:
+        f = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+        for line_no, name, attrs in reader(f):
+            if name is None and isinstance(attrs, str):
+                fail(line_no, attrs)
+                continue
+            if not isinstance(name, str) or not name.strip():
+                fail(line_no, "缺少角色名")
+                continue
+            name = name.strip()
+            if len(name) > MAX_NAME_LENGTH:
+                fail(line_no, f"角色名超过 {MAX_NAME_LENGTH} 个字符")
+                continue
+            if name in characters:
+                fail(line_no, f"角色 {name} 重复")
+                continue
+            if exists(name):
+                fail(line_no, f"角色 {name} 与已有角色重名")
+                continue
+            cleaned = _clean_attributes(attrs)
+            if isinstance(cleaned, str):
+                fail(line_no, f"角色 {name} 的{cleaned}")
+                continue
+            characters[name] = cleaned
+
+    if failed > MAX_ERRORS:
+        errors.append(f"还有 {failed - MAX_ERRORS} 条错误未显示")
+    if not characters:
+        raise ValueError("没有可以导入的角色" + (f"：{errors[0]}" if errors else ""))
+    return characters, errors
+
+
+def apply_pack_delta(core: CharacterDatabase, delta: CharacterDelta) -> CharacterDelta:
+    """
+    将角色包的变化应用到数据库，与上游角色重名的角色以上游数据为准，不会被角色包修改或删除
+    Args:
+        core: 角色数据库，会被原地修改
+        delta: 角色包的变化
+    Returns:
+        CharacterDelta: 实际应用的增量更新
+    """
+
+    def owned(name: str, attrs: list[str]) -> bool:
+        current = core.get_attributes(name)
+        return current is not None and list(current) == attrs
+
+    delta = CharacterDelta(
+        added={name: attrs for name, attrs in delta.added.items() if not core.has_character(name)},
+        removed={name: attrs for name, attrs in delta.removed.items() if owned(name, attrs)},
+        changed={name: change for name, change in delta.changed.items() if owned(name, change[0])},
+    )
+    if not delta.is_empty():
+        core.apply_delta(delta)
+    return delta
+
+
+class PackStore:
+    """角色包存储及各群组启用的角色包"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.packs: dict[str, dict[str, list[str]]] = {}
+        self.groups: dict[str, list[str]] = {}
+        # 角色包或启用状态变化时递增，各群组的角色池据此判断是否需要重建
+        self.revision = 0
+        self._pools: dict[str, tuple[object, dict[str, CharacterPool]]] = {}
+        # 启用的角色包组合到 (缓存键, 不能猜测的角色)
+        self._hidden: dict[tuple[str, ...], tuple[object, frozenset[str]]] = {}
+
+    def load(self) -> None:
+        """读取已导入的角色包和启用状态"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        packs = {}
+        for path in sorted(self.root.glob(f"*{PACK_SUFFIX}")):
+            packs[path.stem], _ = read_pack(path)
+        groups_file = self.root / GROUPS_FILE
+        groups = json.loads(groups_file.read_text("utf-8")) if groups_file.is_file() else {}
+        self.packs = packs
+        self.groups = {group: [name for name in names if name in packs] for group, names in groups.items()}
+        self.revision += 1
+
+    def characters(self, names: Iterable[str] | None = None) -> dict[str, list[str]]:
+        """角色包中的角色，默认为所有角色包"""
+        characters: dict[str, list[str]] = {}
+        for name in self.packs if names is None else names:
+            characters.update(self.packs.get(name, {}))
+        return characters
+
+    def is_taken(self, character: str, pack: str, core: CharacterDatabase | None) -> bool:
+        """角色名是否已被上游数据或其他角色包使用，pack 为正在导入的角色包，替换时不与自身冲突"""
+        own = self.packs.get(pack, {})
+        if character in own:
+            return False
+        if core is not None and core.has_character(character):
+            return True
+        return any(character in characters for characters in self.packs.values())
+
+    def save(self, name: str, characters: dict[str, list[str]]) -> None:
+        """将校验后的角色写入角色包文件，文件中的角色每行一个"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        path = self.root / f"{name}{PACK_SUFFIX}"
+        tmp = path.with_name(f".{path.name}.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for character, attrs in characters.items():
+                f.write(json.dumps({"name": character, "attributes": attrs}, ensure_ascii=False) + "\n")
+        os.replace(tmp, path)
+
+    def install(self, name: str, characters: dict[str, list[str]]) -> CharacterDelta:
+        """
+        记录导入的角色包，同名角色包会被替换
+        Returns:
+            CharacterDelta: 原有角色包变为新角色包的增量更新
+        """
+        delta = diff_char2attr(self.packs.get(name, {}), characters)
+        self.packs[name] = characters
+        self.revision += 1
+        return delta
+
+    def uninstall(self, name: str) -> CharacterDelta:
+        """删除角色包及其文件，并从所有群组中停用"""
+        characters = self.packs.pop(name)
+        (self.root / f"{name}{PACK_SUFFIX}").unlink(missing_ok=True)
+        for group in list(self.groups):
+            self.disable(group, name)
+        self.revision += 1
+        return diff_char2attr(characters, {})
+
+    def enabled(self, group_id: str | None) -> list[str]:
+        """群组启用的角色包，私聊时不使用角色包"""
+        return self.groups.get(group_id, []) if group_id is not None else []
+
+    def enable(self, group_id: str, name: str) -> bool:
+        """在群组中启用角色包，已启用时返回 False"""
+        enabled = self.groups.setdefault(group_id, [])
+        if name in enabled:
+            return False
+        enabled.append(name)
+        self._save_groups()
+        return True
+
+    def disable(self, group_id: str, name: str) -> bool:
+        """在群组中停用角色包，未启用时返回 False"""
+        enabled = self.groups.get(group_id, [])
+        if name not in enabled:
+            return False
+        enabled.remove(name)
+        if not enabled:
+            del self.groups[group_id]
+        self._save_groups()
+        return True
+
+    def _save_groups(self) -> None:
+        self.revision += 1
+        path = self.root / GROUPS_FILE
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_text(json.dumps(self.groups, ensure_ascii=False, indent=2), "utf-8")
+        os.replace(tmp, path)
+
+    def group_pools(
+        self,
+        group_id: str | None,
+        pools: dict[str, CharacterPool],
+        min_attrs: int,
+        easy_min_attrs: int,
+    ) -> dict[str, CharacterPool]:
+        """
+        群组的各难度角色池：上游角色加上群组启用的角色包中的角色
+        Args:
+            group_id: 群组ID
+            pools: 上游角色的各难度角色池
+            min_attrs: 普通难度的最少属性数量
+            easy_min_attrs: 简单难度的最少属性数量
+        Returns:
+            dict[str, CharacterPool]: 没有启用角色包时直接返回 pools
+        """
+        enabled = self.enabled(group_id)
+        if not enabled:
+            return pools
+        key = (pools["normal"], self.revision)
+        cached = self._pools.get(group_id)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        group_pools = extend_tier_pools(pools, self.characters(enabled), min_attrs, easy_min_attrs)
+        self._pools[group_id] = (key, group_pools)
+        return group_pools
+
+    def hidden_names(self, core: CharacterDatabase, group_id: str | None) -> frozenset[str]:
+        """
+        角色包已加入角色数据库，但群组没有启用的角色，这些角色在该群组中不能猜测
+        Args:
+            core: 加入了角色包的角色数据库
+            group_id: 群组ID，私聊时为 None，所有角色包中的角色都不能猜测
+        Returns:
+            frozenset[str]: 角色名，与上游角色重名、以上游数据为准的角色不包含在内
+        """
+        enabled = tuple(sorted(self.enabled(group_id)))
+        disabled = [name for name in self.packs if name not in enabled]
+        if not disabled:
+            return frozenset()
+        key = (id(core), core.generation, self.revision)
+        cached = self._hidden.get(enabled)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        # 只有数据库中的属性与角色包相同时才是角色包加入的角色
+        hidden = frozenset(
+            name
+            for name, attrs in self.characters(disabled).items()
+            if (current := core.get_attributes(name)) is not None and list(current) == attrs
+        )
+        self._hidden[enabled] = (key, hidden)
+        return hidden
+
+
+def is_valid_pack_name(name: str) -> bool:
+    """角色包名称是否合法"""
+    return PACK_NAME_PATTERN.match(name) is not None
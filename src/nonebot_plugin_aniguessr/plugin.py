@@ -0,0 +1,1230 @@
+from nonebot import get_driver, logger, require
+from nonebot.plugin import PluginMetadata, inherit_supported_adapters
+
+require("nonebot_plugin_waiter")
+require("nonebot_plugin_uninfo")
+require("nonebot_plugin_alconna")
+require("nonebot_plugin_localstore")
+require("nonebot_plugin_apscheduler")
+
+import asyncio
+from datetime import datetime
+import pathlib
+
+from arclet.alconna import Alconna, Args, Arparma, Option, Subcommand
+from nonebot.adapters import Bot, Event
+from nonebot.exception import FinishedException
+from nonebot.matcher import Matcher
+from nonebot.params import Depends
+from nonebot.permission import SUPERUSER
+from nonebot_plugin_alconna import Match, UniMessage, on_alconna
+from nonebot_plugin_alconna.uniseg import Image
+from nonebot_plugin_apscheduler import scheduler
+from nonebot_plugin_uninfo import Uninfo
+
+from . import metrics
+from .analytics import update_analytics
+from .config import Config, plugin_config
+from .daily import current_daily_challenge, get_daily_challenge, get_leaderboard, leaderboard_of, rollover
+from .data_source import (
+    DATA_DIR,
+    character_db_lock,
+    create_character_database,
+    create_tag_database,
+    refresh_distinguish_scores,
+    switch_data_version,
+    update_character_data,
+    update_character_data_incremental,
+    versions,
+)
+from .delta import CharacterDelta
+from .events import EventLog
+from .game_logic import AniGuessrGame, candidate_cache
+from .memory import MemoryReport, MemoryTracker, format_memory_line, format_memory_report
+from .model import (
+    CharacterDatabase,
+    CharacterPool,
+    GameSettings,
+)
+from .packs import PackStore, apply_pack_delta, is_valid_pack_name, pack_format, read_pack
+from .ratelimit import LatestTicket, RateLimiter, cpu_slot, set_cpu_concurrency
+from .render import guess_board_items, render_guess_reply
+from .render_image import (
+    is_available as image_render_available,
+)
+from .render_image import (
+    render_guess_board,
+    render_in_pool,
+    render_list_board,
+    shutdown_render_pool,
+    start_render_pool,
+)
+from .sampling import set_target_weighting
+from .stats import StatsStore, make_result
+from .tags import build_tag_pool
+from .tiers import DEFAULT_TIER, TIER_NAMES, build_tier_pools, patch_tier_pools
+from .workers import GuessWorkerPool, WorkerBusyError, guess_workers, set_guess_workers
+
+__plugin_meta__ = PluginMetadata(
+    name="猜角色",
+    description="一个猜动漫角色的游戏",
+    usage="发送 /aniguessr 开始游戏",
+    type="application",
+    homepage="https://github.com/X-Zero-L/nonebot-plugin-aniguessr",
+    config=Config,
+    supported_adapters=inherit_supported_adapters("nonebot_plugin_alconna", "nonebot_plugin_uninfo"),
+    extra={"author": "X-Zero-L <zeroeeau@gmail.com>"},
+)
+
+# 创建游戏实例字典，用用户ID作为键
+games: dict[str, AniGuessrGame] = {}
+user_locks: dict[str, asyncio.Lock] = {}
+# 角色数据库
+character_db: CharacterDatabase | None = None
+# 各难度的角色池，共享 character_db 中的数据
+tier_pools: dict[str, CharacterPool] = {}
+# 标签模式的角色池，只在启用标签模式时加载
+tag_pool: CharacterPool | None = None
+# 后台加载角色数据的任务，启动时不等待加载完成
+warmup_task: asyncio.Task | None = None
+# 增量更新后在后台重新计算区分度的任务及其角色数据库
+score_refresh: tuple[CharacterDatabase, asyncio.Task] | None = None
+# 战绩存储
+stats_store: StatsStore | None = None
+# 对局事件日志
+event_log: EventLog | None = None
+# 自定义角色包
+pack_store = PackStore(DATA_DIR / "packs")
+# 按用户和群组限流
+user_limiter = RateLimiter(plugin_config.aniguessr_user_rate, plugin_config.aniguessr_user_burst)
+group_limiter = RateLimiter(plugin_config.aniguessr_group_rate, plugin_config.aniguessr_group_burst)
+# 等待中的猜测只处理最新的一次
+guess_tickets = LatestTicket()
+
+memory_tracker = MemoryTracker()
+# 目标角色的抽样权重
+set_target_weighting(plugin_config.aniguessr_target_weighting)
+
+metrics.register("candidate_cache", candidate_cache.stats)
+metrics.register(
+    "requests",
+    lambda: {
+        "active_games": len(games),
+        "user_rate_limited": user_limiter.dropped,
+        "group_rate_limited": group_limiter.dropped,
+        "merged_guesses": guess_tickets.merged,
+    },
+)
+
+
+def get_lock(user_id: str) -> asyncio.Lock:
+    """获取用户锁"""
+    if user_id not in user_locks:
+        user_locks[user_id] = asyncio.Lock()
+    return user_locks[user_id]
+
+
+def get_user_name(uninfo: Uninfo) -> str:
+    """获取用户显示名称"""
+    return uninfo.user.nick or uninfo.user.name or uninfo.user.id
+
+
+def get_group_id(uninfo: Uninfo) -> str | None:
+    """获取群组ID，私聊时返回 None"""
+    return None if uninfo.scene.is_private else uninfo.scene.id
+
+
+async def rate_limit(matcher: Matcher, uninfo: Uninfo) -> None:
+    """超出用户或群组频率限制的命令直接忽略，不回复，避免刷屏时回复消息本身占满资源"""
+    group_id = get_group_id(uninfo)
+    if not user_limiter.allow(uninfo.user.id):
+        await matcher.finish()
+    if group_id is not None and not group_limiter.allow(group_id):
+        # 被群组限流拒绝的命令没有执行，不消耗用户的令牌
+        user_limiter.refund(uninfo.user.id)
+        await matcher.finish()
+
+
+def log_event(event_type: str, uninfo: Uninfo, game: AniGuessrGame, **fields) -> None:
+    """记录对局事件，未启用事件日志时忽略"""
+    if event_log is not None:
+        event_log.emit(
+            event_type, user=uninfo.user.id, group=get_group_id(uninfo), game=game.game_id, seed=game.seed, **fields
+        )
+
+
+def finish_game(uninfo: Uninfo, won: bool, reason: str) -> AniGuessrGame:
+    """
+    结束游戏并记录战绩，每日挑战的对局同时记录到今日排行
+    Args:
+        uninfo: 会话信息
+        won: 是否猜中
+        reason: 结束原因（win、timeout、max_attempts、giveup），记录到事件日志
+    """
+    user_id = uninfo.user.id
+    user_name = get_user_name(uninfo)
+    game = games.pop(user_id)
+    seconds = game.elapsed_seconds()
+    log_event(
+        "end",
+        uninfo,
+        game,
+        reason=reason,
+        won=won,
+        attempts=game.attempts,
+        seconds=round(seconds, 3),
+        target=game.get_target_name(),
+    )
+
+    # 零点前开始的每日挑战记录到开始那一天的排行榜
+    if game.daily is not None and (leaderboard := leaderboard_of(game.daily.day)) is not None:
+        leaderboard.record(user_id, user_name, won, game.attempts, seconds)
+
+    if stats_store is not None:
+        stats_store.record(
+            make_result(
+                user_id=user_id,
+                user_name=user_name,
+                group_id=get_group_id(uninfo),
+                mode=game.mode,
+                won=won,
+                attempts=game.attempts,
+                seconds=seconds,
+                target=game.get_target_name(),
+                seed=game.seed,
+                daily=game.daily.day.isoformat() if game.daily is not None else None,
+            )
+        )
+    return game
+
+
+def database_unavailable_message() -> str | None:
+    """角色数据未就绪时返回提示消息，已就绪时返回 None"""
+    if character_db is not None:
+        return None
+    if warmup_task is not None and not warmup_task.done():
+        return "角色数据正在加载中，请稍后再试"
+    return "角色数据加载失败，请使用 /aniguessr_update 更新数据后重试"
+
+
+def use_character_db(db: CharacterDatabase) -> None:
+    """切换角色数据库并重新划分各难度的角色池"""
+    global character_db, tier_pools
+    character_db = db
+    # 缓存的候选集合引用旧的角色池，切换后不会再命中
+    candidate_cache.clear()
+    if (workers := guess_workers()) is not None:
+        workers.track(db)
+    tier_pools = build_tier_pools(db, plugin_config.aniguessr_min_attrs, plugin_config.aniguessr_easy_min_attrs)
+    logger.info("难度划分: " + "，".join(f"{TIER_NAMES[name]} {len(pool)} 个角色" for name, pool in tier_pools.items()))
+    # 角色包在划分难度之后加入，只出现在启用了角色包的群组中
+    if pack_store.packs:
+        delta = apply_pack_delta(db, CharacterDelta(added=pack_store.characters()))
+        logger.info(f"已加载 {len(pack_store.packs)} 个角色包，共 {len(delta.added)} 个角色")
+        refresh_scores_in_background()
+
+
+def refresh_scores_in_background() -> None:
+    """增量更新后在后台重新计算区分度，正在计算时由已有的任务处理新的变化"""
+    global score_refresh
+    db = character_db
+    if db is None or db.has_distinguish_scores:
+        return
+    if score_refresh is not None and score_refresh[0] is db and not score_refresh[1].done():
+        return
+    score_refresh = (db, asyncio.create_task(refresh_distinguish_scores(db)))
+
+
+def group_tier_pools(uninfo: Uninfo) -> dict[str, CharacterPool]:
+    """当前群组的各难度角色池，包含群组启用的角色包"""
+    return pack_store.group_pools(
+        get_group_id(uninfo), tier_pools, plugin_config.aniguessr_min_attrs, plugin_config.aniguessr_easy_min_attrs
+    )
+
+
+async def reload_character_db() -> bool:
+    """重新加载当前数据版本的角色数据库"""
+    db = await create_character_database()
+    if db is None:
+        return False
+    use_character_db(db)
+    await reload_tag_pool()
+    return True
+
+
+async def reload_tag_pool() -> None:
+    """重新加载当前数据版本的标签模式角色池，未启用标签模式时不读取标签数据"""
+    global tag_pool
+    if not plugin_config.aniguessr_tag_mode:
+        return
+    db = await create_tag_database(plugin_config.aniguessr_tag_source)
+    if db is None:
+        return
+    tag_pool = build_tag_pool(db, plugin_config.aniguessr_tag_min_tags)
+    logger.info(f"标签模式: {len(tag_pool)} 个目标角色，{len(db.get_all_attributes())} 个标签")
+
+
+async def refresh_character_data() -> bool:
+    """更新角色数据，已加载数据库时增量更新，否则重新加载"""
+    global tier_pools
+    if character_db is None:
+        return await update_character_data() and await reload_character_db()
+
+    delta = await update_character_data_incremental(character_db, pack_store.characters)
+    if delta is None:
+        return False
+    if not delta.is_empty():
+        tier_pools = patch_tier_pools(
+            tier_pools,
+            character_db,
+            delta,
+            plugin_config.aniguessr_min_attrs,
+            plugin_config.aniguessr_easy_min_attrs,
+        )
+        await reload_tag_pool()
+        refresh_scores_in_background()
+    return True
+
+
+def format_start_message(game: AniGuessrGame, hints: list[str], title: str = "游戏开始！") -> str:
+    """格式化游戏开始消息"""
+    start_msg = f"{title}请使用 /guess 角色名 来猜测。\n\n提示：这个角色的特征包括：\n"
+
+    # 格式化提示，每个提示一行
+    for hint in hints:
+        start_msg += f"✅ {hint}\n"
+
+    # 增加说明已确认属性
+    start_msg += "\n这些是初始确认的特征，你可以通过猜测来获取更多线索。"
+
+    start_msg += "\n\n游戏设置：\n"
+    start_msg += f"• 最大尝试次数: {game.settings.max_attempts}\n"
+    start_msg += f"• 游戏超时时间: {game.settings.timeout_seconds}秒\n"
+    # 不显示对局种子，由种子可以复现目标角色
+    start_msg += f"• 对局编号: {game.game_id}（反馈问题时请附上）\n"
+    start_msg += "\n使用 /guess 角色名 来猜测，/candidates 查看候选角色，或 /giveup 放弃游戏"
+    return start_msg
+
+
+def format_daily_leaderboard(limit: int = 10) -> str:
+    """格式化今日排行榜"""
+    leaderboard = get_leaderboard()
+    records = leaderboard.top(limit)
+    if not records:
+        return f"每日挑战 {leaderboard.day.isoformat()}：今天还没有人猜对"
+
+    msg = f"每日挑战 {leaderboard.day.isoformat()} 排行榜（共 {len(leaderboard.records)} 人参加）：\n"
+    for rank, record in enumerate(records, start=1):
+        msg += f"{rank}. {record.user_name} - {record.attempts} 次，用时 {int(record.seconds)} 秒\n"
+    return msg.rstrip()
+
+
+def use_image_reply() -> bool:
+    """是否使用图片回复"""
+    return plugin_config.aniguessr_reply_mode == "image" and image_render_available()
+
+
+async def image_or_text(text: str, render_func, *args) -> UniMessage:
+    """图片模式下在进程池中渲染图片，渲染失败时回退到文本"""
+    if use_image_reply():
+        try:
+            async with cpu_slot():
+                image = await render_in_pool(render_func, *args)
+            return UniMessage(Image(raw=image))
+        except Exception as e:
+            logger.warning(f"渲染图片失败，回退到文本回复: {e}")
+    return UniMessage(text)
+
+
+# 开始游戏命令
+aniguessr_start = on_alconna(
+    Alconna(
+        "/aniguessr",
+        Args["tier?", list(TIER_NAMES)],
+        Option("-h", help_text="显示帮助信息"),
+        Subcommand("daily", Subcommand("rank", help_text="查看今日排行"), help_text="每日挑战"),
+        Subcommand("rank", Args["scope?", str], help_text="战绩排行榜，rank global 查看全局排行"),
+        Subcommand("tag", help_text="标签模式：根据 Bangumi 角色标签猜角色"),
+    ),
+    use_cmd_start=True,
+    block=True,
+    aliases={"猜角色", "猜猜角色", "角色猜猜"},
+)
+
+# 猜角色命令
+aniguessr_guess = on_alconna(
+    Alconna(
+        "/guess",
+        Args["character_name", str],
+    ),
+    use_cmd_start=True,
+    block=True,
+    aliases={"/猜", "/g"},
+)
+
+# 放弃本次游戏命令
+aniguessr_give_up = on_alconna(
+    Alconna("/giveup"),
+    use_cmd_start=True,
+    block=True,
+    aliases={"/放弃", "/gg"},
+)
+
+# 强制更新数据命令（仅超级用户可用）
+aniguessr_update = on_alconna(
+    Alconna("/aniguessr_update"),
+    use_cmd_start=True,
+    block=True,
+    aliases={"/更新角色数据"},
+    # permission="superuser",
+)
+
+# 数据版本管理命令（仅超级用户可用）
+aniguessr_version = on_alconna(
+    Alconna(
+        "/aniguessr_version",
+        Subcommand("use", Args["version", str], help_text="切换到指定数据版本"),
+        Subcommand("rollback", help_text="回滚到上一个数据版本"),
+    ),
+    use_cmd_start=True,
+    block=True,
+    aliases={"/角色数据版本"},
+    permission=SUPERUSER,
+)
+
+# 自定义角色包管理命令（仅超级用户可用）
+aniguessr_pack = on_alconna(
+    Alconna(
+        "/aniguessr_pack",
+        Subcommand("import", Args["path", str]["name?", str], help_text="导入角色包文件（JSONL/CSV/JSON）"),
+        Subcommand("remove", Args["name", str], help_text="删除角色包"),
+        Subcommand("enable", Args["name", str], help_text="在本群启用角色包"),
+        Subcommand("disable", Args["name", str], help_text="在本群停用角色包"),
+    ),
+    use_cmd_start=True,
+    block=True,
+    aliases={"/角色包"},
+    permission=SUPERUSER,
+)
+
+# 运行指标命令（仅超级用户可用）
+aniguessr_metrics = on_alconna(
+    Alconna("/aniguessr_metrics"),
+    use_cmd_start=True,
+    block=True,
+    aliases={"/运行指标"},
+    permission=SUPERUSER,
+)
+
+# 查看内存占用（仅超级用户）
+aniguessr_memory = on_alconna(
+    Alconna("/aniguessr_memory"),
+    use_cmd_start=True,
+    block=True,
+    aliases={"/内存占用"},
+    permission=SUPERUSER,
+)
+
+# 获取候选角色列表命令
+aniguessr_candidates = on_alconna(
+    Alconna("/candidates", Args["page?", int]),
+    use_cmd_start=True,
+    block=True,
+    aliases={"/提示", "/候选"},
+)
+
+
+@aniguessr_start.assign("$main", parameterless=[Depends(rate_limit)])
+async def handle_start(
+    bot: Bot,
+    event: Event,
+    uninfo: Uninfo,
+    tier: Match[str],
+):
+    # 角色数据尚未加载完成
+    if msg := database_unavailable_message():
+        await aniguessr_start.finish(UniMessage(msg))
+
+    # 获取用户ID
+    user_id = uninfo.user.id
+
+    # 获取用户锁，防止同一用户同时开始多个游戏
+    lock = get_lock(user_id)
+    if lock.locked():
+        await aniguessr_start.finish(UniMessage("你已经在进行一场游戏了，请完成当前游戏或放弃后再开始新游戏"))
+
+    async with lock:
+        # 如果已经有游戏在进行中
+        if user_id in games:
+            await aniguessr_start.finish(UniMessage("你已经在进行一场游戏了，请完成当前游戏或放弃后再开始新游戏"))
+
+        # 创建新游戏
+        try:
+            game_settings = GameSettings()  # 使用默认设置
+
+            tier_name = tier.result if tier.available else DEFAULT_TIER
+            game = AniGuessrGame(
+                group_tier_pools(uninfo).get(tier_name, character_db),
+                settings=game_settings,
+                hidden_names=pack_store.hidden_names(character_db, get_group_id(uninfo)),
+            )
+            games[user_id] = game
+
+            # 生成随机提示
+            hints = game.get_random_attrs()
+            log_event(
+                "start",
+                uninfo,
+                game,
+                mode=game.mode,
+                tier=tier_name,
+                pool=len(game.character_db.candidate_names()),
+                target=game.get_target_name(),
+                distinguish=game.character_db.distinguish_score(game.get_target_name()),
+                hints=list(hints),
+            )
+
+            # 发送游戏开始消息
+            start_msg = format_start_message(game, hints, f"游戏开始（{TIER_NAMES[tier_name]}难度）！")
+
+            await aniguessr_start.finish(UniMessage(start_msg))
+        except FinishedException:
+            pass
+        except Exception as e:
+            logger.error(f"开始游戏出错: {e}")
+            await aniguessr_start.finish(UniMessage(f"游戏启动失败: {e}"))
+
+
+@aniguessr_start.assign("tag", parameterless=[Depends(rate_limit)])
+async def handle_tag(
+    uninfo: Uninfo,
+):
+    if not plugin_config.aniguessr_tag_mode:
+        await aniguessr_start.finish(UniMessage("标签模式未启用"))
+    if tag_pool is None:
+        await aniguessr_start.finish(UniMessage(database_unavailable_message() or "标签数据加载失败，请稍后再试"))
+
+    user_id = uninfo.user.id
+    lock = get_lock(user_id)
+    if lock.locked():
+        await aniguessr_start.finish(UniMessage("你已经在进行一场游戏了，请完成当前游戏或放弃后再开始新游戏"))
+
+    async with lock:
+        if user_id in games:
+            await aniguessr_start.finish(UniMessage("你已经在进行一场游戏了，请完成当前游戏或放弃后再开始新游戏"))
+
+        try:
+            game = AniGuessrGame(tag_pool, settings=GameSettings(), mode="tag")
+            games[user_id] = game
+
+            hints = game.get_random_attrs()
+            log_event(
+                "start",
+                uninfo,
+                game,
+                mode=game.mode,
+                tier=None,
+                pool=len(tag_pool),
+                target=game.get_target_name(),
+                hints=list(hints),
+            )
+
+            await aniguessr_start.finish(UniMessage(format_start_message(game, hints, "游戏开始（标签模式）！")))
+        except FinishedException:
+            pass
+        except Exception as e:
+            logger.error(f"开始游戏出错: {e}")
+            await aniguessr_start.finish(UniMessage(f"游戏启动失败: {e}"))
+
+
+@aniguessr_start.assign("daily", parameterless=[Depends(rate_limit)])
+async def handle_daily(
+    uninfo: Uninfo,
+    arp: Arparma,
+):
+    """开始每日挑战"""
+    if arp.find("daily.rank"):
+        await aniguessr_start.finish(UniMessage(format_daily_leaderboard()))
+    if msg := database_unavailable_message():
+        await aniguessr_start.finish(UniMessage(msg))
+
+    user_id = uninfo.user.id
+    lock = get_lock(user_id)
+    if lock.locked():
+        await aniguessr_start.finish(UniMessage("你已经在进行一场游戏了，请完成当前游戏或放弃后再开始新游戏"))
+
+    async with lock:
+        if user_id in games:
+            await aniguessr_start.finish(UniMessage("你已经在进行一场游戏了，请完成当前游戏或放弃后再开始新游戏"))
+
+        leaderboard = get_leaderboard()
+        if leaderboard.has_played(user_id):
+            record = leaderboard.records[user_id]
+            result = "未猜中" if record.failed else f"第 {leaderboard.rank_of(user_id)} 名，猜了 {record.attempts} 次"
+            await aniguessr_start.finish(
+                UniMessage(f"你今天已经参加过每日挑战了（{result}），明天再来吧！\n\n{format_daily_leaderboard()}")
+            )
+
+        try:
+            daily_pool = tier_pools.get(DEFAULT_TIER, character_db)
+            challenge = get_daily_challenge(daily_pool, plugin_config.aniguessr_max_hints)
+            # 每日挑战所有群组共享，不能猜测任何角色包中的角色
+            game = AniGuessrGame(daily_pool, daily=challenge, hidden_names=pack_store.hidden_names(character_db, None))
+            games[user_id] = game
+            hints = game.get_random_attrs()
+            log_event(
+                "start",
+                uninfo,
+                game,
+                mode=game.mode,
+                tier=DEFAULT_TIER,
+                pool=len(daily_pool.candidate_names()),
+                target=game.get_target_name(),
+                hints=list(hints),
+            )
+            title = f"每日挑战 {challenge.day.isoformat()} 开始！所有人的目标角色都相同，"
+            await aniguessr_start.finish(UniMessage(format_start_message(game, hints, title)))
+        except FinishedException:
+            pass
+        except Exception as e:
+            logger.error(f"开始每日挑战出错: {e}")
+            await aniguessr_start.finish(UniMessage(f"每日挑战启动失败: {e}"))
+
+
+@aniguessr_start.assign("rank", parameterless=[Depends(rate_limit)])
+async def handle_rank(
+    uninfo: Uninfo,
+    scope: Match[str],
+):
+    """查看战绩排行榜，群聊中默认查看本群排行"""
+    if stats_store is None:
+        await aniguessr_start.finish(UniMessage("战绩统计不可用"))
+
+    group_id = None if scope.available and scope.result == "global" else get_group_id(uninfo)
+    top = await stats_store.top(group_id)
+    title = "本群排行榜" if group_id else "全局排行榜"
+    if not top:
+        msg = f"{title}：还没有人猜对过角色"
+    else:
+        msg = f"{title}：\n"
+        for rank, player in enumerate(top, start=1):
+            msg += (
+                f"{rank}. {player.user_name} - 胜 {player.wins} 场 / 共 {player.games} 场，"
+                f"平均 {player.average_attempts:.1f} 次，最高连胜 {player.best_streak}\n"
+            )
+        msg = msg.rstrip()
+
+    player = await stats_store.player(uninfo.user.id, group_id)
+    if player is not None:
+        msg += (
+            f"\n\n你的战绩：胜 {player.wins} 场 / 共 {player.games} 场（胜率 {player.win_rate:.0%}），"
+            f"当前连胜 {player.streak}，最高连胜 {player.best_streak}"
+        )
+    await aniguessr_start.finish(UniMessage(msg))
+
+
+@aniguessr_guess.handle(parameterless=[Depends(rate_limit)])
+async def handle_guess(
+    bot: Bot,
+    event: Event,
+    uninfo: Uninfo,
+    character_name: Match[str],
+):
+    # 获取用户ID
+    user_id = uninfo.user.id
+    character_name = character_name.result
+    # 检查是否有游戏在进行
+    if user_id not in games:
+        await aniguessr_guess.finish(UniMessage("你还没有开始游戏，请先使用 /aniguessr 开始游戏"))
+
+    lock = get_lock(user_id)
+    ticket = guess_tickets.issue(user_id)
+    async with lock:
+        try:
+            # 等待期间用户又发送了猜测，只处理最新的一次
+            if plugin_config.aniguessr_pending_guess == "merge" and not guess_tickets.is_latest(user_id, ticket):
+                await aniguessr_guess.finish()
+        finally:
+            guess_tickets.release(user_id, ticket)
+        # 等待期间游戏可能已经结束
+        game = games.get(user_id)
+        if game is None:
+            await aniguessr_guess.finish(UniMessage("游戏已经结束，请使用 /aniguessr 开始新游戏"))
+
+        # 检查游戏是否超时
+        if game.is_timed_out():
+            target_name = game.get_target_name()
+            finish_game(uninfo, won=False, reason="timeout")
+            await aniguessr_guess.finish(UniMessage(f"游戏已超时。正确答案是：{target_name}"))
+
+        # 检查是否达到最大尝试次数
+        if game.is_max_attempts_reached():
+            target_name = game.get_target_name()
+            finish_game(uninfo, won=False, reason="max_attempts")
+            await aniguessr_guess.finish(UniMessage(f"已达到最大尝试次数 {game.attempts}。正确答案是：{target_name}"))
+
+        # 进行猜测
+        try:
+            try:
+                guess_result = await game.make_guess(character_name)
+            except ValueError:
+                log_event("guess", uninfo, game, input=character_name, name=None, method="none", attempt=game.attempts)
+                raise
+            log_event(
+                "guess",
+                uninfo,
+                game,
+                input=character_name,
+                name=guess_result.guessed_name,
+                method="exact" if guess_result.guessed_name == character_name else "fuzzy",
+                correct=guess_result.is_correct,
+                attempt=guess_result.attempts,
+                new_attrs=len(guess_result.new_attrs),
+            )
+
+            # 根据猜测结果构建响应消息
+            if guess_result.is_correct:
+                # 游戏结束，猜对了
+                finish_game(uninfo, won=True, reason="win")
+                await aniguessr_guess.finish(
+                    UniMessage(
+                        f"恭喜你猜对了！正确角色是：{guess_result.target_name}\n你总共猜了 {guess_result.attempts} 次"
+                    )
+                )
+            else:
+                # 继续游戏，显示剩余尝试次数和时间
+                remaining_attempts = game.settings.max_attempts - game.attempts
+                remaining_time = game.remaining_seconds()
+                msg = render_guess_reply(
+                    guess_result,
+                    remaining_attempts=remaining_attempts,
+                    remaining_time=remaining_time,
+                    limit=plugin_config.aniguessr_reply_limit,
+                    order=plugin_config.aniguessr_reply_order,
+                )
+                if not use_image_reply():
+                    await aniguessr_guess.finish(UniMessage(msg))
+
+                board_items, omitted = guess_board_items(
+                    guess_result,
+                    limit=plugin_config.aniguessr_reply_limit,
+                    order=plugin_config.aniguessr_reply_order,
+                )
+                footer = [f"剩余尝试次数: {remaining_attempts}, 剩余时间: {remaining_time}秒"]
+                if omitted:
+                    footer.insert(0, f"还有 {omitted} 项未显示")
+                title = f"第 {guess_result.attempts} 次猜测：{guess_result.guessed_name}"
+                await aniguessr_guess.finish(await image_or_text(msg, render_guess_board, title, board_items, footer))
+        except ValueError as e:
+            # 角色不在数据库中
+            await aniguessr_guess.finish(UniMessage(f"错误：{e!s}"))
+        except WorkerBusyError as e:
+            # 不计入尝试次数，稍后可以重新猜测
+            await aniguessr_guess.finish(UniMessage(str(e)))
+        except FinishedException:
+            pass
+        except Exception as e:
+            logger.error(f"猜测过程中出错: {e}")
+            await aniguessr_guess.finish(UniMessage(f"出现错误: {e!s}"))
+
+
+@aniguessr_give_up.handle(parameterless=[Depends(rate_limit)])
+async def handle_give_up(
+    uninfo: Uninfo,
+):
+    # 获取用户ID
+    user_id = uninfo.user.id
+
+    # 等待正在进行的猜测或候选查询完成后再结束游戏
+    async with get_lock(user_id):
+        # 检查是否有游戏在进行
+        if user_id not in games:
+            await aniguessr_give_up.finish(UniMessage("你还没有开始游戏，无需放弃"))
+
+        # 获取正确答案并结束游戏
+        game = finish_game(uninfo, won=False, reason="giveup")
+    target_name = game.get_target_name()
+
+    await aniguessr_give_up.finish(UniMessage(f"游戏结束！正确答案是：{target_name}"))
+
+
+@aniguessr_update.handle()
+async def handle_update():
+    """处理强制更新数据的请求"""
+    await aniguessr_update.send(UniMessage("正在更新角色数据，请稍等..."))
+
+    success = await refresh_character_data()
+    if success:
+        await aniguessr_update.finish(UniMessage(f"角色数据更新成功！当前数据版本: {versions.current()}"))
+    else:
+        await aniguessr_update.finish(UniMessage("角色数据更新失败，请查看日志"))
+
+
+@aniguessr_version.assign("$main")
+async def handle_version_list():
+    """列出数据版本"""
+    manifests = await asyncio.to_thread(versions.versions)
+    if not manifests:
+        await aniguessr_version.finish(UniMessage("还没有数据版本"))
+
+    current = versions.current()
+    msg = "角色数据版本：\n"
+    for manifest in manifests:
+        mark = "▶" if manifest.version == current else "•"
+        created_at = datetime.fromtimestamp(manifest.created_at).strftime("%Y-%m-%d %H:%M")
+        msg += f"{mark} {manifest.version}  {created_at}  {manifest.characters or '?'} 个角色\n"
+    msg += "\n使用 /aniguessr_version use 版本号 切换版本，/aniguessr_version rollback 回滚到上一个版本"
+    await aniguessr_version.finish(UniMessage(msg))
+
+
+@aniguessr_version.assign("use")
+async def handle_version_use(version: Match[str]):
+    """切换到指定数据版本"""
+    await switch_version(version.result)
+
+
+@aniguessr_version.assign("rollback")
+async def handle_version_rollback():
+    """回滚到上一个数据版本"""
+    await switch_version(None)
+
+
+async def switch_version(version: str | None):
+    """切换数据版本并重新加载角色数据库，已开始的对局继续使用原来的数据"""
+    try:
+        target = await switch_data_version(version)
+    except ValueError as e:
+        await aniguessr_version.finish(UniMessage(f"切换失败：{e}"))
+
+    if await reload_character_db():
+        await aniguessr_version.finish(UniMessage(f"已切换到数据版本 {target}"))
+    await aniguessr_version.finish(UniMessage(f"已切换到数据版本 {target}，但加载失败，请查看日志"))
+
+
+@aniguessr_metrics.handle()
+async def handle_metrics():
+    """查看运行指标"""
+    await aniguessr_metrics.finish(UniMessage(metrics.format_metrics(metrics.collect())))
+
+
+async def sample_memory() -> MemoryReport:
+    """统计各组件的内存占用，数据先于引用它们的角色池和对局统计"""
+    components: dict[str, object] = {}
+    for prefix, db in (("角色数据库", character_db), ("标签数据库", tag_pool.core if tag_pool else None)):
+        if db is not None:
+            components.update({f"{prefix}/{name}": part for name, part in db.memory_parts().items()})
+    components.update(
+        {
+            "难度角色池": tier_pools,
+            "标签角色池": tag_pool,
+            "角色包": pack_store,
+            "每日挑战": (current_daily_challenge(), get_leaderboard()),
+            "候选角色缓存": candidate_cache,
+            "对局": games,
+            "用户锁": user_locks,
+            "限流": (user_limiter, group_limiter, guess_tickets),
+        }
+    )
+    counts = {"对局": len(games), "用户锁": len(user_locks)}
+    return await asyncio.to_thread(memory_tracker.sample, components, counts)
+
+
+@aniguessr_memory.handle()
+async def handle_memory():
+    """查看内存占用及与上一次采样相比的增长"""
+    report = await sample_memory()
+    await aniguessr_memory.finish(UniMessage(format_memory_report(report)))
+
+
+@aniguessr_pack.assign("$main")
+async def handle_pack_list(uninfo: Uninfo):
+    """列出角色包及其在本群的启用状态"""
+    if not pack_store.packs:
+        await aniguessr_pack.finish(UniMessage("还没有导入角色包，使用 /aniguessr_pack import 文件路径 导入"))
+
+    enabled = pack_store.enabled(get_group_id(uninfo))
+    msg = "角色包：\n"
+    for name, characters in pack_store.packs.items():
+        mark = "▶" if name in enabled else "•"
+        msg += f"{mark} {name}  {len(characters)} 个角色\n"
+    msg += "\n▶ 表示本群已启用，使用 /aniguessr_pack enable 角色包 在本群启用"
+    await aniguessr_pack.finish(UniMessage(msg))
+
+
+@aniguessr_pack.assign("import")
+async def handle_pack_import(path: Match[str], name: Match[str]):
+    """导入角色包，同名角色包会被替换，正在使用的角色数据库增量更新"""
+    file = pathlib.Path(path.result)
+    try:
+        pack_format(file)
+    except ValueError as e:
+        await aniguessr_pack.finish(UniMessage(f"导入失败：{e}"))
+    pack = name.result if name.available else file.name.split(".")[0]
+    if not is_valid_pack_name(pack):
+        await aniguessr_pack.finish(UniMessage(f"导入失败：角色包名称 {pack} 只能包含字母、数字、下划线和连字符"))
+
+    try:
+        characters, errors = await asyncio.to_thread(
+            read_pack, file, lambda character: pack_store.is_taken(character, pack, character_db)
+        )
+        await asyncio.to_thread(pack_store.save, pack, characters)
+    except FileNotFoundError:
+        await aniguessr_pack.finish(UniMessage(f"导入失败：文件 {file} 不存在"))
+    except Exception as e:
+        await aniguessr_pack.finish(UniMessage(f"导入失败：{e}"))
+
+    # 增量更新正在比较数据时等待其完成，不在线程遍历数据库期间修改
+    async with character_db_lock:
+        delta = pack_store.install(pack, characters)
+        if character_db is not None:
+            apply_pack_delta(character_db, delta)
+    refresh_scores_in_background()
+    msg = f"已导入角色包 {pack}：{len(characters)} 个角色（{delta.summary()}）"
+    if errors:
+        msg += f"\n\n以下 {len(errors)} 条记录未导入：\n" + "\n".join(errors)
+    await aniguessr_pack.finish(UniMessage(msg))
+
+
+@aniguessr_pack.assign("remove")
+async def handle_pack_remove(name: Match[str]):
+    """删除角色包，已开始的对局不受影响"""
+    if name.result not in pack_store.packs:
+        await aniguessr_pack.finish(UniMessage(f"角色包 {name.result} 不存在"))
+    async with character_db_lock:
+        delta = await asyncio.to_thread(pack_store.uninstall, name.result)
+        if character_db is not None:
+            apply_pack_delta(character_db, delta)
+    refresh_scores_in_background()
+    await aniguessr_pack.finish(UniMessage(f"已删除角色包 {name.result}，共 {len(delta.removed)} 个角色"))
+
+
+@aniguessr_pack.assign("enable")
+async def handle_pack_enable(uninfo: Uninfo, name: Match[str]):
+    """在本群启用角色包"""
+    group_id = get_group_id(uninfo)
+    if group_id is None:
+        await aniguessr_pack.finish(UniMessage("请在群聊中启用角色包"))
+    if name.result not in pack_store.packs:
+        await aniguessr_pack.finish(UniMessage(f"角色包 {name.result} 不存在"))
+    if not pack_store.enable(group_id, name.result):
+        await aniguessr_pack.finish(UniMessage(f"本群已经启用了角色包 {name.result}"))
+    await aniguessr_pack.finish(UniMessage(f"已在本群启用角色包 {name.result}，新开始的游戏会包含其中的角色"))
+
+
+@aniguessr_pack.assign("disable")
+async def handle_pack_disable(uninfo: Uninfo, name: Match[str]):
+    """在本群停用角色包"""
+    group_id = get_group_id(uninfo)
+    if group_id is None or not pack_store.disable(group_id, name.result):
+        await aniguessr_pack.finish(UniMessage(f"本群没有启用角色包 {name.result}"))
+    await aniguessr_pack.finish(UniMessage(f"已在本群停用角色包 {name.result}"))
+
+
+# 定时任务：每周更新一次角色数据
+@scheduler.scheduled_job("cron", day_of_week=0, hour=3, minute=0)
+async def scheduled_update_data():
+    """定时更新角色数据（每周一凌晨3点）"""
+    logger.info("开始执行定时角色数据更新")
+    try:
+        success = await refresh_character_data()
+        if success:
+            logger.info("定时角色数据更新成功")
+        else:
+            logger.error("定时角色数据更新失败")
+    except Exception as e:
+        logger.error(f"定时更新角色数据时出错: {e}")
+
+
+# 定时任务：每天零点切换每日挑战
+@scheduler.scheduled_job("cron", hour=0, minute=0)
+async def scheduled_daily_rollover():
+    """预计算当天的每日挑战"""
+    if character_db is None:
+        return
+    try:
+        rollover(tier_pools.get(DEFAULT_TIER, character_db), plugin_config.aniguessr_max_hints)
+    except Exception as e:
+        logger.error(f"切换每日挑战时出错: {e}")
+
+
+# 定时任务：定时在日志中输出内存占用
+@scheduler.scheduled_job("interval", minutes=max(plugin_config.aniguessr_memory_log_minutes, 1))
+async def scheduled_memory_log():
+    """输出各组件的内存占用及增长"""
+    if plugin_config.aniguessr_memory_log_minutes <= 0:
+        return
+    try:
+        logger.info(format_memory_line(await sample_memory()))
+    except Exception as e:
+        logger.error(f"统计内存占用时出错: {e}")
+
+
+# 定时任务：每天更新对局事件统计表
+@scheduler.scheduled_job("cron", hour=4, minute=30)
+async def scheduled_analytics():
+    """增量处理新的对局事件，更新 analytics 目录中的统计表"""
+    if event_log is None:
+        return
+    try:
+        await event_log.flush()
+        aggregates = await asyncio.to_thread(update_analytics, event_log.directory, DATA_DIR / "analytics")
+        logger.info(
+            f"对局事件统计已更新：共 {aggregates.games} 局，胜率 {aggregates.wins / (aggregates.games or 1):.1%}"
+        )
+    except Exception as e:
+        logger.error(f"更新对局事件统计时出错: {e}")
+
+
+@aniguessr_candidates.handle(parameterless=[Depends(rate_limit)])
+async def handle_candidates(
+    uninfo: Uninfo,
+    page: Match[int],
+):
+    """处理获取候选角色列表的请求"""
+    # 获取用户ID
+    user_id = uninfo.user.id
+
+    # 与猜测和放弃使用同一个锁，读取期间游戏不会结束或变化
+    async with get_lock(user_id):
+        # 检查是否有游戏在进行
+        game = games.get(user_id)
+        if game is None:
+            await aniguessr_candidates.finish(UniMessage("你还没有开始游戏，请先使用 /aniguessr 开始游戏"))
+
+        try:
+            await game.prepare_candidates()
+        except WorkerBusyError as e:
+            await aniguessr_candidates.finish(UniMessage(str(e)))
+
+        # 获取已知的属性状态
+        attr_status = game.get_attribute_status()
+        confirmed = sorted(attr_status.confirmed)
+        excluded = sorted(attr_status.excluded)
+
+        # 获取按排名分页的候选角色
+        cursor = game.get_candidate_cursor()
+        page_size = max(1, plugin_config.aniguessr_candidates_page_size)
+        page_count = cursor.page_count(page_size)
+        page_no = min(max(page.result if page.available else 1, 1), page_count)
+        shown = cursor.page(page_no, page_size)
+        log_event(
+            "candidates",
+            uninfo,
+            game,
+            total=cursor.total,
+            page=page_no,
+            confirmed=len(confirmed),
+            excluded=len(excluded),
+            attempt=game.attempts,
+        )
+
+    msg = "当前已知信息：\n"
+
+    if confirmed:
+        msg += "\n已确认目标角色具有的特征：\n"
+        for attr in confirmed:
+            msg += f"✅ {attr}\n"
+
+    if excluded:
+        msg += "\n已确认目标角色不具有的特征：\n"
+        for attr in excluded:
+            msg += f"❌ {attr}\n"
+
+    if cursor.total:
+        candidates_heading = f"可能的候选角色 (共{cursor.total}个，第{page_no}/{page_count}页)："
+        msg += f"\n{candidates_heading}\n"
+        for char in shown:
+            msg += f"• {char}\n"
+        if page_no < page_count:
+            msg += f"使用 /candidates {page_no + 1} 查看下一页\n"
+    else:
+        if confirmed or excluded:
+            candidates_heading = "暂无符合条件的候选角色，请继续猜测获取更多线索。"
+        else:
+            candidates_heading = "目前没有足够的线索，请通过猜测获取更多信息。"
+        msg += f"\n{candidates_heading}\n"
+
+    msg += "\n继续使用 /guess 角色名 进行猜测"
+
+    if not use_image_reply():
+        await aniguessr_candidates.finish(UniMessage(msg))
+
+    sections = [
+        ("已确认目标角色具有的特征：", confirmed),
+        ("已确认目标角色不具有的特征：", excluded),
+        (candidates_heading, shown),
+    ]
+    sections = [(heading, entries) for heading, entries in sections if entries or heading == candidates_heading]
+    reply = await image_or_text(msg, render_list_board, "当前已知信息", sections, ["继续使用 /guess 角色名 进行猜测"])
+    await aniguessr_candidates.finish(reply)
+
+
+driver = get_driver()
+
+
+@driver.on_startup
+async def init_render_pool():
+    """图片回复模式下启动渲染进程池"""
+    set_cpu_concurrency(plugin_config.aniguessr_cpu_concurrency)
+    if plugin_config.aniguessr_reply_mode != "image":
+        return
+    if not image_render_available():
+        logger.warning("未安装 Pillow，图片回复模式不可用，将使用文本回复")
+        return
+    start_render_pool(plugin_config.aniguessr_render_workers, plugin_config.aniguessr_image_font)
+
+
+@driver.on_shutdown
+async def close_render_pool():
+    """关闭渲染进程池"""
+    shutdown_render_pool()
+
+
+@driver.on_startup
+async def start_guess_workers():
+    """启动猜测计算进程池，角色数据加载后发布快照"""
+    if plugin_config.aniguessr_guess_workers <= 0:
+        return
+    workers = GuessWorkerPool(
+        plugin_config.aniguessr_guess_workers,
+        timeout=plugin_config.aniguessr_guess_timeout,
+        max_batch=plugin_config.aniguessr_guess_batch,
+        max_pending=plugin_config.aniguessr_guess_max_pending,
+        max_loop_lag=plugin_config.aniguessr_max_loop_lag_ms / 1000,
+    )
+    workers.start()
+    if character_db is not None:
+        workers.track(character_db)
+    set_guess_workers(workers)
+    metrics.register("guess_workers", workers.stats)
+
+
+@driver.on_shutdown
+async def stop_guess_workers():
+    """关闭猜测计算进程池"""
+    if (workers := guess_workers()) is not None:
+        workers.close()
+        set_guess_workers(None)
+
+
+@driver.on_startup
+async def open_stats_store():
+    """打开战绩数据库，恢复今天的每日挑战排行榜"""
+    global stats_store
+    try:
+        store = StatsStore(DATA_DIR / "stats.db")
+        store.open()
+        stats_store = store
+    except Exception as e:
+        logger.error(f"打开战绩数据库失败: {e}")
+        return
+    # 重启后已参加过的玩家不能再次挑战
+    leaderboard = get_leaderboard()
+    try:
+        results = await store.daily_results(leaderboard.day.isoformat())
+    except Exception as e:
+        logger.error(f"读取每日挑战成绩失败: {e}")
+        return
+    for result in results:
+        leaderboard.record(result.user_id, result.user_name, result.won, result.attempts, result.seconds)
+    if results:
+        logger.info(f"已恢复今天的每日挑战排行榜，共 {len(results)} 人参加")
+
+
+@driver.on_shutdown
+async def close_stats_store():
+    """写入剩余战绩并关闭数据库"""
+    if stats_store is not None:
+        await stats_store.close()
+
+
+@driver.on_startup
+async def open_event_log():
+    """启动对局事件日志的后台写入"""
+    global event_log
+    if not plugin_config.aniguessr_event_log:
+        return
+    try:
+        log = EventLog(
+            DATA_DIR / "events",
+            max_bytes=plugin_config.aniguessr_event_log_max_mb << 20,
+            keep_files=plugin_config.aniguessr_event_log_keep,
+            compression=plugin_config.aniguessr_data_compression,
+        )
+        log.open()
+        event_log = log
+        metrics.register("event_log", log.stats)
+    except Exception as e:
+        logger.error(f"打开对局事件日志失败: {e}")
+
+
+@driver.on_shutdown
+async def close_event_log():
+    """写入剩余的对局事件"""
+    if event_log is not None:
+        await event_log.close()
+
+
+@driver.on_startup
+async def start_character_data_warmup():
+    """在后台加载角色数据，不阻塞机器人启动"""
+    global warmup_task
+    warmup_task = asyncio.create_task(init_character_data())
+
+
+@driver.on_shutdown
+async def stop_character_data_warmup():
+    """关闭时取消未完成的加载和区分度计算"""
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
+    if score_refresh is not None and not score_refresh[1].done():
+        score_refresh[1].cancel()
+
+
+# 启动时尝试加载或下载数据
+async def init_character_data():
+    """初始化角色数据"""
+    logger.info("开始初始化角色数据")
+
+    try:
+        await asyncio.to_thread(pack_store.load)
+    except Exception as e:
+        logger.error(f"加载角色包失败: {e}")
+
+    try:
+        # 尝试创建角色数据库
+        db = await create_character_database()
+        if db:
+            use_character_db(db)
+            logger.info(
+                f"成功初始化角色数据库，包含 {len(db.characters)} 个角色和 {len(db.get_all_attributes())} 个属性"
+            )
+
+            # 输出一些统计信息
+            most_attrs = 0
+            most_attrs_char = ""
+            for char_name, attrs in db.characters.items():
+                if len(attrs) > most_attrs:
+                    most_attrs = len(attrs)
+                    most_attrs_char = char_name
+
+            logger.info(f"属性最多的角色是 {most_attrs_char}，共有 {most_attrs} 个属性")
+        else:
+            logger.error("初始化角色数据库失败")
+            # 尝试下载角色数据
+            logger.info("尝试更新角色数据...")
+            if await update_character_data():
+                logger.info("数据更新成功，重新尝试初始化")
+                db = await create_character_database()
+                if db:
+                    use_character_db(db)
+                    logger.info(f"重新初始化成功，角色数据库包含 {len(db.characters)} 个角色")
+                else:
+                    logger.error("重新初始化失败")
+            else:
+                logger.error("数据更新失败")
+
+        if character_db is not None:
+            await reload_tag_pool()
+    except Exception as e:
+        logger.error(f"初始化角色数据出错: {e}")
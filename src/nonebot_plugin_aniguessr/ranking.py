@@ -0,0 +1,52 @@
+from collections.abc import Callable, Collection
+import heapq
+import math
+
+# 排序键，越小越靠前
+RankKey = tuple
+
+
+class CandidateCursor:
+    """
+    候选角色分页游标
+
+    首次请求时对候选集合建堆（O(n)），之后每翻一页只从堆中弹出这一页需要的元素（O(k log n)），
+    已弹出的结果保存在 ranked 中，翻回前面的页不需要重新计算，整个候选集合不会被完整排序。
+    """
+
+    __slots__ = ("_heap", "ranked", "total")
+
+    def __init__(self, candidates: Collection[str], rank_key: Callable[[str], RankKey]):
+        self._heap = [(rank_key(name), name) for name in candidates]
+        heapq.heapify(self._heap)
+        self.ranked: list[str] = []
+        self.total = len(self._heap)
+
+    def page_count(self, page_size: int) -> int:
+        """总页数"""
+        return max(1, math.ceil(self.total / page_size))
+
+    def page(self, page: int, page_size: int) -> list[str]:
+        """
+        获取某一页的候选角色
+        Args:
+            page: 页码，从 1 开始
+            page_size: 每页数量
+        Returns:
+            list[str]: 这一页的角色名
+        """
+        start = (page - 1) * page_size
+        end = min(start + page_size, self.total)
+        heap = self._heap
+        while len(self.ranked) < end:
+            self.ranked.append(heapq.heappop(heap)[1])
+        return self.ranked[start:end]
+
+
+def attribute_count_key(char2attr: dict[str, list[str]]) -> Callable[[str], RankKey]:
+    """按属性数量从多到少排序，属性多的角色通常更知名；数量相同时按名称排序"""
+
+    def key(name: str) -> RankKey:
+        return (-len(char2attr.get(name, ())), name)
+
+    return key
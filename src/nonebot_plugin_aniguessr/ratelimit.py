@@ -0,0 +1,145 @@
+"""
+限流与背压
+
+- 令牌桶：按用户和群组限制命令频率，超出限制的消息直接丢弃，不回复
+- 最新请求优先：同一用户排队等待的多次猜测只执行最后一次，其余合并丢弃
+- CPU 并发上限：模糊匹配、图片渲染等耗时操作同时执行的数量有上限
+"""
+
+import asyncio
+from collections.abc import Callable
+import time
+from typing import TypeVar
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """令牌桶，以固定速率补充令牌，最多积累 capacity 个"""
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def try_acquire(self, now: float) -> bool:
+        """取出一个令牌，令牌不足时返回 False"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def refund(self) -> None:
+        """退还一个取出的令牌"""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+    def is_idle(self, now: float) -> bool:
+        """令牌已经补满，删除后重新创建的效果相同"""
+        return self.tokens + (now - self.updated) * self.rate >= self.capacity
+
+
+class RateLimiter:
+    """按键（用户或群组）分别限流"""
+
+    # 桶的数量超过这个值时清理已补满的桶
+    PRUNE_THRESHOLD = 4096
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.buckets: dict[str, TokenBucket] = {}
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def allow(self, key: str, now: float | None = None) -> bool:
+        """
+        请求是否允许通过
+        Args:
+            key: 用户ID或群组ID
+            now: 当前时间（单调时钟），默认取当前时间
+        Returns:
+            bool: 是否允许
+        """
+        if not self.enabled:
+            return True
+        now = time.monotonic() if now is None else now
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            if len(self.buckets) >= self.PRUNE_THRESHOLD:
+                self.prune(now)
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst, now)
+        if bucket.try_acquire(now):
+            return True
+        self.dropped += 1
+        return False
+
+    def refund(self, key: str) -> None:
+        """退还 allow 取出的令牌，用于请求被其他限流器拒绝、实际没有执行的情况"""
+        bucket = self.buckets.get(key)
+        if bucket is not None:
+            bucket.refund()
+
+    def prune(self, now: float) -> None:
+        """删除已补满的桶"""
+        self.buckets = {key: bucket for key, bucket in self.buckets.items() if not bucket.is_idle(now)}
+
+
+class LatestTicket:
+    """
+    最新请求优先
+
+    每个请求到达时领取一个递增的票号，拿到锁后如果已有更新的票号，说明用户在等待期间又发送了请求，
+    当前请求被合并（丢弃），只执行最新的一个。
+    """
+
+    def __init__(self):
+        self.latest: dict[str, int] = {}
+        self.merged = 0
+
+    def issue(self, key: str) -> int:
+        """领取票号"""
+        ticket = self.latest.get(key, 0) + 1
+        self.latest[key] = ticket
+        return ticket
+
+    def is_latest(self, key: str, ticket: int) -> bool:
+        """票号是否仍是最新的，不是时计入合并数"""
+        if self.latest.get(key) == ticket:
+            return True
+        self.merged += 1
+        return False
+
+    def release(self, key: str, ticket: int) -> None:
+        """请求处理完毕，没有更新的请求时删除记录"""
+        if self.latest.get(key) == ticket:
+            del self.latest[key]
+
+
+_cpu_semaphore: asyncio.Semaphore | None = None
+
+
+def set_cpu_concurrency(limit: int) -> None:
+    """设置耗时操作的并发上限"""
+    global _cpu_semaphore
+    _cpu_semaphore = asyncio.Semaphore(max(limit, 1))
+
+
+def cpu_slot() -> asyncio.Semaphore:
+    """耗时操作的并发槽位，未设置时默认 2 个"""
+    if _cpu_semaphore is None:
+        set_cpu_concurrency(2)
+    return _cpu_semaphore
+
+
+async def run_cpu_bound(func: Callable[..., T], *args) -> T:
+    """在线程中执行耗时的同步函数，同时执行的数量受并发上限限制，不阻塞事件循环"""
+    async with cpu_slot():
+        return await asyncio.to_thread(func, *args)
@@ -0,0 +1,156 @@
+from functools import cache
+from typing import Literal
+
+from .model import PRESENT_IN_TARGET, AttributeComparison, CharacterGuessResult, ComparisonStatus
+
+ReplyOrder = Literal["default", "confirmed_first", "diff_only"]
+
+# 各比较状态对应的指示符
+STATUS_INDICATORS: dict[ComparisonStatus, str] = {
+    ComparisonStatus.EXACT: "🟢",
+    ComparisonStatus.CLOSE: "🟡",
+    ComparisonStatus.HIGHER: "⬆️",
+    ComparisonStatus.LOWER: "⬇️",
+    ComparisonStatus.DIFFERENT: "❌",
+}
+
+# confirmed_first 模式下的排序优先级：匹配的属性 > 目标角色具有的属性 > 目标角色不具有的属性
+_ORDER_RANK: dict[ComparisonStatus, int] = {
+    ComparisonStatus.EXACT: 0,
+    ComparisonStatus.CLOSE: 0,
+    ComparisonStatus.HIGHER: 0,
+    ComparisonStatus.LOWER: 0,
+    ComparisonStatus.DIFFERENT: 2,
+}
+
+GUESS_REPLY_TEMPLATE = (
+    "第 {attempts} 次猜测：{name}\n\n"
+    "比较结果：\n"
+    "{lines}\n"
+    "\n剩余尝试次数: {remaining_attempts}, 剩余时间: {remaining_time}秒"
+    "\n使用 /guess 角色名 继续猜测，/candidates 查看候选角色，或 /giveup 放弃本次游戏"
+)
+OMITTED_TEMPLATE = "…… 还有 {count} 项未显示"
+NO_NEW_INFO_LINE = "本次猜测没有获得新的信息"
+
+
+@cache
+def _line_suffix(comparison: AttributeComparison) -> str:
+    """属性名之后的部分，预分配的比较结果在所有对局间共享同一个字符串"""
+    if comparison.description:
+        return f": {comparison.value} ({comparison.description})"
+    return f": {comparison.value}"
+
+
+def _order_rank(item: tuple[str, AttributeComparison]) -> int:
+    comparison = item[1]
+    if comparison is PRESENT_IN_TARGET:
+        return 1
+    return _ORDER_RANK[comparison.status]
+
+
+def select_comparisons(
+    result: CharacterGuessResult,
+    order: ReplyOrder = "default",
+) -> list[tuple[str, AttributeComparison]]:
+    """
+    按输出顺序筛选比较结果
+    Args:
+        result: 猜测结果
+        order: default 保持原顺序，confirmed_first 匹配的属性在前，diff_only 只保留本次新获得的信息
+    Returns:
+        list[tuple[str, AttributeComparison]]: (属性, 比较结果) 列表
+    """
+    items = list(result.comparisons.items())
+    if order == "diff_only":
+        new_attrs = result.new_attrs
+        items = [item for item in items if item[0] in new_attrs]
+    if order != "default":
+        # sort 是稳定的，同一优先级内保持原顺序
+        items.sort(key=_order_rank)
+    return items
+
+
+def render_comparison_lines(
+    result: CharacterGuessResult,
+    *,
+    limit: int = 0,
+    order: ReplyOrder = "default",
+) -> str:
+    """
+    渲染比较结果部分
+    Args:
+        result: 猜测结果
+        limit: 最多显示的条数，0 表示不限制
+        order: 输出顺序
+    Returns:
+        str: 每行一条比较结果
+    """
+    items = select_comparisons(result, order)
+    if not items:
+        return NO_NEW_INFO_LINE
+
+    omitted = 0
+    if 0 < limit < len(items):
+        omitted = len(items) - limit
+        items = items[:limit]
+
+    lines = [f"{STATUS_INDICATORS[comparison.status]} {attr}{_line_suffix(comparison)}" for attr, comparison in items]
+    if omitted:
+        lines.append(OMITTED_TEMPLATE.format(count=omitted))
+    return "\n".join(lines)
+
+
+def guess_board_items(
+    result: CharacterGuessResult,
+    *,
+    limit: int = 0,
+    order: ReplyOrder = "default",
+) -> tuple[list[tuple[str, str, str]], int]:
+    """
+    转换为图片渲染使用的基础数据
+    Args:
+        result: 猜测结果
+        limit: 最多显示的条数，0 表示不限制
+        order: 输出顺序
+    Returns:
+        tuple: ((属性, 状态, 说明) 列表, 未显示的条数)
+    """
+    items = select_comparisons(result, order)
+    omitted = 0
+    if 0 < limit < len(items):
+        omitted = len(items) - limit
+        items = items[:limit]
+    board_items = [
+        (attr, "present" if comparison is PRESENT_IN_TARGET else comparison.status.value, comparison.value)
+        for attr, comparison in items
+    ]
+    return board_items, omitted
+
+
+def render_guess_reply(
+    result: CharacterGuessResult,
+    *,
+    remaining_attempts: int,
+    remaining_time: int,
+    limit: int = 0,
+    order: ReplyOrder = "default",
+) -> str:
+    """
+    一次性渲染未猜中时的回复消息
+    Args:
+        result: 猜测结果
+        remaining_attempts: 剩余尝试次数
+        remaining_time: 剩余时间（秒）
+        limit: 最多显示的比较结果条数，0 表示不限制
+        order: 比较结果的输出顺序
+    Returns:
+        str: 回复消息
+    """
+    return GUESS_REPLY_TEMPLATE.format(
+        attempts=result.attempts,
+        name=result.guessed_name,
+        lines=render_comparison_lines(result, limit=limit, order=order),
+        remaining_attempts=remaining_attempts,
+        remaining_time=remaining_time,
+    )
@@ -0,0 +1,258 @@
+"""
+图片回复渲染
+
+渲染函数只接收可 pickle 的基础数据，在进程池中执行，不阻塞事件循环。
+字体、文字与属性格子在进程内缓存，进程池常驻，因此缓存可以在多局游戏之间复用。
+Pillow 为可选依赖，未安装时 is_available() 返回 False，调用方应回退到文本回复。
+Pillow 在第一次渲染时才导入，文本回复模式下不会加载。
+"""
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from functools import cache, lru_cache
+from importlib.util import find_spec
+from io import BytesIO
+
+# 属性比较结果：(属性, 状态, 说明文本)，状态取 ComparisonStatus 的值，另有 present 表示目标角色具有的属性
+BoardItem = tuple[str, str, str]
+
+# 常见系统中的中文字体，按顺序尝试
+FONT_CANDIDATES = (
+    "msyh.ttc",
+    "NotoSansCJK-Regular.ttc",
+    "NotoSansSC-Regular.otf",
+    "wqy-microhei.ttc",
+    "SourceHanSansSC-Regular.otf",
+    "PingFang.ttc",
+)
+
+WIDTH = 760
+PADDING = 20
+COLUMNS = 2
+TILE_WIDTH = (WIDTH - PADDING * 2 - (COLUMNS - 1) * 10) // COLUMNS
+TILE_HEIGHT = 56
+TILE_GAP = 10
+# 每个渲染进程缓存的属性格子数量，一个格子约 60KB，未命中时只需在缓存的边框上绘制文字
+TILE_CACHE_SIZE = 256
+TITLE_SIZE = 26
+TEXT_SIZE = 20
+SMALL_SIZE = 15
+
+BACKGROUND = (250, 250, 250)
+TEXT_COLOR = (40, 40, 40)
+SUBTLE_COLOR = (110, 110, 110)
+STATUS_COLORS: dict[str, tuple[int, int, int]] = {
+    "exact": (76, 175, 80),
+    "close": (255, 193, 7),
+    "higher": (33, 150, 243),
+    "lower": (33, 150, 243),
+    "present": (255, 152, 0),
+    "different": (229, 57, 53),
+}
+STATUS_MARKS: dict[str, str] = {
+    "exact": "✓",
+    "close": "≈",
+    "higher": "↑",
+    "lower": "↓",
+    "present": "!",
+    "different": "✗",
+}
+
+_font_path: str = ""
+_executor: ProcessPoolExecutor | None = None
+
+
+@cache
+def is_available() -> bool:
+    """是否可以渲染图片（已安装 Pillow），只检查是否安装，不导入"""
+    return find_spec("PIL") is not None
+
+
+@cache
+def _pil():
+    """按需导入 Pillow"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    return Image, ImageDraw, ImageFont
+
+
+def _init_worker(font_path: str) -> None:
+    """进程池初始化，设置字体路径"""
+    global _font_path
+    _font_path = font_path
+
+
+@lru_cache(maxsize=8)
+def _font(size: int):
+    """加载字体，每个进程每种字号只加载一次"""
+    _, _, ImageFont = _pil()
+    for path in (_font_path, *FONT_CANDIDATES):
+        if not path:
+            continue
+        try:
+            return ImageFont.truetype(path, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+@lru_cache(maxsize=8192)
+def _text_width(text: str, size: int) -> int:
+    """文字宽度缓存，同一段文字只测量一次"""
+    left, _, right, _ = _font(size).getbbox(text)
+    return int(right - left)
+
+
+def _fit_text(text: str, size: int, max_width: int) -> str:
+    """截断过长的文字"""
+    if _text_width(text, size) <= max_width:
+        return text
+    while text and _text_width(text + "…", size) > max_width:
+        text = text[:-1]
+    return text + "…"
+
+
+@lru_cache(maxsize=len(STATUS_COLORS) + 1)
+def _frame(status: str):
+    """属性格子的边框和状态标记，每种状态只绘制一次"""
+    Image, ImageDraw, _ = _pil()
+    color = STATUS_COLORS.get(status, STATUS_COLORS["different"])
+    frame = Image.new("RGB", (TILE_WIDTH, TILE_HEIGHT), (255, 255, 255))
+    draw = ImageDraw.Draw(frame)
+    draw.rounded_rectangle((0, 0, TILE_WIDTH - 1, TILE_HEIGHT - 1), radius=8, outline=color, width=2)
+    draw.rounded_rectangle((0, 0, 40, TILE_HEIGHT - 1), radius=8, fill=color)
+    draw.text((20, TILE_HEIGHT // 2), STATUS_MARKS.get(status, "?"), fill=(255, 255, 255), font=_font(24), anchor="mm")
+    return frame
+
+
+@lru_cache(maxsize=TILE_CACHE_SIZE)
+def _tile(attr: str, status: str, detail: str):
+    """渲染单个属性格子，相同的 (属性, 状态, 说明) 在所有对局间复用"""
+    _, ImageDraw, _ = _pil()
+    tile = _frame(status).copy()
+    draw = ImageDraw.Draw(tile)
+    text_width = TILE_WIDTH - 56
+    draw.text((50, 6), _fit_text(attr, TEXT_SIZE, text_width), fill=TEXT_COLOR, font=_font(TEXT_SIZE))
+    draw.text((50, 32), _fit_text(detail, SMALL_SIZE, text_width), fill=SUBTLE_COLOR, font=_font(SMALL_SIZE))
+    return tile
+
+
+def _encode(image) -> bytes:
+    # 渲染耗时主要在编码上，同样的图片 PNG 编码比 JPEG 慢一个数量级
+    buffer = BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def render_guess_board(title: str, items: list[BoardItem], footer: list[str]) -> bytes:
+    """
+    渲染猜测结果图
+    Args:
+        title: 标题
+        items: 属性比较结果
+        footer: 底部的说明文字，每项一行
+    Returns:
+        bytes: JPEG 图片
+    """
+    rows = (len(items) + COLUMNS - 1) // COLUMNS
+    grid_height = rows * (TILE_HEIGHT + TILE_GAP)
+    height = PADDING * 2 + TITLE_SIZE + 16 + grid_height + len(footer) * (TEXT_SIZE + 8)
+
+    Image, ImageDraw, _ = _pil()
+    image = Image.new("RGB", (WIDTH, height), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    draw.text(
+        (PADDING, PADDING), _fit_text(title, TITLE_SIZE, WIDTH - PADDING * 2), fill=TEXT_COLOR, font=_font(TITLE_SIZE)
+    )
+
+    top = PADDING + TITLE_SIZE + 16
+    for index, (attr, status, detail) in enumerate(items):
+        row, column = divmod(index, COLUMNS)
+        image.paste(
+            _tile(attr, status, detail),
+            (PADDING + column * (TILE_WIDTH + TILE_GAP), top + row * (TILE_HEIGHT + TILE_GAP)),
+        )
+
+    y = top + grid_height
+    for line in footer:
+        draw.text(
+            (PADDING, y), _fit_text(line, TEXT_SIZE, WIDTH - PADDING * 2), fill=SUBTLE_COLOR, font=_font(TEXT_SIZE)
+        )
+        y += TEXT_SIZE + 8
+    return _encode(image)
+
+
+def render_list_board(title: str, sections: list[tuple[str, list[str]]], footer: list[str]) -> bytes:
+    """
+    渲染候选角色等列表图
+    Args:
+        title: 标题
+        sections: (小标题, 条目) 列表，条目按多列排布
+        footer: 底部的说明文字，每项一行
+    Returns:
+        bytes: JPEG 图片
+    """
+    columns = 3
+    cell_width = (WIDTH - PADDING * 2) // columns
+    line_height = TEXT_SIZE + 10
+
+    height = PADDING * 2 + TITLE_SIZE + 16 + len(footer) * line_height
+    for _, entries in sections:
+        height += line_height + ((len(entries) + columns - 1) // columns) * line_height + 8
+
+    Image, ImageDraw, _ = _pil()
+    image = Image.new("RGB", (WIDTH, height), BACKGROUND)
+    draw = ImageDraw.Draw(image)
+    draw.text(
+        (PADDING, PADDING), _fit_text(title, TITLE_SIZE, WIDTH - PADDING * 2), fill=TEXT_COLOR, font=_font(TITLE_SIZE)
+    )
+
+    y = PADDING + TITLE_SIZE + 16
+    for heading, entries in sections:
+        draw.text((PADDING, y), heading, fill=SUBTLE_COLOR, font=_font(TEXT_SIZE))
+        y += line_height
+        for index, entry in enumerate(entries):
+            row, column = divmod(index, columns)
+            draw.text(
+                (PADDING + column * cell_width, y + row * line_height),
+                _fit_text(entry, TEXT_SIZE, cell_width - 10),
+                fill=TEXT_COLOR,
+                font=_font(TEXT_SIZE),
+            )
+        y += ((len(entries) + columns - 1) // columns) * line_height + 8
+
+    for line in footer:
+        draw.text(
+            (PADDING, y), _fit_text(line, TEXT_SIZE, WIDTH - PADDING * 2), fill=SUBTLE_COLOR, font=_font(TEXT_SIZE)
+        )
+        y += line_height
+    return _encode(image)
+
+
+def start_render_pool(workers: int, font_path: str = "") -> None:
+    """启动渲染进程池"""
+    global _executor
+    if _executor is None and is_available():
+        _executor = ProcessPoolExecutor(max_workers=max(1, workers), initializer=_init_worker, initargs=(font_path,))
+
+
+def shutdown_render_pool() -> None:
+    """关闭渲染进程池"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def render_in_pool(func, *args) -> bytes:
+    """
+    在进程池中执行渲染函数
+    Args:
+        func: render_guess_board 或 render_list_board
+        args: 渲染参数
+    Returns:
+        bytes: JPEG 图片
+    """
+    if _executor is None:
+        raise RuntimeError("渲染进程池未启动")
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
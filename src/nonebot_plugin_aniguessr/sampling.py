@@ -0,0 +1,125 @@
+"""
+目标角色抽样
+
+使用别名法（Vose's alias method）预先构建抽样表，之后每次抽取只需要一次随机数和两次数组访问。
+抽样表按角色池缓存，开始游戏时不再复制角色名列表。
+
+角色的权重由抽样权重方式决定：
+    uniform     所有角色等概率
+    attrs       与属性数量成正比，属性越多的角色通常越知名
+    sqrt_attrs  与属性数量的平方根成正比，比 attrs 更平缓
+"""
+
+from array import array
+from collections.abc import Callable, Mapping, Sequence
+import math
+import random
+from typing import Generic, Literal, TypeVar
+
+T = TypeVar("T")
+
+Weighting = Literal["uniform", "attrs", "sqrt_attrs"]
+
+WEIGHTINGS: dict[str, Callable[[Sequence[str]], float] | None] = {
+    "uniform": None,
+    "attrs": len,
+    "sqrt_attrs": lambda attrs: math.sqrt(len(attrs)),
+}
+
+_weighting: Weighting = "uniform"
+
+
+def set_target_weighting(weighting: Weighting) -> None:
+    """设置目标角色的抽样权重方式，已缓存的抽样表在下次抽取时重建"""
+    global _weighting
+    if weighting not in WEIGHTINGS:
+        raise ValueError(f"未知的抽样权重 {weighting}，可用: {', '.join(WEIGHTINGS)}")
+    _weighting = weighting
+
+
+def target_weighting() -> Weighting:
+    """当前的抽样权重方式"""
+    return _weighting
+
+
+class AliasSampler(Generic[T]):
+    """
+    别名法加权抽样，构建 O(n)，抽取 O(1)
+
+    没有权重时直接等概率抽取，不构建抽样表。
+    """
+
+    __slots__ = ("alias", "items", "prob")
+
+    def __init__(self, items: Sequence[T], weights: Sequence[float] | None = None):
+        """
+        Args:
+            items: 抽样的元素
+            weights: 各元素的权重，为空表示等概率；权重必须非负且不全为 0
+        """
+        if not items:
+            raise ValueError("没有可抽取的元素")
+        self.items = items
+        self.prob: array | None = None
+        self.alias: array | None = None
+        if weights is None:
+            return
+        n = len(items)
+        if len(weights) != n:
+            raise ValueError("权重数量与元素数量不一致")
+        total = math.fsum(weights)
+        if total <= 0 or any(weight < 0 for weight in weights):
+            raise ValueError("权重必须非负且不全为 0")
+
+        # 缩放到平均值为 1，小于 1 的格子用一个大于 1 的元素补满
+        scaled = [weight * n / total for weight in weights]
+        prob = array("d", bytes(8 * n))
+        alias = array("L", range(n))
+        small = [i for i, value in enumerate(scaled) if value < 1.0]
+        large = [i for i, value in enumerate(scaled) if value >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            prob[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # 剩下的格子只因浮点误差偏离 1
+        for i in (*small, *large):
+            prob[i] = 1.0
+        self.prob = prob
+        self.alias = alias
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def sample(self, rng: random.Random | None = None) -> T:
+        """
+        抽取一个元素
+        Args:
+            rng: 随机数生成器，默认使用全局随机数
+        """
+        n = len(self.items)
+        u = (rng or random).random() * n
+        # 一个随机数同时决定格子和格子内的位置，舍入可能得到 n
+        i = min(int(u), n - 1)
+        if self.prob is None or u - i < self.prob[i]:
+            return self.items[i]
+        return self.items[self.alias[i]]
+
+
+def build_target_sampler(
+    characters: Mapping[str, Sequence[str]], names: Sequence[str], weighting: Weighting | None = None
+) -> AliasSampler[str]:
+    """
+    构建目标角色的抽样表
+    Args:
+        characters: 角色名到属性的映射
+        names: 可作为目标的角色
+        weighting: 抽样权重方式，默认使用当前设置
+    Returns:
+        AliasSampler[str]: 抽样表
+    """
+    weight = WEIGHTINGS[weighting or _weighting]
+    if weight is None:
+        return AliasSampler(names)
+    return AliasSampler(names, [weight(characters[name]) for name in names])
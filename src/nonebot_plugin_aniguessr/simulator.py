@@ -0,0 +1,315 @@
+"""
+自我对弈模拟器
+
+用不同的猜测策略批量进行对局，统计各组参数（最大尝试次数、提示数量、最少属性数）下的胜率、
+猜测次数分布和各目标角色的难度，用于调整游戏参数，同时也是对局核心路径的压力测试。
+
+对局在进程池中并行执行，每个工作进程只在启动时接收一次角色数据库。
+"""
+
+from collections import Counter
+from collections.abc import Callable, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+import itertools
+import random
+import time
+
+from nonebot import logger
+
+from .game_logic import AniGuessrGame
+from .model import CharacterDatabase, CharacterPool, GameSettings
+from .sampling import build_target_sampler
+
+# 贪心策略估计属性分布时最多使用的候选数量，以及最多评估的猜测数量
+GREEDY_SAMPLE = 2000
+GREEDY_GUESSES = 64
+# 候选数量不超过这个值时，最优策略枚举所有候选计算精确的期望剩余候选数，否则退回贪心策略
+OPTIMAL_LIMIT = 100
+
+Strategy = Callable[[AniGuessrGame, list[str], random.Random], str]
+
+
+def _unknown_attrs(game: AniGuessrGame, name: str) -> set[str]:
+    """猜测这个角色能获得信息的属性"""
+    status = game.attr_status
+    return set(game.char2attr.get(name, ())) - status.confirmed - status.excluded
+
+
+def random_strategy(game: AniGuessrGame, candidates: list[str], rng: random.Random) -> str:
+    """从候选角色中随机猜一个"""
+    return rng.choice(candidates)
+
+
+def greedy_strategy(game: AniGuessrGame, candidates: list[str], rng: random.Random) -> str:
+    """猜测最能将候选角色一分为二的角色：各未知属性在候选中的占比越接近一半，得分越高"""
+    if len(candidates) <= 2:
+        return candidates[0]
+    sample = candidates if len(candidates) <= GREEDY_SAMPLE else rng.sample(candidates, GREEDY_SAMPLE)
+    frequency = Counter(attr for name in sample for attr in game.char2attr.get(name, ()))
+    total = len(sample)
+
+    def score(name: str) -> float:
+        return sum(min(frequency[attr], total - frequency[attr]) for attr in _unknown_attrs(game, name))
+
+    guesses = candidates if len(candidates) <= GREEDY_GUESSES else rng.sample(candidates, GREEDY_GUESSES)
+    return max(guesses, key=score)
+
+
+def optimal_strategy(game: AniGuessrGame, candidates: list[str], rng: random.Random) -> str:
+    """
+    单步最优：枚举每个候选作为猜测，按猜测后的反馈将候选分组，选择期望剩余候选数最小的猜测；
+    候选过多时退回贪心策略
+    """
+    if len(candidates) > OPTIMAL_LIMIT:
+        return greedy_strategy(game, candidates, rng)
+    if len(candidates) <= 2:
+        return candidates[0]
+    attrs = {name: set(game.char2attr.get(name, ())) for name in candidates}
+
+    def expected_remaining(guess: str) -> float:
+        # 猜测后得到的信息是猜测角色的每个未知属性目标角色是否具有
+        probe = _unknown_attrs(game, guess)
+        groups = Counter(frozenset(attrs[name] & probe) for name in candidates if name != guess)
+        return sum(size * size for size in groups.values()) / len(candidates)
+
+    return min(candidates, key=expected_remaining)
+
+
+STRATEGIES: dict[str, Strategy] = {
+    "random": random_strategy,
+    "greedy": greedy_strategy,
+    "optimal": optimal_strategy,
+}
+
+
+@dataclass(frozen=True)
+class SimulationConfig:
+    """一组模拟参数"""
+
+    strategy: str = "greedy"
+    max_attempts: int = 10
+    hint_count: int = 3
+    min_attrs: int = 5
+
+    def label(self) -> str:
+        return (
+            f"strategy={self.strategy} max_attempts={self.max_attempts} "
+            f"hints={self.hint_count} min_attrs={self.min_attrs}"
+        )
+
+
+@dataclass
+class SimulationReport:
+    """一组参数的模拟结果，多个进程的结果可以合并"""
+
+    config: SimulationConfig
+    games: int = 0
+    wins: int = 0
+    # 猜中时用的猜测次数分布
+    attempts: Counter = field(default_factory=Counter)
+    # 各目标角色的 [对局数, 猜中数, 猜中时的猜测次数之和]
+    targets: dict[str, list[int]] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    @property
+    def win_rate(self) -> float:
+        return self.wins / self.games if self.games else 0.0
+
+    @property
+    def average_attempts(self) -> float:
+        """猜中时的平均猜测次数"""
+        return sum(count * n for count, n in self.attempts.items()) / self.wins if self.wins else 0.0
+
+    @property
+    def games_per_second(self) -> float:
+        return self.games / self.seconds if self.seconds else 0.0
+
+    def record(self, target: str, won: bool, attempts: int) -> None:
+        """记录一局的结果"""
+        self.games += 1
+        stats = self.targets.setdefault(target, [0, 0, 0])
+        stats[0] += 1
+        if won:
+            self.wins += 1
+            self.attempts[attempts] += 1
+            stats[1] += 1
+            stats[2] += attempts
+
+    def merge(self, other: "SimulationReport") -> None:
+        """合并另一部分对局的结果"""
+        self.games += other.games
+        self.wins += other.wins
+        self.attempts.update(other.attempts)
+        for target, (games, wins, attempts) in other.targets.items():
+            stats = self.targets.setdefault(target, [0, 0, 0])
+            stats[0] += games
+            stats[1] += wins
+            stats[2] += attempts
+
+    def hardest(self, count: int = 10, min_games: int = 2) -> list[tuple[str, float, int]]:
+        """
+        胜率最低的目标角色
+        Args:
+            count: 返回数量
+            min_games: 至少进行过多少局才参与排名
+        Returns:
+            list[tuple[str, float, int]]: (角色名, 胜率, 对局数)
+        """
+        ranked = [(name, wins / games, games) for name, (games, wins, _) in self.targets.items() if games >= min_games]
+        return sorted(ranked, key=lambda item: (item[1], -item[2], item[0]))[:count]
+
+    def summary(self) -> str:
+        """结果摘要"""
+        distribution = "，".join(f"{count} 次: {n}" for count, n in sorted(self.attempts.items()))
+        return (
+            f"[{self.config.label()}]\n"
+            f"对局 {self.games}，胜率 {self.win_rate:.1%}，猜中平均 {self.average_attempts:.2f} 次，"
+            f"{self.games_per_second:.0f} 局/秒\n"
+            f"猜测次数分布: {distribution or '无'}"
+        )
+
+
+def play_game(pool: CharacterPool, config: SimulationConfig, target: str, rng: random.Random) -> tuple[bool, int]:
+    """
+    按策略进行一局游戏
+    Returns:
+        tuple[bool, int]: (是否猜中, 猜测次数)
+    """
+    strategy = STRATEGIES[config.strategy]
+    settings = GameSettings(max_attempts=config.max_attempts, hint_count=config.hint_count, min_attrs=config.min_attrs)
+    game = AniGuessrGame(pool, settings=settings, target=target, rng=rng)
+    game.get_random_attrs()
+    names = pool.names
+
+    while not game.is_max_attempts_reached():
+        candidates = game.get_candidate_characters()
+        if candidates:
+            guess = strategy(game, candidates, rng)
+        elif len(game.guessed_characters) < len(names):
+            # 没有提示时没有候选，随机猜一个没猜过的角色
+            guess = rng.choice(names)
+            while guess in game.guessed_characters:
+                guess = rng.choice(names)
+        else:
+            break
+        if game.guess(guess).is_correct:
+            return True, game.attempts
+    return False, game.attempts
+
+
+def game_pool(core: CharacterDatabase, min_attrs: int) -> CharacterPool:
+    """属性数量不少于 min_attrs 的角色组成的角色池"""
+    names = [name for name, attrs in core.characters.items() if len(attrs) >= min_attrs]
+    return CharacterPool(core, names, f"min_attrs={min_attrs}")
+
+
+def run_batch(pool: CharacterPool, config: SimulationConfig, targets: list[str], seed: int) -> SimulationReport:
+    """在当前进程中依次进行一批对局"""
+    rng = random.Random(seed)
+    report = SimulationReport(config)
+    start = time.perf_counter()
+    for target in targets:
+        won, attempts = play_game(pool, config, target, rng)
+        report.record(target, won, attempts)
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+# 工作进程中的角色数据库，进程启动时设置一次，角色池按最少属性数缓存
+_worker_db: CharacterDatabase | None = None
+_worker_pools: dict[int, CharacterPool] = {}
+
+
+def _init_worker(core: CharacterDatabase) -> None:
+    global _worker_db
+    _worker_db = core
+    # 每局的日志在模拟中没有意义，只会拖慢速度
+    logger.disable("nonebot_plugin_aniguessr")
+
+
+def _run_worker_batch(config: SimulationConfig, targets: list[str], seed: int) -> SimulationReport:
+    pool = _worker_pools.get(config.min_attrs)
+    if pool is None:
+        pool = _worker_pools[config.min_attrs] = game_pool(_worker_db, config.min_attrs)
+    return run_batch(pool, config, targets, seed)
+
+
+def simulate(
+    core: CharacterDatabase,
+    configs: Iterable[SimulationConfig],
+    games: int = 1000,
+    workers: int = 0,
+    seed: int = 0,
+    batch_size: int = 100,
+) -> list[SimulationReport]:
+    """
+    对每组参数进行模拟，同一组参数的所有策略使用相同的目标角色序列
+    Args:
+        core: 角色数据库
+        configs: 模拟参数
+        games: 每组参数的对局数
+        workers: 工作进程数，0 表示在当前进程中执行
+        seed: 随机种子，相同的种子得到相同的结果
+        batch_size: 每个任务的对局数
+    Returns:
+        list[SimulationReport]: 各组参数的结果，seconds 为整组对局的实际用时
+    """
+    configs = list(configs)
+    for config in configs:
+        if config.strategy not in STRATEGIES:
+            raise ValueError(f"未知的策略 {config.strategy}，可用策略: {', '.join(STRATEGIES)}")
+
+    # 目标角色在主进程中抽取，与工作进程数无关
+    tasks: list[tuple[SimulationConfig, list[str], int]] = []
+    pools: dict[int, CharacterPool] = {}
+    for config in configs:
+        if config.min_attrs not in pools:
+            pools[config.min_attrs] = game_pool(core, config.min_attrs)
+        names = pools[config.min_attrs].names
+        if not names:
+            raise ValueError(f"没有属性数量不少于 {config.min_attrs} 的角色")
+        # 目标角色按当前的抽样权重抽取，与游戏中一致
+        rng = random.Random(f"{seed}:{config.min_attrs}")
+        sampler = build_target_sampler(core.characters, names)
+        targets = [sampler.sample(rng) for _ in range(games)]
+        for index, start in enumerate(range(0, games, batch_size)):
+            tasks.append((config, targets[start : start + batch_size], seed * 1_000_003 + index))
+
+    reports = {config: SimulationReport(config) for config in configs}
+    spent = Counter()
+    if workers <= 0:
+        logger.disable("nonebot_plugin_aniguessr")
+        try:
+            results = [run_batch(pools[task[0].min_attrs], *task) for task in tasks]
+        finally:
+            logger.enable("nonebot_plugin_aniguessr")
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(core,)) as executor:
+            futures = [executor.submit(_run_worker_batch, *task) for task in tasks]
+            start = time.perf_counter()
+            results = [future.result() for future in futures]
+            elapsed = time.perf_counter() - start
+    for result in results:
+        reports[result.config].merge(result)
+        spent[result.config] += result.seconds
+
+    if workers > 0:
+        # 并行时按各组参数占用的计算时间分摊实际用时
+        total = sum(spent.values()) or 1.0
+        for config, report in reports.items():
+            report.seconds = elapsed * spent[config] / total
+    else:
+        for config, report in reports.items():
+            report.seconds = spent[config]
+    return [reports[config] for config in configs]
+
+
+def config_grid(
+    strategies: Iterable[str], max_attempts: Iterable[int], hint_counts: Iterable[int], min_attrs: Iterable[int]
+) -> list[SimulationConfig]:
+    """各参数取值的所有组合"""
+    return [
+        SimulationConfig(strategy=strategy, max_attempts=attempts, hint_count=hints, min_attrs=attrs)
+        for attrs, hints, attempts, strategy in itertools.product(min_attrs, hint_counts, max_attempts, strategies)
+    ]
@@ -0,0 +1,388 @@
+"""
+玩家战绩统计
+
+对局结果先放入内存缓冲区，由后台任务批量写入 SQLite（write-behind），不在消息处理中等待磁盘。
+排行榜使用的汇总表在写入时增量维护，查询排行时不扫描历史记录。
+每日挑战的成绩另外保存，重启后恢复当天的排行榜和已参加的玩家。
+"""
+
+import asyncio
+from dataclasses import dataclass
+from pathlib import Path
+import sqlite3
+import time
+
+from nonebot import logger
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS game_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id TEXT NOT NULL,
+    group_id TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    won INTEGER NOT NULL,
+    attempts INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    target TEXT NOT NULL,
+    ended_at REAL NOT NULL,
+    seed INTEGER
+);
+CREATE TABLE IF NOT EXISTS player_stats (
+    group_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    user_name TEXT NOT NULL,
+    games INTEGER NOT NULL,
+    wins INTEGER NOT NULL,
+    win_attempts INTEGER NOT NULL,
+    streak INTEGER NOT NULL,
+    best_streak INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (group_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_player_stats_rank ON player_stats (group_id, wins DESC, win_attempts ASC);
+CREATE TABLE IF NOT EXISTS daily_results (
+    day TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    user_name TEXT NOT NULL,
+    won INTEGER NOT NULL,
+    attempts INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (day, user_id)
+);
+"""
+
+# 每局结果同时计入所在群组和全局（group_id 为空字符串）两行汇总
+UPSERT_PLAYER_STATS = """
+INSERT INTO player_stats (group_id, user_id, user_name, games, wins, win_attempts, streak, best_streak, updated_at)
+VALUES (:group_id, :user_id, :user_name, 1, :won, :win_attempts, :won, :won, :ended_at)
+ON CONFLICT (group_id, user_id) DO UPDATE SET
+    user_name = excluded.user_name,
+    games = games + 1,
+    wins = wins + excluded.wins,
+    win_attempts = win_attempts + excluded.win_attempts,
+    streak = CASE WHEN excluded.wins THEN streak + 1 ELSE 0 END,
+    best_streak = MAX(best_streak, CASE WHEN excluded.wins THEN streak + 1 ELSE 0 END),
+    updated_at = excluded.updated_at
+"""
+
+INSERT_GAME_RESULT = """
+INSERT INTO game_results (user_id, group_id, mode, won, attempts, seconds, target, ended_at, seed)
+VALUES (:user_id, :group_id, :mode, :won, :attempts, :seconds, :target, :ended_at, :seed)
+"""
+
+# 每人每天只记录第一次每日挑战
+INSERT_DAILY_RESULT = """
+INSERT OR IGNORE INTO daily_results (day, user_id, user_name, won, attempts, seconds)
+VALUES (:daily, :user_id, :user_name, :won, :attempts, :seconds)
+"""
+
+GLOBAL_SCOPE = ""
+
+
+@dataclass(frozen=True, slots=True)
+class GameResult:
+    """一局游戏的结果"""
+
+    user_id: str
+    user_name: str
+    group_id: str | None
+    mode: str
+    won: bool
+    attempts: int
+    seconds: float
+    target: str
+    ended_at: float
+    # 对局种子，可以复现目标和提示
+    seed: int | None = None
+    # 每日挑战的日期（ISO 格式），其他模式为 None
+    daily: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class DailyResult:
+    """保存的每日挑战成绩"""
+
+    user_id: str
+    user_name: str
+    won: bool
+    attempts: int
+    seconds: float
+
+
+@dataclass(frozen=True, slots=True)
+class PlayerStats:
+    """玩家战绩"""
+
+    user_id: str
+    user_name: str
+    games: int
+    wins: int
+    win_attempts: int
+    streak: int
+    best_streak: int
+
+    @property
+    def win_rate(self) -> float:
+        """胜率"""
+        return self.wins / self.games if self.games else 0.0
+
+    @property
+    def average_attempts(self) -> float:
+        """猜对时的平均尝试次数"""
+        return self.win_attempts / self.wins if self.wins else 0.0
+
+
+class StatsStore:
+    """战绩存储，写入经由后台批量写入任务"""
+
+    def __init__(self, path: Path, batch_size: int = 64, flush_interval: float = 5.0):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._conn: sqlite3.Connection | None = None
+        self._buffer: list[GameResult] = []
+        self._wakeup = asyncio.Event()
+        # 同一时间只有一个线程使用数据库连接
+        self._lock = asyncio.Lock()
+        self._writer: asyncio.Task | None = None
+        self._closing = False
+
+    def open(self) -> None:
+        """打开数据库并启动后台写入任务"""
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        # 旧版本创建的表没有 seed 列
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(game_results)")}
+        if "seed" not in columns:
+            self._conn.execute("ALTER TABLE game_results ADD COLUMN seed INTEGER")
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def close(self) -> None:
+        """通知后台写入任务写完剩余数据后退出，然后关闭数据库"""
+        if self._writer is not None:
+            self._closing = True
+            self._wakeup.set()
+            await self._writer
+            self._writer = None
+        # 后台任务异常退出时也写入剩余数据
+        try:
+            await self.flush()
+        finally:
+            async with self._lock:
+                if self._conn is not None:
+                    self._conn.close()
+                    self._conn = None
+
+    def record(self, result: GameResult) -> None:
+        """记录一局结果，只放入缓冲区，不等待写入"""
+        self._buffer.append(result)
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        """立即写入缓冲区中的全部结果，写入失败时放回缓冲区，下次写入时重试"""
+        async with self._lock:
+            batch, self._buffer = self._buffer, []
+            if not batch:
+                return
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except Exception:
+                # 事务已回滚，没有写入任何结果；放在写入期间记录的结果之前，保持顺序
+                self._buffer[:0] = batch
+                raise
+
+    async def _write_loop(self) -> None:
+        """缓冲区达到批大小或距上次写入超过间隔时批量写入，关闭时写完当前批次后退出"""
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"写入战绩失败: {e}")
+
+    def _write_batch(self, batch: list[GameResult]) -> None:
+        """在一个事务中写入一批结果并增量更新汇总表"""
+        if self._conn is None:
+            return
+        rows = []
+        stats_rows = []
+        daily_rows = []
+        for result in batch:
+            row = {
+                "user_id": result.user_id,
+                "user_name": result.user_name,
+                "group_id": result.group_id or GLOBAL_SCOPE,
+                "mode": result.mode,
+                "won": int(result.won),
+                "win_attempts": result.attempts if result.won else 0,
+                "attempts": result.attempts,
+                "seconds": result.seconds,
+                "target": result.target,
+                "ended_at": result.ended_at,
+                "seed": result.seed,
+            }
+            rows.append(row)
+            stats_rows.append({**row, "group_id": GLOBAL_SCOPE})
+            if result.group_id:
+                stats_rows.append(row)
+            if result.daily:
+                daily_rows.append({**row, "daily": result.daily})
+        with self._conn:
+            self._conn.executemany(INSERT_GAME_RESULT, rows)
+            self._conn.executemany(UPSERT_PLAYER_STATS, stats_rows)
+            self._conn.executemany(INSERT_DAILY_RESULT, daily_rows)
+        logger.debug(f"已写入 {len(batch)} 条战绩")
+
+    def _pending(self, group_id: str) -> dict[str, list[GameResult]]:
+        """缓冲区中还没有写入的、属于该范围的结果，按玩家分组"""
+        pending: dict[str, list[GameResult]] = {}
+        for result in self._buffer:
+            if group_id == GLOBAL_SCOPE or result.group_id == group_id:
+                pending.setdefault(result.user_id, []).append(result)
+        return pending
+
+    def _query_top(self, group_id: str, limit: int, pending: dict[str, list[GameResult]]) -> list[PlayerStats]:
+        if self._conn is None:
+            return []
+        cursor = self._conn.execute(
+            "SELECT user_id, user_name, games, wins, win_attempts, streak, best_streak FROM player_stats "
+            "WHERE group_id = ? AND wins > 0 ORDER BY wins DESC, win_attempts ASC LIMIT ?",
+            (group_id, limit),
+        )
+        players = {row[0]: PlayerStats(*row) for row in cursor.fetchall()}
+        if not pending:
+            return list(players.values())
+        # 只有缓冲区中有结果的玩家排名会变化，合并后重新排序
+        for user_id, results in pending.items():
+            stored = players.get(user_id) or self._query_player(group_id, user_id, {})
+            players[user_id] = merge_results(stored, results)
+        ranked = sorted(
+            (player for player in players.values() if player.wins > 0),
+            key=lambda player: (-player.wins, player.win_attempts),
+        )
+        return ranked[:limit]
+
+    def _query_player(self, group_id: str, user_id: str, pending: dict[str, list[GameResult]]) -> PlayerStats | None:
+        if self._conn is None:
+            return None
+        row = self._conn.execute(
+            "SELECT user_id, user_name, games, wins, win_attempts, streak, best_streak FROM player_stats "
+            "WHERE group_id = ? AND user_id = ?",
+            (group_id, user_id),
+        ).fetchone()
+        stored = PlayerStats(*row) if row else None
+        if user_id in pending:
+            return merge_results(stored, pending[user_id])
+        return stored
+
+    async def top(self, group_id: str | None = None, limit: int = 10) -> list[PlayerStats]:
+        """
+        排行榜，读取增量维护的汇总表并合并缓冲区中还没有写入的结果，不等待写入
+        Args:
+            group_id: 群组ID，为空时返回全局排行
+            limit: 返回数量
+        Returns:
+            list[PlayerStats]: 按胜场数排序的玩家战绩
+        """
+        scope = group_id or GLOBAL_SCOPE
+        async with self._lock:
+            # 持有锁时没有正在写入的批次，缓冲区中的结果都不在数据库中
+            pending = self._pending(scope)
+            return await asyncio.to_thread(self._query_top, scope, limit, pending)
+
+    async def player(self, user_id: str, group_id: str | None = None) -> PlayerStats | None:
+        """获取玩家战绩，包含缓冲区中还没有写入的结果"""
+        scope = group_id or GLOBAL_SCOPE
+        async with self._lock:
+            pending = self._pending(scope)
+            return await asyncio.to_thread(self._query_player, scope, user_id, pending)
+
+    def _query_daily(self, day: str) -> list[DailyResult]:
+        if self._conn is None:
+            return []
+        cursor = self._conn.execute(
+            "SELECT user_id, user_name, won, attempts, seconds FROM daily_results WHERE day = ? ORDER BY rowid", (day,)
+        )
+        return [
+            DailyResult(user_id, user_name, bool(won), attempts, seconds)
+            for user_id, user_name, won, attempts, seconds in cursor
+        ]
+
+    async def daily_results(self, day: str) -> list[DailyResult]:
+        """
+        某一天的每日挑战成绩，包含缓冲区中还没有写入的结果，用于重启后恢复排行榜
+        Args:
+            day: 每日挑战的日期（ISO 格式）
+        Returns:
+            list[DailyResult]: 按记录顺序排列的成绩，每人只有第一次
+        """
+        async with self._lock:
+            pending = [result for result in self._buffer if result.daily == day]
+            stored = await asyncio.to_thread(self._query_daily, day)
+        seen = {result.user_id for result in stored}
+        for result in pending:
+            if result.user_id not in seen:
+                seen.add(result.user_id)
+                stored.append(
+                    DailyResult(result.user_id, result.user_name, result.won, result.attempts, result.seconds)
+                )
+        return stored
+
+
+def merge_results(stats: PlayerStats | None, results: list[GameResult]) -> PlayerStats:
+    """
+    在汇总上依次累加对局结果，与写入时的 UPSERT_PLAYER_STATS 相同
+    Args:
+        stats: 数据库中的汇总，没有记录时为 None
+        results: 按结束顺序排列的同一玩家的结果
+    Returns:
+        PlayerStats: 累加后的汇总
+    """
+    games, wins, win_attempts, streak, best_streak = (
+        (stats.games, stats.wins, stats.win_attempts, stats.streak, stats.best_streak) if stats else (0, 0, 0, 0, 0)
+    )
+    for result in results:
+        games += 1
+        if result.won:
+            wins += 1
+            win_attempts += result.attempts
+            streak += 1
+            best_streak = max(best_streak, streak)
+        else:
+            streak = 0
+    return PlayerStats(results[-1].user_id, results[-1].user_name, games, wins, win_attempts, streak, best_streak)
+
+
+def make_result(
+    user_id: str,
+    user_name: str,
+    group_id: str | None,
+    mode: str,
+    won: bool,
+    attempts: int,
+    seconds: float,
+    target: str,
+    seed: int | None = None,
+    daily: str | None = None,
+) -> GameResult:
+    """创建对局结果，结束时间取当前时间"""
+    return GameResult(
+        user_id=user_id,
+        user_name=user_name,
+        group_id=group_id,
+        mode=mode,
+        won=won,
+        attempts=attempts,
+        seconds=seconds,
+        target=target,
+        ended_at=time.time(),
+        seed=seed,
+        daily=daily,
+    )
@@ -0,0 +1,57 @@
+"""
+标签模式
+
+使用 Bangumi 的角色标签（filtered_id_tags_mapping.json 或 id_tags_mapping.json）代替萌娘百科属性猜角色。
+标签数据按 bgm2moegirl.json 转为「角色名 -> 标签」后，构建与角色模式相同的 CharacterDatabase
+（整数 ID 的 CSR 存储、标签倒排列表、候选筛选），对局、猜测和候选角色的逻辑全部复用。
+"""
+
+from collections.abc import Mapping, Sequence
+from typing import Literal
+
+from .model import Bgm2Moegirl, CharacterDatabase, CharacterPool
+
+TagSource = Literal["filtered", "full"]
+
+# 标签来源对应的数据文件
+TAG_FILES: dict[str, str] = {
+    "filtered": "filtered_id_tags_mapping.json",
+    "full": "id_tags_mapping.json",
+}
+
+
+def tag_char_data(id_tags: Mapping[str, Sequence[str]], bgm2moegirl: Bgm2Moegirl) -> dict[str, list[str]]:
+    """
+    将 Bangumi 角色 ID 到标签的映射转为角色名到标签的映射
+    Args:
+        id_tags: Bangumi 角色 ID 到标签
+        bgm2moegirl: Bangumi 角色 ID 到萌娘百科角色名，第一个名称作为角色名
+    Returns:
+        dict[str, list[str]]: 角色名到标签，没有角色名或没有标签的角色被跳过，重名时保留先出现的角色
+    """
+    char_data: dict[str, list[str]] = {}
+    for bgm_id, tags in id_tags.items():
+        names = bgm2moegirl.get(str(bgm_id))
+        if not names or not tags or names[0] in char_data:
+            continue
+        # 去掉重复的标签，保持原有顺序
+        char_data[names[0]] = list(dict.fromkeys(tags))
+    return char_data
+
+
+def build_tag_database(id_tags: Mapping[str, Sequence[str]], bgm2moegirl: Bgm2Moegirl) -> CharacterDatabase:
+    """构建标签模式的角色数据库"""
+    return CharacterDatabase(char_data=tag_char_data(id_tags, bgm2moegirl))
+
+
+def build_tag_pool(db: CharacterDatabase, min_tags: int) -> CharacterPool:
+    """
+    标签模式的目标角色池
+    Args:
+        db: 标签模式的角色数据库
+        min_tags: 作为目标的角色最少需要的标签数量
+    Returns:
+        CharacterPool: 角色池，猜测时仍可以使用所有有标签的角色
+    """
+    names = [name for name, tags in db.characters.items() if len(tags) >= min_tags]
+    return CharacterPool(db, names, "tag")
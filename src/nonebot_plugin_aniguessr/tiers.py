@@ -0,0 +1,109 @@
+from collections.abc import Iterable
+
+from .delta import CharacterDelta
+from .model import CharacterDatabase, CharacterPool
+
+# 难度名称
+TIER_NAMES: dict[str, str] = {
+    "easy": "简单",
+    "normal": "普通",
+    "hard": "困难",
+}
+DEFAULT_TIER = "normal"
+
+
+def build_tier_pools(core: CharacterDatabase, min_attrs: int, easy_min_attrs: int) -> dict[str, CharacterPool]:
+    """
+    按属性数量划分难度，每个难度是核心数据库的一个角色子集视图
+    Args:
+        core: 核心角色数据库
+        min_attrs: 普通难度的最少属性数量
+        easy_min_attrs: 简单难度的最少属性数量，属性越多的角色通常越知名、线索也越多
+    Returns:
+        dict[str, CharacterPool]: 难度到角色池的映射
+    """
+    tiers: dict[str, list[str]] = {"normal": [], "easy": [], "hard": []}
+    _classify(core, core.characters, tiers, min_attrs, easy_min_attrs)
+    return _make_pools(core, tiers)
+
+
+def patch_tier_pools(
+    pools: dict[str, CharacterPool],
+    core: CharacterDatabase,
+    delta: CharacterDelta,
+    min_attrs: int,
+    easy_min_attrs: int,
+) -> dict[str, CharacterPool]:
+    """
+    数据增量更新后重新划分难度，只重新计算受影响角色所属的难度
+    Args:
+        pools: 原有的角色池
+        core: 已应用增量更新的核心数据库
+        delta: 增量更新的差异
+        min_attrs: 普通难度的最少属性数量
+        easy_min_attrs: 简单难度的最少属性数量
+    Returns:
+        dict[str, CharacterPool]: 新的角色池，原有的角色池不变，进行中的对局继续使用
+    """
+    touched = delta.touched()
+    tiers: dict[str, list[str]] = {}
+    for tier, pool in pools.items():
+        # 退回普通难度的角色池本身没有角色
+        own = tier == "normal" or pool is not pools["normal"]
+        tiers[tier] = [name for name in pool.names if name not in touched] if own else []
+    _classify(core, (name for name in touched if name in core.characters), tiers, min_attrs, easy_min_attrs)
+    return _make_pools(core, tiers)
+
+
+def extend_tier_pools(
+    pools: dict[str, CharacterPool], names: Iterable[str], min_attrs: int, easy_min_attrs: int
+) -> dict[str, CharacterPool]:
+    """
+    在各难度的角色池中加入额外的角色（如角色包中的角色）
+    Args:
+        pools: 原有的角色池
+        names: 额外的角色名，需要已在核心数据库中，已在角色池中的角色会被跳过
+        min_attrs: 普通难度的最少属性数量
+        easy_min_attrs: 简单难度的最少属性数量
+    Returns:
+        dict[str, CharacterPool]: 新的角色池，原有的角色池不变
+    """
+    core = pools["normal"].core
+    existing = set(pools["normal"].names)
+    extra: dict[str, list[str]] = {"normal": [], "easy": [], "hard": []}
+    _classify(
+        core,
+        (name for name in names if name not in existing and name in core.characters),
+        extra,
+        min_attrs,
+        easy_min_attrs,
+    )
+    tiers: dict[str, list[str]] = {}
+    for tier, pool in pools.items():
+        own = tier == "normal" or pool is not pools["normal"]
+        tiers[tier] = [*(pool.names if own else ()), *extra[tier]]
+    return _make_pools(core, tiers)
+
+
+def _classify(
+    core: CharacterDatabase, names: Iterable[str], tiers: dict[str, list[str]], min_attrs: int, easy_min_attrs: int
+) -> None:
+    """按属性数量将角色加入对应难度，其他角色具有其全部属性（区分度为 0）的角色不作为简单难度的目标"""
+    characters = core.characters
+    for name in names:
+        count = len(characters[name])
+        if count < min_attrs:
+            continue
+        tiers["normal"].append(name)
+        # 这些角色只能靠排除属性与相似角色区分，未计算区分度时只按属性数量划分
+        easy = count >= easy_min_attrs and core.distinguish_score(name) != 0
+        tiers["easy" if easy else "hard"].append(name)
+
+
+def _make_pools(core: CharacterDatabase, tiers: dict[str, list[str]]) -> dict[str, CharacterPool]:
+    normal, easy, hard = tiers["normal"], tiers["easy"], tiers["hard"]
+    pools = {"normal": CharacterPool(core, normal, "normal")}
+    # 某个难度没有角色时退回普通难度
+    pools["easy"] = CharacterPool(core, easy, "easy") if easy else pools["normal"]
+    pools["hard"] = CharacterPool(core, hard, "hard") if hard else pools["normal"]
+    return pools
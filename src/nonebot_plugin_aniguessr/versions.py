@@ -0,0 +1,282 @@
+"""
+数据集版本管理
+
+每次下载的数据保存在以内容哈希命名的版本目录中，下载新数据不会覆盖旧数据：
+
+    versions/<版本号>/
+        char2attr.json 等      原始数据文件，可以是 gzip 或 zstd 压缩的形式
+        index.pickle           编译好的角色数据库，启动和切换版本时直接加载
+        manifest.json          文件哈希、大小和编译索引的信息
+    versions/CURRENT           当前使用的版本号
+
+切换或回滚版本只需要修改 CURRENT 并加载对应的编译索引，不需要重新下载或解析 JSON。
+这里的函数都是同步的文件操作，异步代码中应通过 asyncio.to_thread 调用。
+"""
+
+import hashlib
+import os
+from pathlib import Path
+import pickle
+import shutil
+import tempfile
+import time
+
+from nonebot import logger
+from pydantic import BaseModel
+
+from .compression import find_file
+from .model import CharacterDatabase
+
+# 一个数据集版本包含的数据文件（未压缩时的文件名）
+DATA_FILES = ("char2attr.json", "bgm2moegirl.json", "id_tags_mapping.json", "filtered_id_tags_mapping.json")
+MANIFEST_FILE = "manifest.json"
+INDEX_FILE = "index.pickle"
+POINTER_FILE = "CURRENT"
+STAGING_PREFIX = ".staging-"
+STAGING_TTL = 3600
+# 编译索引的格式版本，CharacterDatabase 的结构变化时递增，旧格式的索引会被重新编译
+INDEX_FORMAT = 4
+
+
+class FileEntry(BaseModel):
+    """文件哈希和大小"""
+
+    sha256: str
+    size: int
+
+
+class VersionManifest(BaseModel):
+    """数据集版本清单，files 的键是实际保存的文件名"""
+
+    version: str
+    created_at: float
+    files: dict[str, FileEntry]
+    index: FileEntry | None = None
+    index_format: int = 0
+    characters: int = 0
+
+
+def file_entry(path: Path) -> FileEntry:
+    """分块计算文件的 sha256"""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return FileEntry(sha256=digest.hexdigest(), size=path.stat().st_size)
+
+
+def dataset_files(directory: Path) -> dict[str, Path] | None:
+    """
+    查找目录中的全部数据文件
+    Args:
+        directory: 数据目录
+    Returns:
+        dict[str, Path] | None: 未压缩的文件名到实际文件的映射，文件不完整时返回 None
+    """
+    files = {name: find_file(directory, name) for name in DATA_FILES}
+    if any(path is None for path in files.values()):
+        return None
+    return files
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    """先写临时文件再替换，写入过程中断不会留下半个文件"""
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+class VersionStore:
+    """数据集版本存储"""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path(self, version: str) -> Path:
+        """版本目录"""
+        return self.root / version
+
+    def staging_dir(self) -> Path:
+        """新建一个暂存目录，下载完成后通过 commit 转为版本目录"""
+        return Path(tempfile.mkdtemp(prefix=STAGING_PREFIX, dir=self.root))
+
+    def commit(self, staging: Path) -> VersionManifest:
+        """
+        将暂存目录中的数据文件保存为一个版本
+        Args:
+            staging: 包含全部数据文件的暂存目录
+        Returns:
+            VersionManifest: 版本清单，内容相同的数据已存在时返回已有的版本
+        """
+        paths = dataset_files(staging)
+        if paths is None:
+            raise ValueError("数据文件不完整")
+        files = {path.name: file_entry(path) for path in paths.values()}
+        digest = hashlib.sha256("".join(f"{name}:{entry.sha256}\n" for name, entry in files.items()).encode())
+        version = digest.hexdigest()[:16]
+
+        target = self.path(version)
+        if (target / MANIFEST_FILE).exists():
+            shutil.rmtree(staging, ignore_errors=True)
+            logger.info(f"数据与已有版本 {version} 相同")
+            return self.manifest(version)
+
+        manifest = VersionManifest(version=version, created_at=time.time(), files=files)
+        _write_atomic(staging / MANIFEST_FILE, manifest.model_dump_json(indent=2).encode())
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(staging, target)
+        logger.info(f"已保存数据版本 {version}")
+        return manifest
+
+    def import_files(self, source: Path) -> VersionManifest | None:
+        """
+        将目录中已有的数据文件保存为一个版本，用于迁移旧版插件直接放在数据目录中的文件
+        Args:
+            source: 数据文件所在目录
+        Returns:
+            VersionManifest | None: 版本清单，文件不完整时返回 None
+        """
+        paths = dataset_files(source)
+        if paths is None:
+            return None
+        staging = self.staging_dir()
+        for path in paths.values():
+            shutil.copyfile(path, staging / path.name)
+        return self.commit(staging)
+
+    def manifest(self, version: str) -> VersionManifest:
+        """读取版本清单"""
+        return VersionManifest.model_validate_json((self.path(version) / MANIFEST_FILE).read_bytes())
+
+    def versions(self) -> list[VersionManifest]:
+        """全部版本，按创建时间从新到旧排序"""
+        manifests = []
+        for manifest_path in self.root.glob(f"*/{MANIFEST_FILE}"):
+            try:
+                manifests.append(VersionManifest.model_validate_json(manifest_path.read_bytes()))
+            except Exception as e:
+                logger.warning(f"读取版本清单 {manifest_path} 失败: {e}")
+        return sorted(manifests, key=lambda manifest: manifest.created_at, reverse=True)
+
+    def current(self) -> str | None:
+        """当前使用的版本号"""
+        pointer = self.root / POINTER_FILE
+        if not pointer.exists():
+            return None
+        version = pointer.read_text(encoding="utf-8").strip()
+        return version if version and (self.path(version) / MANIFEST_FILE).exists() else None
+
+    def resolve(self, prefix: str) -> str:
+        """
+        根据版本号前缀查找版本
+        Args:
+            prefix: 版本号或其前缀
+        Returns:
+            str: 完整的版本号
+        Raises:
+            ValueError: 没有匹配或匹配到多个版本
+        """
+        matches = [manifest.version for manifest in self.versions() if manifest.version.startswith(prefix)]
+        if len(matches) != 1:
+            raise ValueError(f"版本 {prefix} 不存在" if not matches else f"版本 {prefix} 不唯一")
+        return matches[0]
+
+    def activate(self, version: str) -> None:
+        """切换当前版本"""
+        if not (self.path(version) / MANIFEST_FILE).exists():
+            raise ValueError(f"版本 {version} 不存在")
+        _write_atomic(self.root / POINTER_FILE, version.encode())
+        logger.info(f"当前数据版本: {version}")
+
+    def previous(self) -> str | None:
+        """比当前版本更早的最新版本，用于回滚"""
+        current = self.current()
+        if current is None:
+            return None
+        created_at = self.manifest(current).created_at
+        older = [manifest.version for manifest in self.versions() if manifest.created_at < created_at]
+        return older[0] if older else None
+
+    def save_index(self, version: str, character_db: CharacterDatabase) -> None:
+        """保存编译好的角色数据库，并记录到版本清单中"""
+        directory = self.path(version)
+        _write_atomic(directory / INDEX_FILE, pickle.dumps(character_db, protocol=pickle.HIGHEST_PROTOCOL))
+        manifest = self.manifest(version)
+        manifest.index = file_entry(directory / INDEX_FILE)
+        manifest.index_format = INDEX_FORMAT
+        manifest.characters = len(character_db.characters)
+        _write_atomic(directory / MANIFEST_FILE, manifest.model_dump_json(indent=2).encode())
+
+    def load_index(self, version: str) -> CharacterDatabase | None:
+        """
+        加载编译好的角色数据库
+        Args:
+            version: 版本号
+        Returns:
+            CharacterDatabase | None: 没有索引、格式过旧或校验失败时返回 None
+        """
+        manifest = self.manifest(version)
+        if manifest.index is None or manifest.index_format != INDEX_FORMAT:
+            return None
+        index_path = self.path(version) / INDEX_FILE
+        try:
+            data = index_path.read_bytes()
+        except OSError:
+            return None
+        if len(data) != manifest.index.size or hashlib.sha256(data).hexdigest() != manifest.index.sha256:
+            logger.warning(f"数据版本 {version} 的编译索引校验失败，将重新编译")
+            return None
+        return pickle.loads(data)
+
+    def verify(self, version: str) -> list[str]:
+        """
+        按版本清单校验数据文件和编译索引的哈希
+        Args:
+            version: 版本号
+        Returns:
+            list[str]: 发现的问题，为空表示校验通过
+        """
+        manifest = self.manifest(version)
+        directory = self.path(version)
+        entries = dict(manifest.files)
+        if manifest.index is not None:
+            entries[INDEX_FILE] = manifest.index
+
+        problems = []
+        for name, expected in entries.items():
+            path = directory / name
+            if not path.is_file():
+                problems.append(f"{name} 不存在")
+                continue
+            actual = file_entry(path)
+            if actual.size != expected.size:
+                problems.append(f"{name} 大小不符：{actual.size} != {expected.size}")
+            elif actual.sha256 != expected.sha256:
+                problems.append(f"{name} 哈希不符")
+        if manifest.index is not None and manifest.index_format != INDEX_FORMAT:
+            problems.append(f"{INDEX_FILE} 格式过旧（{manifest.index_format}），加载时会重新编译")
+        return problems
+
+    def prune(self, keep: int) -> list[str]:
+        """
+        删除旧版本，当前版本总是保留
+        Args:
+            keep: 保留的最新版本数量
+        Returns:
+            list[str]: 被删除的版本号
+        """
+        current = self.current()
+        removed = []
+        for manifest in self.versions()[max(keep, 1) :]:
+            if manifest.version == current:
+                continue
+            shutil.rmtree(self.path(manifest.version), ignore_errors=True)
+            removed.append(manifest.version)
+        # 清理中断的下载留下的暂存目录，最近创建的可能仍在使用
+        for staging in self.root.glob(f"{STAGING_PREFIX}*"):
+            if time.time() - staging.stat().st_mtime > STAGING_TTL:
+                shutil.rmtree(staging, ignore_errors=True)
+        if removed:
+            logger.info(f"已删除旧数据版本: {', '.join(removed)}")
+        return removed
@@ -0,0 +1,344 @@
+"""
+猜测计算进程池
+
+模糊匹配需要遍历全部角色名，候选角色筛选需要对倒排列表求交集，角色多时在事件循环中执行会拖慢
+同一进程中的所有插件（GIL 下线程池也无法避免）。工作进程各持有一份只读的角色数据快照，
+这两类计算以批为单位在进程中执行：
+
+- 批处理：短时间内到达的请求合并为一批提交，减少进程间往返，批大小或等待时间达到上限时立即提交
+- 超时：每个请求单独计时，超时后放弃等待，迟到的结果被丢弃
+- 背压：排队中的请求数或事件循环延迟超过上限时直接拒绝新请求，事件循环延迟不随在途请求数增长
+
+快照只对应主角色数据库（跟踪的数据库），数据更新后在后台重新发布，发布完成之前以及其他数据库
+（如标签模式）的对局仍在线程中计算。
+"""
+
+import asyncio
+from collections.abc import Callable, Collection
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import difflib
+import time
+from typing import Any
+
+from nonebot import logger
+
+from .model import CharacterDatabase, CharacterPool
+
+# 请求: (操作, 参数...)，操作为 match 或 filter
+Request = tuple[Any, ...]
+
+
+class WorkerBusyError(Exception):
+    """工作进程繁忙（排队已满、事件循环延迟过高或超时），请求被拒绝"""
+
+
+# ---- 工作进程 ----
+
+_db: CharacterDatabase | None = None
+
+
+def _init_worker(char_data: dict[str, list[str]]) -> None:
+    """进程初始化，由角色数据快照构建只读数据库"""
+    global _db
+    _db = CharacterDatabase(char_data=char_data)
+
+
+def _match(name: str, limit: int) -> list[str]:
+    """与 AniGuessrGame._find_closest_character 相同的模糊匹配，返回最接近的 limit 个角色名"""
+    return difflib.get_close_matches(name, _db.characters.keys(), n=limit, cutoff=0.6)
+
+
+def _filter(confirmed: frozenset[str], excluded: frozenset[str]) -> frozenset[str]:
+    """具有全部已确认属性且没有任何已排除属性的角色，不限于角色池"""
+    postings = sorted((_db.get_characters_with_attribute(attr) for attr in confirmed), key=len)
+    candidates = set(postings[0]) if postings else set(_db.characters.keys())
+    for names in postings[1:]:
+        candidates.intersection_update(names)
+    for attr in excluded:
+        if not candidates:
+            break
+        candidates.difference_update(_db.get_characters_with_attribute(attr))
+    return frozenset(candidates)
+
+
+_OPERATIONS: dict[str, Callable[..., Any]] = {"match": _match, "filter": _filter}
+
+
+def _run_batch(requests: list[Request]) -> list[Any]:
+    """执行一批请求，单个请求出错时返回异常对象，不影响同批的其他请求"""
+    results = []
+    for operation, *args in requests:
+        try:
+            results.append(_OPERATIONS[operation](*args))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def _snapshot(db: CharacterDatabase) -> dict[str, list[str]]:
+    """复制角色数据用于发送到工作进程"""
+    return {name: list(attrs) for name, attrs in db.characters.items()}
+
+
+# ---- 事件循环一侧 ----
+
+
+class GuessWorkerPool:
+    """猜测计算进程池，只能在事件循环中使用"""
+
+    def __init__(
+        self,
+        workers: int,
+        timeout: float = 2.0,
+        max_batch: int = 32,
+        batch_window: float = 0.002,
+        max_pending: int = 256,
+        max_loop_lag: float = 0.1,
+        lag_interval: float = 0.05,
+    ):
+        """
+        Args:
+            workers: 工作进程数
+            timeout: 单个请求的超时时间（秒）
+            max_batch: 每批最多的请求数
+            batch_window: 第一个请求到达后最多等待多久再提交（秒）
+            max_pending: 已提交但还没有结果的请求数上限
+            max_loop_lag: 事件循环延迟上限（秒），超过时拒绝新请求，0 表示不限制
+            lag_interval: 事件循环延迟的采样间隔（秒）
+        """
+        self.workers = max(workers, 1)
+        self.timeout = timeout
+        self.max_batch = max(max_batch, 1)
+        self.batch_window = batch_window
+        self.max_pending = max(max_pending, 1)
+        self.max_loop_lag = max_loop_lag
+        self.lag_interval = lag_interval
+        self._executor: ProcessPoolExecutor | None = None
+        self._tracked: CharacterDatabase | None = None
+        # 工作进程中快照对应的 (数据库, 更新次数)
+        self._snapshot_key: tuple[int, int] | None = None
+        self._publishing: asyncio.Task | None = None
+        self._queue: list[tuple[Request, asyncio.Future]] = []
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._monitor: asyncio.Task | None = None
+        self.pending = 0
+        self.loop_lag = 0.0
+        self.max_lag_seen = 0.0
+        self.batches = 0
+        self.requests = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.publishes = 0
+
+    def start(self) -> None:
+        """启动事件循环延迟监测"""
+        if self._monitor is None:
+            self._monitor = asyncio.create_task(self._monitor_lag())
+
+    def close(self) -> None:
+        """关闭进程池，等待中的请求收到 WorkerBusyError"""
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+        if self._publishing is not None:
+            self._publishing.cancel()
+            self._publishing = None
+        self._fail_queue(WorkerBusyError("进程池已关闭"))
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._snapshot_key = None
+
+    def track(self, db: CharacterDatabase) -> None:
+        """跟踪新的主角色数据库，在后台发布快照"""
+        self._tracked = db
+        self._schedule_publish()
+
+    def serves(self, db: CharacterDatabase | CharacterPool) -> bool:
+        """
+        对局使用的数据库能否交给工作进程计算
+        Args:
+            db: 对局的角色数据库或角色池
+        Returns:
+            bool: 快照与数据库当前的数据一致时返回 True；跟踪的数据库已更新但快照还没有发布时，
+                在后台发布并返回 False
+        """
+        core = db.core if isinstance(db, CharacterPool) else db
+        if core is not self._tracked:
+            return False
+        if self._snapshot_key == (id(core), core.generation) and self._executor is not None:
+            return True
+        self._schedule_publish()
+        return False
+
+    async def wait_published(self) -> None:
+        """等待后台的快照发布完成"""
+        if self._publishing is not None:
+            await self._publishing
+
+    def _schedule_publish(self) -> None:
+        if self._publishing is None or self._publishing.done():
+            self._publishing = asyncio.create_task(self._publish())
+
+    async def _publish(self) -> None:
+        """在线程中复制跟踪的数据库，用新快照启动新的进程池，旧进程池完成在途请求后退出"""
+        while self._tracked is not None:
+            db = self._tracked
+            key = (id(db), db.generation)
+            if key == self._snapshot_key:
+                return
+            try:
+                snapshot = await asyncio.to_thread(_snapshot, db)
+            except Exception as e:
+                logger.error(f"复制角色数据到猜测计算进程失败: {e}")
+                return
+            # 复制期间数据再次更新时重新复制
+            if db is not self._tracked or db.generation != key[1]:
+                continue
+            old, self._executor = (
+                self._executor,
+                ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker, initargs=(snapshot,)),
+            )
+            self._snapshot_key = key
+            self.publishes += 1
+            if old is not None:
+                old.shutdown(wait=False)
+            logger.info(f"猜测计算进程池已加载 {len(snapshot)} 个角色")
+
+    async def match(self, name: str, hidden: Collection[str] = frozenset()) -> str | None:
+        """
+        在工作进程中模糊匹配角色名
+        Args:
+            name: 输入的角色名
+            hidden: 不能匹配的角色名，不发送到工作进程，由工作进程多返回这么多个结果后在这里过滤
+        Returns:
+            str | None: 最接近的角色名，没有匹配时返回 None
+        Raises:
+            WorkerBusyError: 请求被拒绝或超时
+        """
+        matches = await self._call(("match", name, len(hidden) + 1))
+        return next((match for match in matches if match not in hidden), None)
+
+    async def filter_candidates(self, confirmed: frozenset[str], excluded: frozenset[str]) -> frozenset[str]:
+        """
+        在工作进程中筛选候选角色，结果不限于角色池，调用方再与角色池求交集
+        Args:
+            confirmed: 已确认的属性
+            excluded: 已排除的属性
+        Returns:
+            frozenset[str]: 符合条件的角色名
+        Raises:
+            WorkerBusyError: 请求被拒绝或超时
+        """
+        return await self._call(("filter", confirmed, excluded))
+
+    async def _call(self, request: Request) -> Any:
+        if self.pending + len(self._queue) >= self.max_pending or (
+            self.max_loop_lag > 0 and self.loop_lag > self.max_loop_lag
+        ):
+            self.rejected += 1
+            raise WorkerBusyError("当前猜测请求过多，请稍后再试")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((request, future))
+        self.requests += 1
+        if len(self._queue) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+
+        try:
+            # 超时取消的是等待，迟到的结果在 _deliver 中被丢弃
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise WorkerBusyError("猜测计算超时，请稍后再试") from None
+
+    def _flush(self) -> None:
+        """把队列中的请求作为一批提交到进程池"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._queue = self._queue, []
+        batch = [(request, future) for request, future in batch if not future.done()]
+        if not batch:
+            return
+        if self._executor is None:
+            for _, future in batch:
+                future.set_exception(WorkerBusyError("猜测计算进程池未就绪"))
+            return
+
+        self.batches += 1
+        self.pending += len(batch)
+        executor_future = asyncio.get_running_loop().run_in_executor(
+            self._executor, _run_batch, [request for request, _ in batch]
+        )
+        executor_future.add_done_callback(lambda done: self._deliver(batch, done))
+
+    def _deliver(self, batch: list[tuple[Request, asyncio.Future]], done: asyncio.Future) -> None:
+        """分发一批的结果，已超时的请求不再设置结果"""
+        self.pending -= len(batch)
+        error = None if done.cancelled() else done.exception()
+        if done.cancelled() or error is not None:
+            if isinstance(error, BrokenProcessPool):
+                # 工作进程异常退出，下次使用时重新发布快照
+                logger.error("猜测计算进程异常退出，将重新启动")
+                self._snapshot_key = None
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(WorkerBusyError(f"猜测计算失败: {error}"))
+            return
+        for (_, future), result in zip(batch, done.result()):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _fail_queue(self, error: Exception) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        for _, future in self._queue:
+            if not future.done():
+                future.set_exception(error)
+        self._queue = []
+
+    async def _monitor_lag(self) -> None:
+        """按固定间隔休眠，实际唤醒时间比预期晚多少即为事件循环延迟"""
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.lag_interval)
+            self.loop_lag = max(time.perf_counter() - start - self.lag_interval, 0.0)
+            self.max_lag_seen = max(self.max_lag_seen, self.loop_lag)
+
+    def stats(self) -> dict[str, float]:
+        """进程池统计，用于运行指标"""
+        return {
+            "ready": self._executor is not None and self._snapshot_key is not None,
+            "requests": self.requests,
+            "batches": self.batches,
+            "pending": self.pending + len(self._queue),
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "publishes": self.publishes,
+            "loop_lag_ms": round(self.loop_lag * 1000, 2),
+            "max_loop_lag_ms": round(self.max_lag_seen * 1000, 2),
+        }
+
+
+_pool: GuessWorkerPool | None = None
+
+
+def set_guess_workers(pool: GuessWorkerPool | None) -> None:
+    """设置全局的猜测计算进程池，None 表示不使用进程池"""
+    global _pool
+    _pool = pool
+
+
+def guess_workers() -> GuessWorkerPool | None:
+    """全局的猜测计算进程池，未启用时返回 None"""
+    return _pool
@@ -0,0 +1,115 @@
+from pathlib import Path
+
+from nonebug import App
+
+
+async def test_incremental_analytics(app: App, tmp_path: Path):
+    from nonebot_plugin_aniguessr.analytics import load_table, update_analytics
+    from nonebot_plugin_aniguessr.events import EventLog
+
+    events_dir = tmp_path / "events"
+    output_dir = tmp_path / "analytics"
+    log = EventLog(events_dir, flush_interval=60, max_bytes=600, keep_files=100)
+    log.open()
+
+    def play(seed: int, target: str, hints: list[str], reason: str, attempts: int) -> None:
+        log.emit("start", user="1", seed=seed, mode="normal", tier="easy", target=target, hints=hints)
+        log.emit("guess", user="1", seed=seed, input="甲", name="甲", method="exact", correct=reason == "win")
+        log.emit("end", user="1", seed=seed, reason=reason, won=reason == "win", attempts=attempts, target=target)
+
+    try:
+        for seed in range(3):
+            play(seed, "乙", ["a", "b"], "giveup", 2)
+        play(3, "甲", ["a"], "win", 4)
+        # 开始事件已处理，结束事件在下一次统计时处理
+        log.emit("start", user="2", seed=9, mode="normal", tier="hard", target="甲", hints=["c"])
+        await log.flush()
+        first = update_analytics(events_dir, output_dir)
+        assert first.games == 4
+        assert "2:9" in first.open_games
+
+        log.emit("end", user="2", seed=9, reason="timeout", won=False, attempts=10, target="甲")
+        await log.flush()
+    finally:
+        await log.close()
+    assert log.rotations > 0
+
+    incremental = update_analytics(events_dir, output_dir)
+    summary = load_table(output_dir, "summary")
+    assert summary["games"] == 5
+    assert summary["reasons"] == {"giveup": 3, "win": 1, "timeout": 1}
+    assert summary["giveup_attempts"] == {"2": 3}
+    assert summary["never_won"] == ["乙"]
+    assert summary["tiers"]["hard"] == {"games": 1, "win_rate": 0.0}
+    assert summary["weakest_hints"] == ["b", "a"]
+    assert load_table(output_dir, "hints")["a"] == {"games": 4, "wins": 1, "win_rate": 0.25, "avg_attempts": 4.0}
+    assert load_table(output_dir, "characters")["甲"]["guessed"] == 4
+
+    # 增量结果与从头处理的结果相同
+    rebuilt = update_analytics(events_dir, tmp_path / "rebuilt", rebuild=True)
+    assert (rebuilt.events, rebuilt.targets, rebuilt.hints) == (
+        incremental.events,
+        incremental.targets,
+        incremental.hints,
+    )
+    assert update_analytics(events_dir, output_dir).events == incremental.events
+
+
+async def test_analytics_ignores_clock_steps(app: App, tmp_path: Path, monkeypatch):
+    from nonebot_plugin_aniguessr import events
+    from nonebot_plugin_aniguessr.analytics import update_analytics
+    from nonebot_plugin_aniguessr.events import EventLog
+
+    events_dir = tmp_path / "events"
+    output_dir = tmp_path / "analytics"
+    now = [1000.0]
+    monkeypatch.setattr(events.time, "time", lambda: now[0])
+    log = EventLog(events_dir, flush_interval=60)
+    log.open()
+    try:
+        for seed in range(2):
+            log.emit("end", user="1", seed=seed, reason="win", won=True, attempts=1, target="甲")
+        await log.flush()
+        assert update_analytics(events_dir, output_dir).games == 2
+
+        # 系统时间回拨后写入的事件仍被统计
+        now[0] = 500.0
+        for seed in range(2, 4):
+            log.emit("end", user="1", seed=seed, reason="giveup", won=False, attempts=1, target="甲")
+        await log.flush()
+    finally:
+        await log.close()
+    aggregates = update_analytics(events_dir, output_dir)
+    assert (aggregates.games, aggregates.last_seq) == (4, 4)
+
+
+async def test_analytics_rotation_during_scan(app: App, tmp_path: Path, monkeypatch):
+    from nonebot_plugin_aniguessr import analytics
+    from nonebot_plugin_aniguessr.events import EventLog, rotated_files
+
+    events_dir = tmp_path / "events"
+    log = EventLog(events_dir, flush_interval=60)
+    log.open()
+    try:
+        for seed in range(3):
+            log.emit("end", user="1", seed=seed, reason="win", won=True, attempts=1, target="甲")
+        await log.flush()
+    finally:
+        await log.close()
+
+    calls = 0
+
+    def rotate_after_listing(directory: Path) -> list[Path]:
+        nonlocal calls
+        files = rotated_files(directory)
+        calls += 1
+        if calls == 1:
+            # 列出轮转文件之后、打开当前文件之前发生轮转，并写入新的事件
+            log._rotate(log.seq)
+            log.seq += 1
+            log._write_batch([{"seq": log.seq, "type": "end", "user": "1", "seed": 3, "won": False, "target": "甲"}])
+        return files
+
+    monkeypatch.setattr(analytics, "rotated_files", rotate_after_listing)
+    aggregates = analytics.update_analytics(events_dir, tmp_path / "analytics")
+    assert (aggregates.games, aggregates.wins, aggregates.last_seq) == (4, 3, 4)
@@ -0,0 +1,62 @@
+from nonebug import App
+
+
+async def test_lru_cache_bounds(app: App):
+    from nonebot_plugin_aniguessr.cache import LRUCache
+
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    # b 最久未使用，被淘汰
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.stats()["evictions"] == 1
+    assert cache.hit_rate == 0.75
+
+    weighted = LRUCache(maxsize=10, max_weight=5, weigh=len)
+    weighted.put("x", "abc")
+    weighted.put("y", "de")
+    weighted.put("z", "f")
+    assert weighted.get("x") is None
+    assert weighted.weight == 3
+    # 超过总权重上限的条目不缓存
+    weighted.put("big", "abcdef")
+    assert weighted.get("big") is None
+    weighted.clear()
+    assert len(weighted) == 0
+    assert weighted.weight == 0
+
+
+async def test_candidate_cache_shared_across_games(app: App):
+    from nonebot_plugin_aniguessr.delta import CharacterDelta
+    from nonebot_plugin_aniguessr.game_logic import AniGuessrGame, candidate_cache
+    from nonebot_plugin_aniguessr.metrics import collect, format_metrics, register, unregister
+    from nonebot_plugin_aniguessr.model import CharacterDatabase
+
+    db = CharacterDatabase(char_data={"甲": ["a", "b"], "乙": ["a", "c"], "丙": ["a", "b", "c"], "丁": ["d"]})
+    candidate_cache.clear()
+    first = AniGuessrGame(db, target="甲")
+    second = AniGuessrGame(db, target="丙")
+    first.attr_status.add_confirmed("a")
+    second.attr_status.add_confirmed("a")
+
+    hits = candidate_cache.hits
+    assert first.get_candidate_characters() == ["丙", "乙", "甲"]
+    second.guessed_characters.add("乙")
+    assert second.get_candidate_characters() == ["丙", "甲"]
+    assert candidate_cache.hits == hits + 1
+    # 猜测记录不影响共享的结果
+    assert first.get_candidate_characters() == ["丙", "乙", "甲"]
+
+    # 数据更新后不再使用旧结果
+    db.apply_delta(CharacterDelta(added={"戊": ["a"]}))
+    assert first.get_candidate_characters() == ["丙", "乙", "戊", "甲"]
+
+    register("test", candidate_cache.stats)
+    try:
+        assert "hit_rate" in collect()["test"]
+        assert "[test]" in format_metrics(collect())
+    finally:
+        unregister("test")
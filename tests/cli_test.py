@@ -0,0 +1,47 @@
+import json
+from pathlib import Path
+import subprocess
+import sys
+
+from nonebug import App
+
+
+def run_cli(data_dir: Path, *args: str) -> subprocess.CompletedProcess:
+    # 在独立进程中运行，确认命令行工具不依赖已初始化的 NoneBot
+    return subprocess.run(
+        [sys.executable, "-m", "nonebot_plugin_aniguessr", "--data-dir", str(data_dir), *args],
+        capture_output=True,
+        text=True,
+        cwd=Path(__file__).parent.parent / "src",
+        timeout=60,
+    )
+
+
+async def test_cli_build_verify_stats(app: App, tmp_path: Path):
+    from nonebot_plugin_aniguessr.versions import DATA_FILES
+
+    source = tmp_path / "source"
+    source.mkdir()
+    for name in DATA_FILES:
+        content = {"甲": ["a", "b"], "乙": ["a"]} if name == "char2attr.json" else {}
+        (source / name).write_text(json.dumps(content, ensure_ascii=False), encoding="utf-8")
+    data_dir = tmp_path / "data"
+
+    result = run_cli(data_dir, "build", "--source", str(source))
+    assert result.returncode == 0, result.stderr
+    assert "2 个角色" in result.stdout
+
+    result = run_cli(data_dir, "verify")
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.startswith("✓")
+
+    result = run_cli(data_dir, "stats")
+    assert result.returncode == 0, result.stderr
+    assert "角色数: 2" in result.stdout
+    assert "a: 2" in result.stdout
+
+    index = next((data_dir / "versions").glob("*/index.pickle"))
+    index.write_bytes(index.read_bytes() + b"\0")
+    result = run_cli(data_dir, "verify")
+    assert result.returncode == 1
+    assert "index.pickle" in result.stdout
@@ -0,0 +1,69 @@
+import json
+import os
+from pathlib import Path
+
+from nonebug import App
+
+
+async def test_compress_roundtrip(app: App, tmp_path: Path):
+    from nonebot_plugin_aniguessr.compression import compress_file, find_file, open_decompressed
+
+    path = tmp_path / "char2attr.json"
+    path.write_text(json.dumps({"甲": ["a"]}, ensure_ascii=False), encoding="utf-8")
+
+    compressed = compress_file(path, "gzip")
+    assert compressed.name == "char2attr.json.gz"
+    assert not path.exists()
+    assert find_file(tmp_path, "char2attr.json") == compressed
+    with open_decompressed(compressed) as f:
+        assert json.load(f) == {"甲": ["a"]}
+
+
+async def test_download_from_local_source(app: App, tmp_path: Path, monkeypatch):
+    from nonebot_plugin_aniguessr import data_source
+    from nonebot_plugin_aniguessr.config import plugin_config
+    from nonebot_plugin_aniguessr.versions import DATA_FILES, VersionStore
+
+    source = tmp_path / "source"
+    source.mkdir()
+    for name in DATA_FILES:
+        content = {"甲": ["a", "b"]} if name == "char2attr.json" else {}
+        (source / name).write_text(json.dumps(content, ensure_ascii=False), encoding="utf-8")
+
+    store = VersionStore(tmp_path / "versions")
+    monkeypatch.setattr(data_source, "versions", store)
+    monkeypatch.setattr(plugin_config, "aniguessr_data_source", f"file://{source}")
+    monkeypatch.setattr(plugin_config, "aniguessr_data_mirrors", [])
+
+    assert await data_source.download_character_data(force_update=True)
+    version = store.current()
+    assert version is not None
+    assert sorted(store.manifest(version).files) == sorted(f"{name}.gz" for name in DATA_FILES)
+
+    collection = await data_source.load_character_data_from_file()
+    assert collection.char2attr == {"甲": ["a", "b"]}
+
+
+async def test_interrupted_download_leaves_no_file(app: App, tmp_path: Path):
+    from contextlib import asynccontextmanager
+
+    import pytest
+
+    from nonebot_plugin_aniguessr.data_source import _fetch_file
+
+    class Response:
+        status_code = 200
+
+        async def aiter_bytes(self, size: int):
+            yield b'{"\\xe7\\x94\\xb2": ['
+            raise ConnectionError("连接中断")
+
+    class Client:
+        @asynccontextmanager
+        async def stream(self, method: str, url: str):
+            yield Response()
+
+    with pytest.raises(ConnectionError):
+        await _fetch_file(Client(), "https://example.com/data", "char2attr.json", tmp_path)
+    # 不完整的文件被删除，下一个来源不会与它混在一起
+    assert os.listdir(tmp_path) == []
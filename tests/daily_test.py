@@ -0,0 +1,69 @@
+from datetime import date
+
+from nonebug import App
+
+
+def make_database():
+    from nonebot_plugin_aniguessr.model import CharacterDatabase
+
+    return CharacterDatabase(
+        char_data={
+            "御坂美琴": ["学生", "短发", "电系能力", "傲娇"],
+            "白井黑子": ["学生", "双马尾", "瞬间移动能力者", "风纪委员"],
+            "初春饰利": ["学生", "短发", "风纪委员", "花饰"],
+            "佐天泪子": ["学生", "长发", "黑发"],
+            "食蜂操祈": ["学生", "长发", "金发", "精神系能力"],
+        }
+    )
+
+
+async def test_daily_challenge_is_deterministic(app: App):
+    from nonebot_plugin_aniguessr.daily import build_daily_challenge
+
+    db = make_database()
+    day = date(2026, 10, 18)
+    first = build_daily_challenge(db, day, hint_count=2)
+    second = build_daily_challenge(db, day, hint_count=2)
+    assert first == second
+    assert first.target_name in first.base_candidates
+    assert first.hint_set <= first.target_attr_set
+
+
+async def test_daily_game_candidates_match_regular_game(app: App):
+    from nonebot_plugin_aniguessr.daily import build_daily_challenge
+    from nonebot_plugin_aniguessr.game_logic import AniGuessrGame
+
+    db = make_database()
+    challenge = build_daily_challenge(db, date(2026, 10, 18), hint_count=1)
+
+    daily_game = AniGuessrGame(db, daily=challenge)
+    assert daily_game.get_target_name() == challenge.target_name
+    assert daily_game.get_random_attrs() == list(challenge.hints)
+
+    # 普通对局从完整角色集合开始计算，结果应与从预计算候选集合开始一致
+    regular_game = AniGuessrGame(db)
+    regular_game.attr_status.add_confirmed_many(challenge.hints)
+
+    for game in (daily_game, regular_game):
+        game.attr_status.add_excluded("长发")
+    assert daily_game.get_candidate_characters() == regular_game.get_candidate_characters()
+
+
+async def test_game_across_midnight_records_to_its_own_day(app: App):
+    from datetime import timedelta
+
+    from nonebot_plugin_aniguessr.daily import get_leaderboard, leaderboard_of, rollover
+
+    yesterday = date.today() - timedelta(days=1)
+    challenge = rollover(make_database(), hint_count=1, day=yesterday)
+    # 零点后切换到今天的排行榜，前一天的排行榜仍可记录
+    today = get_leaderboard()
+    assert today.day == date.today()
+
+    previous = leaderboard_of(challenge.day)
+    assert previous is not None
+    assert previous is not today
+    previous.record("1", "玩家", won=True, attempts=3, seconds=10.0)
+    assert previous.rank_of("1") == 1
+    assert not today.has_played("1")
+    assert leaderboard_of(yesterday - timedelta(days=1)) is None
@@ -0,0 +1,132 @@
+import json
+
+from nonebug import App
+
+OLD = {
+    "甲": ["a", "b", "c"],
+    "乙": ["a", "b"],
+    "丙": ["c"],
+}
+NEW = {
+    "甲": ["a", "b", "c"],
+    "乙": ["a", "d"],
+    "丁": ["d", "e", "f"],
+}
+
+
+async def test_diff_char2attr(app: App):
+    from nonebot_plugin_aniguessr.delta import diff_char2attr
+
+    delta = diff_char2attr(OLD, NEW)
+    assert delta.added == {"丁": ["d", "e", "f"]}
+    assert delta.removed == {"丙": ["c"]}
+    assert delta.changed == {"乙": (["a", "b"], ["a", "d"])}
+    assert delta.touched() == {"乙", "丙", "丁"}
+    assert diff_char2attr(OLD, OLD).is_empty()
+
+
+async def test_apply_delta_matches_rebuild(app: App):
+    from nonebot_plugin_aniguessr.delta import diff_char2attr
+    from nonebot_plugin_aniguessr.model import CharacterDatabase
+
+    db = CharacterDatabase(char_data=OLD)
+    vocab_added, vocab_removed = db.apply_delta(diff_char2attr(OLD, NEW))
+    rebuilt = CharacterDatabase(char_data=NEW)
+
+    assert db.characters == rebuilt.characters
+    assert db.get_all_attributes() == rebuilt.get_all_attributes() == {"a", "b", "c", "d", "e", "f"}
+    for attr in rebuilt.get_all_attributes():
+        assert set(db.get_characters_with_attribute(attr)) == set(rebuilt.get_characters_with_attribute(attr))
+    assert vocab_added == {"d", "e", "f"}
+    assert vocab_removed == set()
+    assert db.generation == 1
+
+
+async def test_patch_tier_pools(app: App):
+    from nonebot_plugin_aniguessr.delta import diff_char2attr
+    from nonebot_plugin_aniguessr.model import CharacterDatabase
+    from nonebot_plugin_aniguessr.tiers import build_tier_pools, patch_tier_pools
+
+    db = CharacterDatabase(char_data=OLD)
+    pools = build_tier_pools(db, min_attrs=2, easy_min_attrs=3)
+    delta = diff_char2attr(OLD, NEW)
+    db.apply_delta(delta)
+
+    patched = patch_tier_pools(pools, db, delta, min_attrs=2, easy_min_attrs=3)
+    expected = build_tier_pools(db, min_attrs=2, easy_min_attrs=3)
+    for tier in ("normal", "easy", "hard"):
+        assert set(patched[tier].names) == set(expected[tier].names)
+    # 原有的角色池不受影响
+    assert set(pools["easy"].names) == {"甲"}
+
+
+async def test_overlay_before_compaction(app: App, monkeypatch):
+    import pickle
+
+    from nonebot_plugin_aniguessr.delta import diff_char2attr
+    from nonebot_plugin_aniguessr.model import CharacterDatabase
+
+    monkeypatch.setattr(CharacterDatabase, "COMPACT_RATIO", 10.0)
+    db = CharacterDatabase(char_data=OLD)
+    target_attrs = db.characters["乙"]
+    db.apply_delta(diff_char2attr(OLD, NEW))
+    rebuilt = CharacterDatabase(char_data=NEW)
+
+    assert dict(db.characters) == dict(rebuilt.characters)
+    assert "丙" not in db.characters
+    assert set(db.get_characters_with_attribute("a")) == {"甲", "乙"}
+    assert set(db.get_characters_with_attribute("d")) == {"乙", "丁"}
+    assert list(db.get_characters_with_attribute("c")) == ["甲"]
+    # 更新前取得的视图不受影响
+    assert target_attrs == ["a", "b"]
+
+    restored = pickle.loads(pickle.dumps(db))
+    assert dict(restored.characters) == dict(rebuilt.characters)
+
+
+async def test_name_snapshot_is_stable_across_updates(app: App, monkeypatch):
+    from nonebot_plugin_aniguessr.delta import diff_char2attr
+    from nonebot_plugin_aniguessr.model import CharacterDatabase
+
+    monkeypatch.setattr(CharacterDatabase, "COMPACT_RATIO", 10.0)
+    db = CharacterDatabase(char_data=OLD)
+    before = db.name_snapshot()
+    assert db.name_snapshot() is before
+
+    db.apply_delta(diff_char2attr(OLD, NEW))
+    # 更新前取得的快照不变，线程中遍历时不会遇到覆盖层的修改
+    assert list(before) == ["甲", "乙", "丙"]
+    after = db.name_snapshot()
+    assert isinstance(after, tuple)
+    assert sorted(after) == sorted(NEW)
+
+
+async def test_incremental_update_keeps_packs_imported_during_download(app: App, tmp_path, monkeypatch):
+    from nonebot_plugin_aniguessr import data_source
+    from nonebot_plugin_aniguessr.delta import CharacterDelta
+    from nonebot_plugin_aniguessr.model import CharacterDatabase
+    from nonebot_plugin_aniguessr.packs import apply_pack_delta
+    from nonebot_plugin_aniguessr.versions import DATA_FILES, VersionStore
+
+    store = VersionStore(tmp_path / "versions")
+    monkeypatch.setattr(data_source, "versions", store)
+    db = CharacterDatabase(char_data=OLD)
+    packs: dict[str, list[str]] = {}
+
+    async def download(force_update: bool = False) -> bool:
+        # 下载期间导入角色包
+        packs["戊"] = ["x", "y"]
+        apply_pack_delta(db, CharacterDelta(added=dict(packs)))
+        staging = store.staging_dir()
+        for name in DATA_FILES:
+            content = NEW if name == "char2attr.json" else {}
+            (staging / name).write_text(json.dumps(content, ensure_ascii=False), encoding="utf-8")
+        store.activate(store.commit(staging).version)
+        return True
+
+    monkeypatch.setattr(data_source, "download_character_data", download)
+
+    delta = await data_source.update_character_data_incremental(db, lambda: dict(packs))
+    assert delta is not None
+    assert "戊" not in delta.removed
+    assert dict(db.characters) == {**NEW, "戊": ["x", "y"]}
@@ -0,0 +1,80 @@
+import pickle
+
+from nonebug import App
+
+
+async def test_distinguish_scores(app: App):
+    from nonebot_plugin_aniguessr.delta import CharacterDelta
+    from nonebot_plugin_aniguessr.model import CharacterDatabase
+    from nonebot_plugin_aniguessr.tiers import build_tier_pools
+
+    db = CharacterDatabase(
+        char_data={
+            "甲": ["茶发", "短发", "电击使"],
+            "乙": ["茶发", "双马尾", "空间移动"],
+            "丙": ["茶发", "短发"],
+            "丁": ["茶发", "短发", "电击使", "超能力者"],
+            "戊": ["黑发", "长发"],
+        }
+    )
+    assert db.distinguish_score("甲") is None
+    db.compute_distinguish_scores()
+
+    # 双马尾只有乙具有
+    assert db.distinguish_score("乙") == 1
+    # 戊的黑发只有它自己具有
+    assert db.distinguish_score("戊") == 1
+    assert db.distinguish_score("丁") == 1
+    # 丁具有甲的全部属性，甲和丙都无法唯一确定
+    assert db.distinguish_score("甲") == 0
+    assert db.distinguish_score("丙") == 0
+    assert db.nearest_neighbors("甲")[0] == "丁"
+    assert db.nearest_neighbors("丙")[:2] == ["甲", "丁"]
+
+    # 区分度为 0 的角色仍可作为目标，但不作为简单难度的目标
+    pools = build_tier_pools(db, 1, 3)
+    assert set(pools["normal"].names) == set(db.characters)
+    assert set(pools["easy"].names) == {"乙", "丁"}
+    assert set(pools["hard"].names) == {"甲", "丙", "戊"}
+
+    # 区分度随编译索引保存
+    loaded = pickle.loads(pickle.dumps(db))
+    assert loaded.distinguish_score("乙") == 1
+    assert loaded.nearest_neighbors("甲") == db.nearest_neighbors("甲")
+
+    # 增量更新后全部角色在重新计算之前都没有区分度，包括没有变化的丙：其他角色的变化也会改变它的区分度和近邻
+    db.apply_delta(CharacterDelta(changed={"甲": (["茶发", "短发", "电击使"], ["茶发", "短发", "电击使", "御坂"])}))
+    assert db.distinguish_score("甲") is None
+    assert db.distinguish_score("丙") is None
+    assert db.nearest_neighbors("丙") == []
+    assert pickle.loads(pickle.dumps(db)).has_distinguish_scores is False
+    db.compute_distinguish_scores()
+    assert db.distinguish_score("甲") == 1
+
+
+async def test_refresh_scores_after_delta(app: App):
+    from nonebot_plugin_aniguessr.data_source import refresh_distinguish_scores
+    from nonebot_plugin_aniguessr.delta import CharacterDelta
+    from nonebot_plugin_aniguessr.distinguish import compute_scores
+    from nonebot_plugin_aniguessr.model import CharacterDatabase
+
+    db = CharacterDatabase(char_data={"甲": ["茶发", "短发"], "乙": ["茶发", "短发", "电击使"]})
+    db.compute_distinguish_scores()
+    assert db.distinguish_score("甲") == 0
+
+    db.apply_delta(CharacterDelta(added={"丙": ["黑发"]}))
+    assert not db.has_distinguish_scores
+    await refresh_distinguish_scores(db)
+    # 重新计算后覆盖层合并进 CSR，新增的角色也有区分度
+    assert db.distinguish_score("丙") == 1
+    assert db.distinguish_score("甲") == 0
+    assert dict(db.characters) == {"甲": ["茶发", "短发"], "乙": ["茶发", "短发", "电击使"], "丙": ["黑发"]}
+
+    # 计算期间有新的增量更新时，基于更新后的数据得到的区分度才会被使用
+    index = db.compiled_index()
+    generation = db.generation
+    db.apply_delta(CharacterDelta(removed={"乙": ["茶发", "短发", "电击使"]}))
+    assert not db.install_distinguish_scores(index, compute_scores(index), generation)
+    assert not db.has_distinguish_scores
+    await refresh_distinguish_scores(db)
+    assert db.distinguish_score("甲") == 1
@@ -0,0 +1,73 @@
+from pathlib import Path
+
+from nonebug import App
+
+
+async def test_event_log_rotation(app: App, tmp_path: Path):
+    from nonebot_plugin_aniguessr.events import EventLog, read_events, rotated_files
+
+    directory = tmp_path / "events"
+    log = EventLog(directory, batch_size=1000, flush_interval=60, max_bytes=200, keep_files=2, max_buffer=50)
+    log.open()
+    try:
+        for batch in range(4):
+            for i in range(5):
+                log.emit("guess", user="1", seed=batch, input=f"角色{i}", correct=False)
+            await log.flush()
+        # 写入跟不上时丢弃最早的事件
+        for i in range(60):
+            log.emit("candidates", user="2", seed=0, total=i)
+        assert log.dropped == 10
+    finally:
+        await log.close()
+
+    assert log.written == 70
+    assert log.rotations == 5
+    # 轮转文件被压缩，只保留最近的两个
+    files = rotated_files(directory)
+    assert len(files) == 2
+    assert all(path.name.endswith(".jsonl.gz") for path in files)
+
+    events = list(read_events(directory))
+    assert events[-1] == {"seq": 80, "ts": events[-1]["ts"], "type": "candidates", "user": "2", "seed": 0, "total": 59}
+    assert [event["total"] for event in events if event["type"] == "candidates"] == list(range(10, 60))
+
+    # 重新打开后序号继续递增，即使当前文件刚刚轮转为空
+    log = EventLog(directory, flush_interval=60)
+    log.open()
+    try:
+        log.emit("candidates", user="2", seed=0, total=60)
+    finally:
+        await log.close()
+    assert list(read_events(directory))[-1]["seq"] == 81
+
+
+async def test_failed_write_is_retried(app: App, tmp_path: Path, monkeypatch):
+    import pytest
+
+    from nonebot_plugin_aniguessr.events import EventLog, read_events
+
+    log = EventLog(tmp_path, flush_interval=60, max_buffer=3)
+    log.open()
+    try:
+        write_batch = log._write_batch
+
+        def disk_full(batch):
+            raise OSError("No space left on device")
+
+        log.emit("guess", user="1", seed=0)
+        log.emit("guess", user="1", seed=1)
+        monkeypatch.setattr(log, "_write_batch", disk_full)
+        with pytest.raises(OSError, match="No space"):
+            await log.flush()
+        # 放回缓冲区，超过上限时丢弃最早的事件
+        log.emit("guess", user="1", seed=2)
+        log.emit("guess", user="1", seed=3)
+        assert [event["seed"] for event in log._buffer] == [1, 2, 3]
+        assert log.dropped == 1
+
+        monkeypatch.setattr(log, "_write_batch", write_batch)
+        await log.flush()
+    finally:
+        await log.close()
+    assert [event["seq"] for event in read_events(tmp_path)] == [2, 3, 4]
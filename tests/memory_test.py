@@ -0,0 +1,43 @@
+import sys
+
+from nonebug import App
+
+
+async def test_memory_report(app: App):
+    from nonebot_plugin_aniguessr.game_logic import AniGuessrGame
+    from nonebot_plugin_aniguessr.memory import MemoryTracker, deep_size, format_memory_report
+    from nonebot_plugin_aniguessr.model import CharacterDatabase, CharacterPool, GameSettings
+
+    names = ["甲" * 40, "乙" * 40]
+    assert deep_size(names) == sys.getsizeof(names) + sum(sys.getsizeof(name) for name in names)
+    # 已统计过的对象不再计入
+    assert deep_size(names, {id(names[0])}) == deep_size(names) - sys.getsizeof(names[0])
+
+    db = CharacterDatabase(char_data={f"角色{i}": [f"属性{i % 7}", f"属性{i % 11}"] for i in range(200)})
+    pool = CharacterPool(db, list(db.characters)[:100], "normal")
+    games: dict[str, AniGuessrGame] = {}
+    tracker = MemoryTracker()
+
+    def sample():
+        components = {f"角色数据库/{name}": part for name, part in db.memory_parts().items()}
+        components.update({"难度角色池": pool, "对局": games})
+        return tracker.sample(components, {"对局": len(games)})
+
+    first = sample()
+    sizes = {entry.name: entry for entry in first.entries}
+    assert sizes["角色数据库/角色属性"].size > 0
+    assert sizes["角色数据库/倒排索引"].size > 0
+    assert sizes["对局"].delta is None
+    assert first.interval is None
+
+    for user in range(5):
+        games[str(user)] = AniGuessrGame(pool, settings=GameSettings())
+    second = sample()
+    sizes = {entry.name: entry for entry in second.entries}
+    # 角色池和对局引用的核心数据库已计入角色数据库，不重复统计
+    assert sizes["难度角色池"].size < sizes["角色数据库/角色属性"].size
+    assert sizes["角色数据库/角色属性"].delta == 0
+    assert sizes["对局"].delta > 0
+    assert sizes["对局"].count == 5
+    assert sizes["对局"].average == sizes["对局"].size / 5
+    assert "对局" in format_memory_report(second)
@@ -0,0 +1,101 @@
+import gzip
+import json
+
+from nonebug import App
+import pytest
+
+
+async def test_read_pack_formats(app: App, tmp_path):
+    from nonebot_plugin_aniguessr.packs import read_pack
+
+    jsonl = tmp_path / "oc.jsonl"
+    jsonl.write_text(
+        "\n".join(
+            [
+                json.dumps({"name": "甲", "attributes": ["a", " b ", "a", ""]}, ensure_ascii=False),
+                "",
+                "not json",
+                json.dumps({"name": "甲", "attributes": ["c"]}, ensure_ascii=False),
+                json.dumps({"name": "乙", "attributes": []}, ensure_ascii=False),
+                json.dumps({"name": "丙", "attributes": ["c"]}, ensure_ascii=False),
+            ]
+        ),
+        "utf-8",
+    )
+    characters, errors = read_pack(jsonl, exists=lambda name: name == "丙")
+    assert characters == {"甲": ["a", "b"]}
+    assert len(errors) == 4
+    assert errors[0].startswith("第 3 条")
+
+    csv_file = tmp_path / "vtuber.csv"
+    csv_file.write_text("name,attributes\n丁,a|b\n,c\n", "utf-8")
+    characters, errors = read_pack(csv_file)
+    assert characters == {"丁": ["a", "b"]}
+    assert errors == ["第 3 条: 缺少角色名"]
+
+    json_gz = tmp_path / "pack.json.gz"
+    json_gz.write_bytes(gzip.compress(json.dumps({"戊": ["x"]}, ensure_ascii=False).encode()))
+    assert read_pack(json_gz) == ({"戊": ["x"]}, [])
+
+    with pytest.raises(ValueError, match="不支持的文件格式"):
+        read_pack(tmp_path / "pack.txt")
+    (tmp_path / "bad.csv").write_text("name\n甲\n", "utf-8")
+    with pytest.raises(ValueError, match="表头"):
+        read_pack(tmp_path / "bad.csv")
+
+
+async def test_pack_store_group_pools(app: App, tmp_path):
+    from nonebot_plugin_aniguessr.delta import CharacterDelta
+    from nonebot_plugin_aniguessr.game_logic import AniGuessrGame
+    from nonebot_plugin_aniguessr.model import CharacterDatabase
+    from nonebot_plugin_aniguessr.packs import PackStore, apply_pack_delta
+    from nonebot_plugin_aniguessr.tiers import build_tier_pools
+
+    db = CharacterDatabase(char_data={"甲": ["a", "b"], "乙": ["a", "b", "c", "d"]})
+    pools = build_tier_pools(db, min_attrs=2, easy_min_attrs=4)
+
+    store = PackStore(tmp_path / "packs")
+    store.load()
+    pack = {"丙": ["a", "b", "c", "d"], "丁": ["a", "e"], "甲": ["z", "z2"]}
+    store.save("oc", pack)
+    delta = apply_pack_delta(db, store.install("oc", pack))
+    # 与上游角色重名的角色不覆盖上游数据
+    assert set(delta.added) == {"丙", "丁"}
+    assert list(db.get_attributes("甲")) == ["a", "b"]
+    assert store.is_taken("乙", "other", db)
+    assert not store.is_taken("丙", "oc", db)
+
+    assert store.group_pools("g1", pools, 2, 4) is pools
+    assert store.enable("g1", "oc")
+    assert not store.enable("g1", "oc")
+    group_pools = store.group_pools("g1", pools, 2, 4)
+    assert set(group_pools["normal"].names) == {"甲", "乙", "丙", "丁"}
+    assert set(group_pools["easy"].names) == {"乙", "丙"}
+    assert set(group_pools["hard"].names) == {"甲", "丁"}
+    assert store.group_pools("g1", pools, 2, 4) is group_pools
+    # 基础角色池不受影响
+    assert set(pools["normal"].names) == {"甲", "乙"}
+
+    # 没有启用角色包的群组不能猜测其中的角色，与上游重名的角色仍可猜测
+    assert store.hidden_names(db, "g1") == frozenset()
+    assert store.hidden_names(db, "g2") == {"丙", "丁"}
+    game = AniGuessrGame(pools["normal"], target="乙", hidden_names=store.hidden_names(db, "g2"))
+    with pytest.raises(ValueError, match="没有找到角色"):
+        await game.make_guess("丙")
+    assert (await game.make_guess("甲")).guessed_name == "甲"
+    game = AniGuessrGame(group_pools["normal"], target="乙", hidden_names=store.hidden_names(db, "g1"))
+    assert (await game.make_guess("丙")).guessed_name == "丙"
+
+    # 重新加载后保留角色包和启用状态
+    reloaded = PackStore(tmp_path / "packs")
+    reloaded.load()
+    assert reloaded.packs == {"oc": pack}
+    assert reloaded.enabled("g1") == ["oc"]
+    assert reloaded.enabled(None) == []
+
+    delta = apply_pack_delta(db, store.uninstall("oc"))
+    assert set(delta.removed) == {"丙", "丁"}
+    assert db.has_character("甲")
+    assert not db.has_character("丙")
+    assert store.enabled("g1") == []
+    assert apply_pack_delta(db, CharacterDelta()).is_empty()
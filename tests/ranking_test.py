@@ -0,0 +1,16 @@
+from nonebug import App
+
+
+async def test_candidate_cursor_pages_match_full_sort(app: App):
+    from nonebot_plugin_aniguessr.ranking import CandidateCursor, attribute_count_key
+
+    char2attr = {f"角色{i}": ["属性"] * (i % 7) for i in range(50)}
+    key = attribute_count_key(char2attr)
+    expected = sorted(char2attr, key=key)
+
+    cursor = CandidateCursor(char2attr.keys(), key)
+    assert cursor.page_count(10) == 5
+    assert cursor.page(2, 10) == expected[10:20]
+    assert cursor.page(1, 10) == expected[:10]
+    assert cursor.page(5, 10) == expected[40:50]
+    assert cursor.page(6, 10) == []
@@ -0,0 +1,87 @@
+import asyncio
+from types import SimpleNamespace
+
+from nonebot.exception import FinishedException
+from nonebug import App
+import pytest
+
+
+async def test_token_bucket(app: App):
+    from nonebot_plugin_aniguessr.ratelimit import RateLimiter
+
+    limiter = RateLimiter(rate=1.0, burst=2)
+    assert limiter.allow("u", now=0.0)
+    assert limiter.allow("u", now=0.0)
+    assert not limiter.allow("u", now=0.5)
+    # 其他用户不受影响
+    assert limiter.allow("v", now=0.5)
+    # 一秒补充一个令牌
+    assert limiter.allow("u", now=1.5)
+    assert not limiter.allow("u", now=1.5)
+    assert limiter.dropped == 2
+
+    # 补满的桶会被清理
+    limiter.prune(now=100.0)
+    assert not limiter.buckets
+
+    assert all(RateLimiter(rate=0, burst=1).allow("u", now=0.0) for _ in range(100))
+
+
+async def test_latest_ticket(app: App):
+    from nonebot_plugin_aniguessr.ratelimit import LatestTicket
+
+    tickets = LatestTicket()
+    first = tickets.issue("u")
+    second = tickets.issue("u")
+    third = tickets.issue("u")
+    assert not tickets.is_latest("u", first)
+    assert not tickets.is_latest("u", second)
+    assert tickets.is_latest("u", third)
+    assert tickets.merged == 2
+
+    tickets.release("u", third)
+    assert not tickets.latest
+
+
+async def test_cpu_concurrency(app: App):
+    from nonebot_plugin_aniguessr import ratelimit
+
+    ratelimit.set_cpu_concurrency(1)
+    running = 0
+    peak = 0
+
+    def work():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        sum(range(100000))
+        running -= 1
+        return True
+
+    assert all(await asyncio.gather(*(ratelimit.run_cpu_bound(work) for _ in range(4))))
+    assert peak == 1
+    ratelimit.set_cpu_concurrency(2)
+
+
+async def test_rate_limited_command_is_ignored(app: App, monkeypatch):
+    from nonebot_plugin_aniguessr import plugin
+    from nonebot_plugin_aniguessr.ratelimit import RateLimiter
+
+    monkeypatch.setattr(plugin, "user_limiter", RateLimiter(rate=0.001, burst=1))
+    monkeypatch.setattr(plugin, "group_limiter", RateLimiter(rate=0.001, burst=2))
+
+    def uninfo(user_id: str):
+        return SimpleNamespace(user=SimpleNamespace(id=user_id), scene=SimpleNamespace(is_private=False, id="g"))
+
+    await plugin.rate_limit(plugin.aniguessr_guess, uninfo("u"))
+    # 同一用户的第二条命令超出限制，直接结束，不回复
+    with pytest.raises(FinishedException):
+        await plugin.rate_limit(plugin.aniguessr_guess, uninfo("u"))
+    # 群组的限制对所有用户共享
+    await plugin.rate_limit(plugin.aniguessr_guess, uninfo("v"))
+    with pytest.raises(FinishedException):
+        await plugin.rate_limit(plugin.aniguessr_guess, uninfo("w"))
+    assert plugin.user_limiter.dropped == 1
+    assert plugin.group_limiter.dropped == 1
+    # 被群组拒绝的命令不消耗用户的令牌
+    assert plugin.user_limiter.buckets["w"].tokens == 1
@@ -0,0 +1,33 @@
+from nonebug import App
+import pytest
+
+
+async def test_render_guess_board(app: App):
+    from nonebot_plugin_aniguessr import render_image
+
+    if not render_image.is_available():
+        pytest.skip("Pillow not installed")
+
+    render_image._frame.cache_clear()
+    image = render_image.render_guess_board(
+        "第 1 次猜测：御坂美琴",
+        [("双马尾", "exact", "双马尾"), ("学生", "present", "目标角色具有此特征")],
+        ["剩余尝试次数: 9, 剩余时间: 100秒"],
+    )
+    assert image.startswith(b"\xff\xd8")
+    # 格子缓存有上限，相同状态的格子共享边框
+    assert render_image._tile.cache_info().maxsize == render_image.TILE_CACHE_SIZE
+    assert render_image._frame.cache_info().currsize == 2
+
+
+async def test_bench_render(app: App):
+    from nonebot import logger
+
+    from nonebot_plugin_aniguessr import benchmark, render_image
+
+    if not render_image.is_available():
+        pytest.skip("Pillow not installed")
+
+    renders_per_second = benchmark.bench_render(count=20)
+    logger.info(f"图片渲染: {renders_per_second:.1f} 次/秒")
+    assert renders_per_second > 0
@@ -0,0 +1,57 @@
+from nonebug import App
+
+
+def make_result():
+    from nonebot_plugin_aniguessr.model import (
+        MISSING_IN_TARGET,
+        PRESENT_IN_TARGET,
+        CharacterGuessResult,
+        exact_comparison,
+    )
+
+    return CharacterGuessResult(
+        is_correct=False,
+        comparisons={
+            "傲娇": MISSING_IN_TARGET,
+            "双马尾": exact_comparison("双马尾"),
+            "三无": MISSING_IN_TARGET,
+            "学生": PRESENT_IN_TARGET,
+        },
+        target_name="白井黑子",
+        attempts=2,
+        guessed_name="御坂美琴",
+        new_attrs=frozenset({"傲娇", "双马尾"}),
+    )
+
+
+async def test_render_default_order(app: App):
+    from nonebot_plugin_aniguessr.render import render_comparison_lines
+
+    lines = render_comparison_lines(make_result()).splitlines()
+    assert lines == [
+        "❌ 傲娇: 目标角色不具有此特征 (该特征不存在于目标角色中)",
+        "🟢 双马尾: 双马尾",
+        "❌ 三无: 目标角色不具有此特征 (该特征不存在于目标角色中)",
+        "❌ 学生: 目标角色具有此特征 (该特征存在于目标角色中)",
+    ]
+
+
+async def test_render_confirmed_first_with_limit(app: App):
+    from nonebot_plugin_aniguessr.render import render_comparison_lines
+
+    lines = render_comparison_lines(make_result(), limit=2, order="confirmed_first").splitlines()
+    assert lines == [
+        "🟢 双马尾: 双马尾",
+        "❌ 学生: 目标角色具有此特征 (该特征存在于目标角色中)",
+        "…… 还有 2 项未显示",
+    ]
+
+
+async def test_render_diff_only(app: App):
+    from nonebot_plugin_aniguessr.render import render_guess_reply
+
+    reply = render_guess_reply(make_result(), remaining_attempts=8, remaining_time=100, order="diff_only")
+    assert reply.startswith("第 2 次猜测：御坂美琴\n\n比较结果：\n🟢 双马尾: 双马尾\n❌ 傲娇")
+    assert "三无" not in reply
+    assert "学生" not in reply
+    assert "剩余尝试次数: 8, 剩余时间: 100秒" in reply
@@ -0,0 +1,81 @@
+from collections import Counter
+from pathlib import Path
+import sqlite3
+
+from nonebug import App
+import pytest
+
+
+async def test_alias_sampler(app: App):
+    import random
+
+    from nonebot_plugin_aniguessr.sampling import AliasSampler
+
+    sampler = AliasSampler("abcde", [1, 2, 3, 4, 0])
+    rng = random.Random(0)
+    counts = Counter(sampler.sample(rng) for _ in range(100000))
+    assert "e" not in counts
+    for item, weight in zip("abcd", [1, 2, 3, 4]):
+        assert counts[item] / 100000 == pytest.approx(weight / 10, abs=0.01)
+
+    # 相同的种子得到相同的序列
+    assert [sampler.sample(random.Random(7)) for _ in range(5)] == [sampler.sample(random.Random(7)) for _ in range(5)]
+
+    with pytest.raises(ValueError, match="没有可抽取的元素"):
+        AliasSampler([])
+    with pytest.raises(ValueError, match="权重必须非负"):
+        AliasSampler("ab", [0, 0])
+
+
+async def test_weighted_target_and_seed(app: App, tmp_path: Path):
+    import random
+
+    from nonebot_plugin_aniguessr.game_logic import AniGuessrGame
+    from nonebot_plugin_aniguessr.model import CharacterDatabase, CharacterPool
+    from nonebot_plugin_aniguessr.plugin import format_start_message
+    from nonebot_plugin_aniguessr.sampling import set_target_weighting
+    from nonebot_plugin_aniguessr.stats import StatsStore, make_result
+
+    db = CharacterDatabase(char_data={"甲": ["a"], "乙": ["a", "b", "c", "d", "e", "f", "g", "h", "i"]})
+    pool = CharacterPool(db, ["甲", "乙"], "normal")
+    rng = random.Random(0)
+    set_target_weighting("attrs")
+    try:
+        counts = Counter(pool.get_random_character(rng).name for _ in range(10000))
+        assert counts["乙"] / 10000 == pytest.approx(0.9, abs=0.02)
+        counts = Counter(db.get_random_character(rng).name for _ in range(10000))
+        assert counts["乙"] / 10000 == pytest.approx(0.9, abs=0.02)
+    finally:
+        set_target_weighting("uniform")
+
+    # 相同的种子复现目标和提示
+    games = [AniGuessrGame(pool, seed=12345) for _ in range(2)]
+    assert games[0].seed == 12345
+    assert games[0].get_target_name() == games[1].get_target_name()
+    assert games[0].get_random_attrs(3) == games[1].get_random_attrs(3)
+    assert AniGuessrGame(pool).seed is not None
+    # 开始消息只显示与种子无关的对局编号，玩家不能用种子复现目标
+    message = format_start_message(games[0], ["a"])
+    assert games[0].game_id in message
+    assert "12345" not in message
+    assert games[0].game_id != games[1].game_id
+
+    # 旧版本的战绩表补上 seed 列
+    path = tmp_path / "stats.db"
+    with sqlite3.connect(path) as conn:
+        conn.execute(
+            "CREATE TABLE game_results (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT NOT NULL, "
+            "group_id TEXT NOT NULL, mode TEXT NOT NULL, won INTEGER NOT NULL, attempts INTEGER NOT NULL, "
+            "seconds REAL NOT NULL, target TEXT NOT NULL, ended_at REAL NOT NULL)"
+        )
+    conn.close()
+    store = StatsStore(path)
+    store.open()
+    try:
+        store.record(make_result("1", "小明", None, "normal", True, 3, 30.0, "乙", seed=12345))
+        await store.flush()
+    finally:
+        await store.close()
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("SELECT target, seed FROM game_results").fetchall() == [("乙", 12345)]
+    conn.close()
@@ -0,0 +1,61 @@
+from nonebug import App
+import pytest
+
+
+def make_db():
+    from nonebot_plugin_aniguessr.model import CharacterDatabase
+
+    # 每个角色有 6 个属性：两个区分大类的属性和四个随机组合的属性
+    char_data = {}
+    for i in range(60):
+        attrs = [f"类{i % 3}", f"组{i % 5}", *(f"特征{j}" for j in range(8) if (i >> (j % 6)) & 1 == j // 6)]
+        char_data[f"角色{i}"] = attrs[:6] if len(attrs) >= 6 else [*attrs, *(f"补{k}" for k in range(6 - len(attrs)))]
+    return CharacterDatabase(char_data=char_data)
+
+
+async def test_sync_guess(app: App):
+    import random
+
+    from nonebot_plugin_aniguessr.game_logic import AniGuessrGame
+    from nonebot_plugin_aniguessr.model import GameSettings
+
+    db = make_db()
+    game = AniGuessrGame(db, settings=GameSettings(hint_count=2), target="角色7", rng=random.Random(0))
+    assert game.get_target_name() == "角色7"
+    assert len(game.get_random_attrs()) == 2
+    assert 0 < game.remaining_seconds() <= game.settings.timeout_seconds
+
+    result = game.guess("角色8")
+    assert not result.is_correct
+    # 模糊匹配在当前线程中完成
+    assert game.guess("角色7x").is_correct
+    assert game.attempts == 2
+
+
+async def test_simulate_is_reproducible(app: App):
+    from nonebot_plugin_aniguessr.simulator import SimulationConfig, config_grid, simulate
+
+    db = make_db()
+    configs = config_grid(["random", "greedy", "optimal"], [6], [1, 2], [5])
+    assert len(configs) == 6
+    inline = simulate(db, configs, games=40, workers=0, seed=1, batch_size=15)
+    again = simulate(db, configs, games=40, workers=0, seed=1, batch_size=15)
+    parallel = simulate(db, configs[:2], games=40, workers=2, seed=1, batch_size=15)
+
+    for report in inline:
+        assert report.games == 40
+        assert sum(report.attempts.values()) == report.wins
+        assert sum(stats[0] for stats in report.targets.values()) == 40
+        assert 0 < report.win_rate <= 1
+        assert report.games_per_second > 0
+        assert report.config.label() in report.summary()
+    assert [(r.wins, r.attempts) for r in inline] == [(r.wins, r.attempts) for r in again]
+    # 进程池的结果与单进程相同
+    assert [(r.wins, r.attempts, r.targets) for r in parallel] == [(r.wins, r.attempts, r.targets) for r in inline[:2]]
+
+    hardest = inline[0].hardest(3, min_games=1)
+    assert len(hardest) == 3
+    assert hardest[0][1] <= hardest[-1][1]
+
+    with pytest.raises(ValueError, match="未知的策略"):
+        simulate(db, [SimulationConfig(strategy="unknown")], games=1)
@@ -0,0 +1,114 @@
+from pathlib import Path
+
+from nonebug import App
+
+
+async def test_stats_store_aggregates(app: App, tmp_path: Path):
+    from nonebot_plugin_aniguessr.stats import StatsStore, make_result
+
+    store = StatsStore(tmp_path / "stats.db", batch_size=100, flush_interval=60)
+    store.open()
+    try:
+        for won, attempts in [(True, 3), (True, 5), (False, 10), (True, 2)]:
+            store.record(make_result("1", "小明", "g1", "normal", won, attempts, 30.0, "御坂美琴"))
+        store.record(make_result("2", "小红", None, "daily", True, 1, 10.0, "白井黑子"))
+
+        group_top = await store.top("g1")
+        assert [player.user_id for player in group_top] == ["1"]
+        player = group_top[0]
+        assert (player.games, player.wins, player.win_attempts) == (4, 3, 10)
+        assert (player.streak, player.best_streak) == (1, 2)
+
+        global_top = await store.top()
+        assert [player.user_id for player in global_top] == ["1", "2"]
+        assert await store.player("2", "g1") is None
+    finally:
+        await store.close()
+
+
+async def test_stats_queries_include_unwritten_results(app: App, tmp_path: Path):
+    from nonebot_plugin_aniguessr.stats import StatsStore, make_result
+
+    store = StatsStore(tmp_path / "stats.db", batch_size=100, flush_interval=60)
+    store.open()
+    try:
+        store.record(make_result("1", "小明", "g1", "normal", True, 4, 30.0, "御坂美琴"))
+        await store.flush()
+        store.record(make_result("2", "小红", "g1", "normal", True, 1, 10.0, "白井黑子"))
+        store.record(make_result("2", "小红", "g1", "normal", True, 2, 10.0, "白井黑子"))
+        store.record(make_result("1", "小明", "g1", "normal", False, 10, 30.0, "御坂美琴"))
+
+        # 查询不写入缓冲区，结果与写入后相同
+        assert [player.user_id for player in await store.top("g1")] == ["2", "1"]
+        assert len(store._buffer) == 3
+        player = await store.player("1", "g1")
+        assert (player.games, player.wins, player.streak, player.best_streak) == (2, 1, 0, 1)
+    finally:
+        await store.close()
+
+    store = StatsStore(tmp_path / "stats.db")
+    store.open()
+    try:
+        # 关闭时写入了缓冲区中的结果
+        assert [player.user_id for player in await store.top("g1")] == ["2", "1"]
+        assert await store.player("1", "g1") == player
+    finally:
+        await store.close()
+
+
+async def test_failed_write_is_retried(app: App, tmp_path: Path, monkeypatch):
+    import sqlite3
+
+    import pytest
+
+    from nonebot_plugin_aniguessr.stats import StatsStore, make_result
+
+    store = StatsStore(tmp_path / "stats.db", batch_size=100, flush_interval=60)
+    store.open()
+    try:
+        write_batch = store._write_batch
+
+        def locked(batch):
+            raise sqlite3.OperationalError("database is locked")
+
+        store.record(make_result("1", "小明", "g1", "normal", True, 4, 30.0, "御坂美琴"))
+        monkeypatch.setattr(store, "_write_batch", locked)
+        with pytest.raises(sqlite3.OperationalError):
+            await store.flush()
+        # 写入失败的结果放回缓冲区，排在之后记录的结果之前
+        store.record(make_result("1", "小明", "g1", "normal", False, 10, 30.0, "御坂美琴"))
+        assert [result.won for result in store._buffer] == [True, False]
+
+        monkeypatch.setattr(store, "_write_batch", write_batch)
+        await store.flush()
+        assert not store._buffer
+        player = await store.player("1", "g1")
+        assert (player.games, player.wins) == (2, 1)
+    finally:
+        await store.close()
+
+
+async def test_daily_results_survive_restart(app: App, tmp_path: Path):
+    from nonebot_plugin_aniguessr.stats import DailyResult, StatsStore, make_result
+
+    store = StatsStore(tmp_path / "stats.db", batch_size=100, flush_interval=60)
+    store.open()
+    try:
+        store.record(make_result("1", "小明", "g1", "daily", True, 3, 20.0, "御坂美琴", daily="2026-10-18"))
+        await store.flush()
+        # 每人每天只记录第一次
+        store.record(make_result("1", "小明", "g2", "daily", False, 10, 50.0, "御坂美琴", daily="2026-10-18"))
+        store.record(make_result("2", "小红", None, "daily", False, 10, 60.0, "御坂美琴", daily="2026-10-18"))
+        store.record(make_result("3", "小刚", "g1", "normal", True, 1, 5.0, "白井黑子"))
+        expected = [DailyResult("1", "小明", True, 3, 20.0), DailyResult("2", "小红", False, 10, 60.0)]
+        assert await store.daily_results("2026-10-18") == expected
+    finally:
+        await store.close()
+
+    store = StatsStore(tmp_path / "stats.db")
+    store.open()
+    try:
+        assert await store.daily_results("2026-10-18") == expected
+        assert await store.daily_results("2026-10-19") == []
+    finally:
+        await store.close()
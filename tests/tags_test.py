@@ -0,0 +1,35 @@
+from nonebug import App
+
+
+async def test_tag_database(app: App):
+    from nonebot_plugin_aniguessr.game_logic import AniGuessrGame
+    from nonebot_plugin_aniguessr.model import GameSettings
+    from nonebot_plugin_aniguessr.tags import build_tag_database, build_tag_pool, tag_char_data
+
+    id_tags = {
+        "1": ["魔法少女", "双马尾", "魔法少女"],
+        "2": ["魔法少女", "黑长直", "学生会长"],
+        "3": ["双马尾", "傲娇", "学生"],
+        "4": ["重名", "标签", "角色"],
+        "5": [],
+        "6": ["没有角色名"],
+    }
+    bgm2moegirl = {"1": ["甲", "甲的别名"], "2": ["乙"], "3": ["丙"], "4": ["甲"], "5": ["丁"]}
+    # 去掉重复标签，重名时保留先出现的角色，没有标签或角色名的角色被跳过
+    assert tag_char_data(id_tags, bgm2moegirl) == {
+        "甲": ["魔法少女", "双马尾"],
+        "乙": ["魔法少女", "黑长直", "学生会长"],
+        "丙": ["双马尾", "傲娇", "学生"],
+    }
+
+    db = build_tag_database(id_tags, bgm2moegirl)
+    pool = build_tag_pool(db, min_tags=3)
+    assert sorted(pool.candidate_names()) == ["丙", "乙"]
+
+    game = AniGuessrGame(pool, settings=GameSettings(hint_count=1), target="乙", mode="tag")
+    assert game.mode == "tag"
+    result = await game.make_guess("甲")
+    assert not result.is_correct
+    assert "魔法少女" in result.new_attrs
+    # 只有乙同时有魔法少女标签而没有双马尾标签
+    assert game.get_candidate_cursor().page(1, 10) == ["乙"]
@@ -0,0 +1,32 @@
+from nonebug import App
+
+
+async def test_build_tier_pools(app: App):
+    from nonebot_plugin_aniguessr.model import CharacterDatabase
+    from nonebot_plugin_aniguessr.tiers import build_tier_pools
+
+    core = CharacterDatabase(
+        char_data={
+            "甲": ["a", "b", "c", "d"],
+            "乙": ["a", "b"],
+            "丙": ["a"],
+        }
+    )
+    pools = build_tier_pools(core, min_attrs=2, easy_min_attrs=4)
+
+    assert set(pools["normal"].candidate_names()) == {"甲", "乙"}
+    assert pools["easy"].candidate_names() == ("甲",)
+    assert pools["hard"].candidate_names() == ("乙",)
+    # 角色池共享核心数据库，池外的角色也可以被猜测
+    assert pools["easy"].characters is core.characters
+    assert pools["easy"].get_character("丙").attributes == ["a"]
+    assert pools["hard"].get_random_character().name == "乙"
+
+
+async def test_tier_pool_fallback(app: App):
+    from nonebot_plugin_aniguessr.model import CharacterDatabase
+    from nonebot_plugin_aniguessr.tiers import build_tier_pools
+
+    core = CharacterDatabase(char_data={"甲": ["a", "b"]})
+    pools = build_tier_pools(core, min_attrs=1, easy_min_attrs=1)
+    assert pools["hard"] is pools["normal"]
@@ -0,0 +1,68 @@
+import json
+from pathlib import Path
+
+from nonebug import App
+
+
+def write_dataset(directory: Path, char2attr: dict[str, list[str]]) -> None:
+    from nonebot_plugin_aniguessr.versions import DATA_FILES
+
+    for name in DATA_FILES:
+        content = char2attr if name == "char2attr.json" else {}
+        (directory / name).write_text(json.dumps(content, ensure_ascii=False), encoding="utf-8")
+
+
+async def test_commit_and_rollback(app: App, tmp_path: Path):
+    from nonebot_plugin_aniguessr.model import CharacterDatabase
+    from nonebot_plugin_aniguessr.versions import VersionStore
+
+    store = VersionStore(tmp_path / "versions")
+
+    staging = store.staging_dir()
+    write_dataset(staging, {"甲": ["a", "b"]})
+    first = store.commit(staging)
+    store.activate(first.version)
+    store.save_index(first.version, CharacterDatabase(char_data={"甲": ["a", "b"]}))
+
+    # 内容相同的数据不会产生新版本
+    staging = store.staging_dir()
+    write_dataset(staging, {"甲": ["a", "b"]})
+    assert store.commit(staging).version == first.version
+
+    staging = store.staging_dir()
+    write_dataset(staging, {"乙": ["c"]})
+    second = store.commit(staging)
+    store.activate(second.version)
+    assert second.version != first.version
+    assert store.current() == second.version
+    assert store.load_index(second.version) is None
+
+    assert store.previous() == first.version
+    store.activate(store.resolve(first.version[:6]))
+    db = store.load_index(first.version)
+    assert db is not None
+    assert db.get_characters_with_attribute("a") == ["甲"]
+
+
+async def test_corrupt_index_and_prune(app: App, tmp_path: Path):
+    import asyncio
+
+    from nonebot_plugin_aniguessr.model import CharacterDatabase
+    from nonebot_plugin_aniguessr.versions import INDEX_FILE, VersionStore
+
+    store = VersionStore(tmp_path / "versions")
+    created = []
+    for i in range(3):
+        staging = store.staging_dir()
+        write_dataset(staging, {f"角色{i}": ["a"]})
+        created.append(store.commit(staging).version)
+        await asyncio.sleep(0.01)
+    store.activate(created[0])
+
+    store.save_index(created[0], CharacterDatabase(char_data={"角色0": ["a"]}))
+    (store.path(created[0]) / INDEX_FILE).write_bytes(b"broken")
+    assert store.load_index(created[0]) is None
+
+    # 保留最新的一个版本，当前版本即使较旧也不会被删除
+    assert store.prune(1) == [created[1]]
+    assert {manifest.version for manifest in store.versions()} == {created[0], created[2]}
@@ -0,0 +1,19 @@
+import asyncio
+
+from nonebug import App
+
+
+async def test_database_unavailable_message(app: App, monkeypatch):
+    from nonebot_plugin_aniguessr import plugin
+    from nonebot_plugin_aniguessr.model import CharacterDatabase
+
+    monkeypatch.setattr(plugin, "character_db", None)
+    pending = asyncio.get_running_loop().create_future()
+    monkeypatch.setattr(plugin, "warmup_task", pending)
+    assert plugin.database_unavailable_message() == "角色数据正在加载中，请稍后再试"
+
+    pending.set_result(None)
+    assert "加载失败" in plugin.database_unavailable_message()
+
+    monkeypatch.setattr(plugin, "character_db", CharacterDatabase(char_data={"甲": ["a"]}))
+    assert plugin.database_unavailable_message() is None
@@ -0,0 +1,61 @@
+import asyncio
+
+from nonebug import App
+import pytest
+
+
+async def test_guess_workers(app: App):
+    from nonebot_plugin_aniguessr.delta import CharacterDelta
+    from nonebot_plugin_aniguessr.game_logic import AniGuessrGame, candidate_cache
+    from nonebot_plugin_aniguessr.model import CharacterDatabase, CharacterPool, GameSettings
+    from nonebot_plugin_aniguessr.workers import GuessWorkerPool, WorkerBusyError, set_guess_workers
+
+    db = CharacterDatabase(
+        char_data={
+            "御坂美琴": ["茶发", "短发", "电击使"],
+            "白井黑子": ["茶发", "双马尾", "空间移动"],
+            "食蜂操祈": ["金发", "长发", "心理掌握"],
+            "初春饰利": ["黑发", "短发", "花饰"],
+        }
+    )
+    pool = CharacterPool(db, ["御坂美琴", "白井黑子", "初春饰利"], "normal")
+    workers = GuessWorkerPool(1, timeout=30, batch_window=0.01)
+    workers.start()
+    workers.track(db)
+    try:
+        await workers.wait_published()
+        assert workers.serves(pool)
+
+        # 同一批中的请求一起提交
+        results = await asyncio.gather(workers.match("御坂美"), workers.match("白井黑"), workers.match("不存在的名字"))
+        assert results == ["御坂美琴", "白井黑子", None]
+        assert workers.batches == 1
+        assert await workers.filter_candidates(frozenset({"茶发"}), frozenset({"双马尾"})) == {"御坂美琴"}
+
+        set_guess_workers(workers)
+        candidate_cache.clear()
+        game = AniGuessrGame(pool, settings=GameSettings(hint_count=1), target="御坂美琴")
+        result = await game.make_guess("白井黑")
+        assert result.guessed_name == "白井黑子"
+        await game.prepare_candidates()
+        assert candidate_cache.get(game._candidate_key()) == {"御坂美琴"}
+        assert game.get_candidate_characters() == ["御坂美琴"]
+
+        # 数据更新后快照过期，改为在线程中计算并在后台重新发布
+        db.apply_delta(CharacterDelta(added={"佐天泪子": ["黑发", "长发", "花饰"]}))
+        assert not workers.serves(pool)
+        with pytest.raises(ValueError, match="没有找到角色"):
+            await game.make_guess("不存在的名字")
+
+        # 事件循环延迟过高或超时时拒绝请求
+        workers.loop_lag = 1.0
+        with pytest.raises(WorkerBusyError):
+            await workers.match("御坂")
+        workers.loop_lag = 0.0
+        workers.timeout = 0
+        with pytest.raises(WorkerBusyError):
+            await workers.match("御坂")
+        assert (workers.rejected, workers.timeouts) == (1, 1)
+    finally:
+        set_guess_workers(None)
+        workers.close()